@@ -19,7 +19,7 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from app.db.base import Base # Adjust if your Base is elsewhere
-from app.models import User, Sequence, Block, Variable, GlobalList, GlobalListItem, Run, BlockRun # Ensure all models are imported
+from app.models import User, Sequence, Block, Variable, GlobalList, GlobalListItem, Run, BlockRun, LLMCacheEntry # Ensure all models are imported
 target_metadata = Base.metadata
 
 
@@ -0,0 +1,38 @@
+"""add run queue claim and lease columns
+
+Revision ID: 5d8e0b7f3a14
+Revises: 9c3f1a6e5b27
+Create Date: 2026-10-17 19:12:27.604311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d8e0b7f3a14'
+down_revision: Union[str, Sequence[str], None] = '9c3f1a6e5b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('runs', sa.Column('claimed_by', sa.String(), nullable=True))
+    op.add_column('runs', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('runs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('runs', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('runs', sa.Column('claim_count', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index(op.f('ix_runs_status'), 'runs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_runs_status'), table_name='runs')
+    op.drop_column('runs', 'claim_count')
+    op.drop_column('runs', 'lease_expires_at')
+    op.drop_column('runs', 'heartbeat_at')
+    op.drop_column('runs', 'claimed_at')
+    op.drop_column('runs', 'claimed_by')
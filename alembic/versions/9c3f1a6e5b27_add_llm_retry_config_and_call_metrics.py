@@ -0,0 +1,30 @@
+"""add sequence llm retry config and block run llm call metrics
+
+Revision ID: 9c3f1a6e5b27
+Revises: 4b7e2c91d0a3
+Create Date: 2026-10-17 18:05:41.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f1a6e5b27'
+down_revision: Union[str, Sequence[str], None] = '4b7e2c91d0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sequences', sa.Column('llm_retry_config_json', sa.JSON(), nullable=True))
+    op.add_column('block_runs', sa.Column('llm_call_metrics_json', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('block_runs', 'llm_call_metrics_json')
+    op.drop_column('sequences', 'llm_retry_config_json')
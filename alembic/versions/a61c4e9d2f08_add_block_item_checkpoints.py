@@ -0,0 +1,44 @@
+"""add block item checkpoints table
+
+Revision ID: a61c4e9d2f08
+Revises: 5d8e0b7f3a14
+Create Date: 2026-10-17 20:31:08.447120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a61c4e9d2f08'
+down_revision: Union[str, Sequence[str], None] = '5d8e0b7f3a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('block_item_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('block_id', sa.Integer(), nullable=False),
+    sa.Column('item_index', sa.Integer(), nullable=False),
+    sa.Column('prompt_hash', sa.String(length=64), nullable=False),
+    sa.Column('output_text', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['runs.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('run_id', 'block_id', 'prompt_hash', name='uq_block_item_checkpoint')
+    )
+    op.create_index(op.f('ix_block_item_checkpoints_id'), 'block_item_checkpoints', ['id'], unique=False)
+    op.create_index(op.f('ix_block_item_checkpoints_run_id'), 'block_item_checkpoints', ['run_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_block_item_checkpoints_run_id'), table_name='block_item_checkpoints')
+    op.drop_index(op.f('ix_block_item_checkpoints_id'), table_name='block_item_checkpoints')
+    op.drop_table('block_item_checkpoints')
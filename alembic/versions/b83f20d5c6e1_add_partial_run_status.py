@@ -0,0 +1,30 @@
+"""Add PARTIAL to run status enum
+
+Revision ID: b83f20d5c6e1
+Revises: a61c4e9d2f08
+Create Date: 2026-10-17 21:02:44.913357
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83f20d5c6e1'
+down_revision: Union[str, Sequence[str], None] = 'a61c4e9d2f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Only Postgres has a native enum type; SQLite stores the status as VARCHAR
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("ALTER TYPE runstatusenum ADD VALUE IF NOT EXISTS 'PARTIAL';")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,32 @@
+"""add block run input fingerprint
+
+Revision ID: c4d19a7e3b52
+Revises: b83f20d5c6e1
+Create Date: 2026-10-17 21:40:19.208861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d19a7e3b52'
+down_revision: Union[str, Sequence[str], None] = 'b83f20d5c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('block_runs', sa.Column('input_fingerprint', sa.String(length=64), nullable=True))
+    op.add_column('block_runs', sa.Column('reused_from_block_run_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_block_runs_input_fingerprint'), 'block_runs', ['input_fingerprint'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_block_runs_input_fingerprint'), table_name='block_runs')
+    op.drop_column('block_runs', 'reused_from_block_run_id')
+    op.drop_column('block_runs', 'input_fingerprint')
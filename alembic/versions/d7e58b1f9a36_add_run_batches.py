@@ -0,0 +1,60 @@
+"""add run batches
+
+Revision ID: d7e58b1f9a36
+Revises: c4d19a7e3b52
+Create Date: 2026-10-17 22:18:53.671402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e58b1f9a36'
+down_revision: Union[str, Sequence[str], None] = 'c4d19a7e3b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('run_batches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sequence_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    # runstatusenum already exists (runs.status)
+    sa.Column('status', postgresql.ENUM('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', 'CANCELLED', 'PARTIAL', name='runstatusenum', create_type=False), nullable=False),
+    sa.Column('input_format', sa.String(), nullable=False),
+    sa.Column('input_columns_json', sa.JSON(), nullable=True),
+    sa.Column('total_runs', sa.Integer(), nullable=False),
+    sa.Column('max_concurrency', sa.Integer(), nullable=False),
+    sa.Column('llm_model_override', sa.String(), nullable=True),
+    sa.Column('use_cache', sa.Boolean(), nullable=True),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['sequence_id'], ['sequences.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_run_batches_id'), 'run_batches', ['id'], unique=False)
+    op.add_column('runs', sa.Column('batch_id', sa.Integer(), nullable=True))
+    op.add_column('runs', sa.Column('batch_row_index', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_runs_batch_id'), 'runs', ['batch_id'], unique=False)
+    # SQLite cannot add a constraint to an existing table
+    if op.get_bind().dialect.name != "sqlite":
+        op.create_foreign_key('fk_runs_batch_id_run_batches', 'runs', 'run_batches', ['batch_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint('fk_runs_batch_id_run_batches', 'runs', type_='foreignkey')
+    op.drop_index(op.f('ix_runs_batch_id'), table_name='runs')
+    op.drop_column('runs', 'batch_row_index')
+    op.drop_column('runs', 'batch_id')
+    op.drop_index(op.f('ix_run_batches_id'), table_name='run_batches')
+    op.drop_table('run_batches')
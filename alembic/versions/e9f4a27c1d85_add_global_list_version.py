@@ -0,0 +1,28 @@
+"""add global list version
+
+Revision ID: e9f4a27c1d85
+Revises: d7e58b1f9a36
+Create Date: 2026-10-17 23:52:07.514236
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9f4a27c1d85'
+down_revision: Union[str, Sequence[str], None] = 'd7e58b1f9a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('global_lists', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('global_lists', 'version')
@@ -0,0 +1,166 @@
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import schemas, models
+from app.api import deps
+from app.core.config import settings
+from app.crud import crud_run, crud_sequence
+from app.db.session import get_db
+from app.services import batch_runs, run_estimator
+from app.services.run_state import active_runs
+
+router = APIRouter()
+
+
+async def _batch_read(db: AsyncSession, batch: models.RunBatch) -> schemas.RunBatchRead:
+    counts = await crud_run.run_batch.status_counts(db, batch_id=batch.id)
+    return schemas.RunBatchRead.model_validate(batch).model_copy(update={
+        "status": batch_runs.batch_status(batch, counts),
+        "progress": schemas.RunBatchProgress(**batch_runs.batch_progress(counts)),
+    })
+
+
+@router.post("/", response_model=schemas.RunBatchRead, status_code=status.HTTP_202_ACCEPTED)
+async def create_batch_run(
+    *,
+    request: Request,
+    sequence_id: int,
+    input_format: Optional[str] = Query(None, description="csv or jsonl. Defaults to csv for a text/csv body, jsonl otherwise."),
+    max_concurrency: Optional[int] = Query(None, ge=1, le=1000, description="Child runs executing at once. Defaults to RUN_BATCH_DEFAULT_MAX_CONCURRENCY."),
+    llm_model_override: Optional[str] = None,
+    use_cache: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Run a sequence once per input row. The request body is streamed: a CSV whose header row
+    names the input variables, or JSONL with one object of input values per line.
+    Child runs are queued while the upload is still streaming; poll GET /batches/{batch_id}
+    for progress and download GET /batches/{batch_id}/results. Child runs keep their outputs on
+    their own block runs and don't update the sequence's output variables.
+    With a per-run cost budget configured, every row is estimated before any child run is queued
+    and the batch is rejected if one of them exceeds it.
+    """
+    sequence = await crud_sequence.sequence.get_by_id_and_owner(db, id=sequence_id, user_id=current_user.id)
+    if not sequence:
+        raise HTTPException(status_code=404, detail="Sequence not found or not owned by user")
+    if input_format is None:
+        input_format = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    if input_format not in batch_runs.INPUT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"input_format must be one of {batch_runs.INPUT_FORMATS}")
+
+    batch = models.RunBatch(
+        sequence_id=sequence.id, user_id=current_user.id, status=models.RunStatusEnum.PENDING,
+        input_format=input_format, total_runs=0,
+        max_concurrency=max_concurrency or settings.RUN_BATCH_DEFAULT_MAX_CONCURRENCY,
+        llm_model_override=llm_model_override, use_cache=use_cache,
+    )
+    db.add(batch)
+    await db.commit()
+    await db.refresh(batch)
+
+    try:
+        rows = batch_runs.iter_input_rows(request.stream(), input_format)
+        if run_estimator.user_cost_budget(current_user.id) is not None:
+            rows = await batch_runs.check_batch_budget(db, batch, sequence, rows)
+        total = await batch_runs.create_batch_runs(db, batch, rows)
+        if total == 0:
+            raise batch_runs.BatchInputError("The upload contains no input rows.")
+    except batch_runs.BatchInputError as e:
+        # Rows queued before the bad one are cancelled too: a batch is all rows or nothing
+        await db.rollback()
+        await crud_run.run_batch.cancel_runs(db, batch_id=batch.id)
+        await db.refresh(batch)
+        if batch.status != models.RunStatusEnum.CANCELLED:
+            batch.status = models.RunStatusEnum.FAILED
+        batch.error_message = str(e)
+        await db.commit()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    batch.status = models.RunStatusEnum.RUNNING
+    await db.commit()
+    await db.refresh(batch)
+    return await _batch_read(db, batch)
+
+
+@router.get("/", response_model=List[schemas.RunBatchRead])
+async def read_batch_runs(
+    *,
+    db: AsyncSession = Depends(get_db),
+    skip: int = 0,
+    limit: int = 100,
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Retrieve the current user's batch runs, newest first, with their progress.
+    """
+    batches = await crud_run.run_batch.get_multi_by_user(db, user_id=current_user.id, skip=skip, limit=limit)
+    return [await _batch_read(db, batch) for batch in batches]
+
+
+@router.get("/{batch_id}", response_model=schemas.RunBatchRead)
+async def read_batch_run(
+    *,
+    batch_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Get a batch run with aggregate progress (child run counts per status).
+    """
+    batch = await crud_run.run_batch.get_by_id_and_user(db, id=batch_id, user_id=current_user.id)
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found or not owned by user")
+    return await _batch_read(db, batch)
+
+
+@router.post("/{batch_id}/cancel", response_model=schemas.RunBatchRead, status_code=status.HTTP_202_ACCEPTED)
+async def cancel_batch_run(
+    *,
+    batch_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Cancel every child run that has not finished yet (PENDING or RUNNING). Best effort: child runs
+    that already finished keep their status and results, so a cancelled batch can still hold
+    COMPLETED, PARTIAL or FAILED rows; `progress` counts them per status.
+    """
+    batch = await crud_run.run_batch.get_by_id_and_user(db, id=batch_id, user_id=current_user.id)
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found or not owned by user")
+    if batch.status not in (models.RunStatusEnum.PENDING, models.RunStatusEnum.RUNNING):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Batch already finished with status {batch.status.value}")
+    batch.status = models.RunStatusEnum.CANCELLED
+    await db.commit()
+    for run_id in await crud_run.run_batch.cancel_runs(db, batch_id=batch.id):
+        active_runs.cancel(run_id)
+    await db.refresh(batch)
+    return await _batch_read(db, batch)
+
+
+@router.get("/{batch_id}/results")
+async def download_batch_results(
+    *,
+    batch_id: int,
+    output_format: str = Query("jsonl", description="csv or jsonl"),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Stream one result per input row, in upload order: status, inputs and output variables.
+    Can be downloaded while the batch is still running; unfinished rows have no outputs yet.
+    """
+    batch = await crud_run.run_batch.get_by_id_and_user(db, id=batch_id, user_id=current_user.id)
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found or not owned by user")
+    if output_format not in batch_runs.INPUT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"output_format must be one of {batch_runs.INPUT_FORMATS}")
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        batch_runs.iter_batch_results(batch, output_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch.id}_results.{output_format}"'},
+    )
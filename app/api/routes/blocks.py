@@ -7,6 +7,7 @@ from app import schemas, models
 from app.crud import crud_block, crud_sequence
 from app.api import deps
 from app.db.session import get_db
+from app.services.execution_plan import execution_plans
 from copy import deepcopy
 
 
@@ -65,6 +66,7 @@ async def create_block_in_sequence(
     block_in.order = next_order
     # Continue as normal
     block = await crud_block.block.create(db=db, obj_in=block_in)
+    execution_plans.invalidate(sequence_id)
     return block
 
 @router.get("/in_sequence/{sequence_id}", response_model=List[schemas.BlockRead])
@@ -126,6 +128,8 @@ async def update_block(
     sanitized_block_in = schemas.BlockUpdate(**block_in_data)
     
     block = await crud_block.block.update(db, db_obj=db_block, obj_in=sanitized_block_in)
+    # updated_at alone has one-second resolution on some databases
+    execution_plans.invalidate(block.sequence_id, block.id)
     return block
 
 @router.delete("/{block_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -145,6 +149,7 @@ async def delete_block(
     _ = await get_owned_sequence(sequence_id=db_block.sequence_id, db=db, current_user=current_user)
         
     await crud_block.block.remove(db, id=block_id)
+    execution_plans.invalidate(db_block.sequence_id, block_id)
     return None
 
 
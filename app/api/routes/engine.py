@@ -7,8 +7,14 @@ from app.api import deps
 from app import models
 from app.crud import crud_sequence # For ownership check
 from app.db.session import get_db
-from app.services import execution_engine
-from app.schemas.engine import PreviewPromptRequest # Define this schema
+from app.services import execution_engine, run_estimator
+from app.services.cache_invalidation import cache_invalidation
+from app.services.global_list_cache import global_list_cache
+from app.services.llm_cache import response_cache
+from app.services.prompt_utils import template_cache
+from app.services.rate_limiter import rate_limiters
+from app.services.single_flight import llm_single_flight
+from app.schemas.engine import EstimateRequest, PreviewPromptRequest, SequenceEstimate # Define this schema
 
 router = APIRouter()
 
@@ -55,6 +61,47 @@ async def preview_block_prompt(
         logger.error(f"Error generating prompt preview for block {request_data.block_id} in sequence {request_data.sequence_id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate prompt preview.")
 
+
+@router.post("/estimate", response_model=SequenceEstimate)
+async def estimate_sequence_run(
+    *,
+    request_data: EstimateRequest = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+):
+    """
+    Estimate a run of a sequence before launching it: LLM calls, input/output tokens,
+    wall time at the current concurrency and rate limits, and cost, per block and in total.
+    Resolves the context and list sizes like a run would, but never calls the LLM.
+    `within_budget` tells whether POST /runs/ would accept the run.
+    """
+    sequence = await crud_sequence.sequence.get_by_id_and_owner(db, id=request_data.sequence_id, user_id=current_user.id)
+    if not sequence:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sequence not found or not owned by user")
+    return await run_estimator.estimate_sequence(
+        db, sequence, current_user.id,
+        input_overrides=request_data.input_overrides, llm_model_override=request_data.llm_model_override,
+    )
+
+
+@router.get("/stats", response_model=Dict[str, Any])
+async def read_engine_stats(
+    current_user: models.User = Depends(deps.get_current_active_user)
+):
+    """
+    In-process engine cache and limiter statistics of the worker answering the request:
+    prompt template, global list and LLM response cache hit rates, cache invalidation
+    broadcasts, coalesced LLM calls and per-model rate limiter state.
+    """
+    return {
+        "template_cache": template_cache.stats(),
+        "global_list_cache": global_list_cache.stats(),
+        "cache_invalidation": cache_invalidation.stats(),
+        "llm_response_cache": response_cache.stats(),
+        "single_flight": llm_single_flight.stats(),
+        "rate_limiters": rate_limiters.stats(),
+    }
+
 # Schema definition for PreviewPromptRequest (if not in a separate schemas/engine.py)
 # This should ideally be in app/schemas/engine.py and imported.
 # For completeness if it's missing:
@@ -8,6 +8,7 @@ from app import schemas, models
 from app.crud import crud_global_list
 from app.api import deps
 from app.db.session import get_db
+from app.services.global_list_cache import global_list_cache
 
 router = APIRouter()
 
@@ -34,6 +35,7 @@ async def create_global_list(
     glist = await crud_global_list.global_list.create_with_owner(
         db=db, obj_in=list_in, user_id=current_user.id
     )
+    global_list_cache.invalidate(current_user.id, glist.id)
     return glist
 
 @router.get("/", response_model=List[schemas.GlobalListRead])
@@ -86,6 +88,7 @@ async def update_global_list(
 
     glist.name = list_in.name or glist.name
     glist.description = list_in.description if list_in.description is not None else glist.description
+    crud_global_list.global_list.mark_changed(glist)
 
     # Wipe all current items and insert new ones
     if hasattr(list_in, "items") and list_in.items is not None:
@@ -107,6 +110,7 @@ async def update_global_list(
 
         await db.flush()   # <--- CRUCIAL: flush new items so next query sees them
         await db.commit()  # commit everything
+        global_list_cache.invalidate(current_user.id, glist.id)
 
         # EXPUNGE glist to force reload on next query (sometimes needed)
         await db.refresh(glist)  # Ensure latest version is loaded
@@ -121,6 +125,7 @@ async def update_global_list(
     else:
         # No items update: just commit/refresh and return
         await db.commit()
+        global_list_cache.invalidate(current_user.id, glist.id)
         await db.refresh(glist)
         refreshed = await db.execute(
             select(models.GlobalList)
@@ -147,6 +152,7 @@ async def delete_global_list(
             detail="Global list not found or not owned by user"
         )
     await crud_global_list.global_list.remove(db, id=list_id)
+    global_list_cache.invalidate(current_user.id, list_id)
     return None
 
 # --------- Global List Item Routes ---------
@@ -174,9 +180,11 @@ async def create_global_list_item(
     owned_list: models.GlobalList = Depends(get_owned_global_list_for_item_ops),
     db: AsyncSession = Depends(get_db)
 ) -> Any:
+    crud_global_list.global_list.mark_changed(owned_list) # Committed with the new item
     item = await crud_global_list.global_list_item.create_for_list(
         db=db, obj_in=item_in, global_list_id=owned_list.id
     )
+    global_list_cache.invalidate(owned_list.user_id, owned_list.id)
     return item
 
 @router.get("/{list_id}/items/", response_model=List[schemas.GlobalListItemRead])
@@ -208,12 +216,14 @@ async def update_global_list_item(
             detail="Global list item not found"
         )
     # Ownership check for parent list
-    _ = await get_owned_global_list_for_item_ops(
+    owned_list = await get_owned_global_list_for_item_ops(
         list_id=db_item.global_list_id, db=db, current_user=current_user
     )
+    crud_global_list.global_list.mark_changed(owned_list) # Committed with the item update
     item = await crud_global_list.global_list_item.update(
         db, db_obj=db_item, obj_in=item_in
     )
+    global_list_cache.invalidate(owned_list.user_id, owned_list.id)
     return item
 
 @router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -229,8 +239,10 @@ async def delete_global_list_item(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="Global list item not found"
         )
-    _ = await get_owned_global_list_for_item_ops(
+    owned_list = await get_owned_global_list_for_item_ops(
         list_id=db_item.global_list_id, db=db, current_user=current_user
     )
+    crud_global_list.global_list.mark_changed(owned_list) # Committed with the item deletion
     await crud_global_list.global_list_item.remove(db, id=item_id)
+    global_list_cache.invalidate(owned_list.user_id, owned_list.id)
     return None
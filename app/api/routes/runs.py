@@ -1,6 +1,7 @@
 # (Content from previous response - unchanged and correct)
 from typing import List, Any, Dict
 from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import schemas, models
@@ -8,8 +9,9 @@ from app.crud import crud_block, crud_run, crud_sequence, crud_variable
 from app.api import deps
 from app.db.session import get_db
 from app.models.variable import VariableTypeEnum
-from app.schemas.run import BlockRunCreate
-from app.services import execution_engine # For triggering execution
+from app.services import execution_engine, run_estimator, run_events # For triggering execution
+from app.services.run_state import active_runs
+from app.services.run_queue import RunQueueFullError, run_queue
 from sqlalchemy import select
 from datetime import datetime, timezone
 from app.crud.crud_variable import variable
@@ -42,11 +44,24 @@ async def create_run_for_sequence(
     current_user: models.User = Depends(deps.get_current_active_user)
 ) -> Any:
     """
-    Create and start a new run for a sequence.
+    Create a run for a sequence and queue it for background execution.
+    Returns immediately with the run in PENDING status; poll GET /runs/{run_id} for progress.
+    With a cost budget configured, runs estimated above it are rejected (see POST /engine/estimate).
     """
     sequence = await crud_sequence.sequence.get_by_id_and_owner(db, id=run_in.sequence_id, user_id=current_user.id)
     if not sequence:
         raise HTTPException(status_code=404, detail="Sequence not found or not owned by user")
+    if run_estimator.user_cost_budget(current_user.id) is not None:
+        estimate = await run_estimator.estimate_sequence(
+            db, sequence, current_user.id,
+            input_overrides=run_in.input_overrides_json, llm_model_override=run_in.llm_model_override,
+        )
+        if not estimate["within_budget"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Estimated cost ${estimate['cost_usd']:.2f} ({estimate['llm_calls']} LLM calls) "
+                       f"exceeds the per-run budget of ${estimate['budget_usd']:.2f}.",
+            )
 
     # Save the context in DB field input_overrides_json, but expect input_overrides from API
     db_run = await crud_run.run.create_with_user_and_sequence(
@@ -57,29 +72,17 @@ async def create_run_for_sequence(
         },
         user_id=current_user.id
     )
+    # create_with_user_and_sequence has committed, so any worker process can claim the run now
     try:
-        updated_run = await execution_engine.execute_sequence(
-            db=db,
-            run_id=db_run.id,
-            sequence_id=sequence.id,
-            user_id=current_user.id,
-            input_overrides_json=run_in.input_overrides_json   # 👈 use the key FE sends
-        )
-        return updated_run
-
-    except Exception as e:
+        await run_queue.enqueue(db, db_run.id)
+    except RunQueueFullError as e:
         db_run.status = models.RunStatusEnum.FAILED
-        db_run.error_message = f"Execution failed to start or complete: {str(e)}"
+        db_run.error_message = f"Execution could not be queued: {str(e)}"
         db_run.completed_at = datetime.now(timezone.utc)
         await db.commit()
-        await db.refresh(db_run)
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Catastrophic failure during sequence execution for run {db_run.id}: {e}", exc_info=True)
-        failed_run_with_details = await crud_run.run.get_by_id_and_user(db, id=db_run.id, user_id=current_user.id)
-        if failed_run_with_details:
-            return failed_run_with_details
-        raise HTTPException(status_code=500, detail=f"Sequence execution failed: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    return await crud_run.run.get_by_id_and_user(db, id=db_run.id, user_id=current_user.id)
 
 
 @router.get("/for_sequence/{sequence_id}", response_model=List[schemas.RunRead]) # Use RunRead for list view
@@ -119,6 +122,78 @@ async def read_run_details(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found or not owned by user")
     return run
 
+
+@router.get("/{run_id}/events")
+async def stream_run_events(
+    *,
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Live progress of a run as server-sent events, until the run finishes:
+    run_started, block_started, block_completed, item_completed (index, done/total and the
+    item's output, for every LLM call of a block) and run_finished.
+    Use this instead of polling GET /runs/{run_id}, which reloads every block run.
+    """
+    run = await crud_run.run.get(db, id=run_id)
+    if not run or run.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found or not owned by user")
+    return StreamingResponse(
+        run_events.stream_run_events(run_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # No proxy buffering of the stream
+    )
+
+
+@router.post("/{run_id}/cancel", response_model=schemas.RunReadWithDetails, status_code=status.HTTP_202_ACCEPTED)
+async def cancel_run(
+    *,
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Cancel a PENDING or RUNNING run. A pending run never starts; a running run stops its
+    in-flight LLM calls within seconds (in whichever worker executes it), keeps the outputs
+    of finished blocks and list items, and marks the remaining block runs CANCELLED.
+    """
+    run = await crud_run.run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
+    if not run:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found or not owned by user")
+    if not await crud_run.run.request_cancel(db, id=run_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Run already finished with status {run.status.value}")
+    # Runs executing in this process stop right away; other workers notice the CANCELLED status on their next poll
+    active_runs.cancel(run_id)
+    db.expire_all()
+    return await crud_run.run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
+
+
+@router.post("/{run_id}/resume", response_model=schemas.RunReadWithDetails, status_code=status.HTTP_202_ACCEPTED)
+async def resume_run(
+    *,
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Queue a FAILED or CANCELLED run again. Completed blocks are kept, and list/matrix items
+    finished before the failure are restored from their checkpoints instead of calling the LLM again.
+    Runs interrupted by a crashed worker are resumed the same way automatically once their lease expires.
+    """
+    run = await crud_run.run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
+    if not run:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found or not owned by user")
+    if not await crud_run.run.reset_for_resume(db, id=run_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Only failed or cancelled runs can be resumed (status: {run.status.value})")
+    try:
+        await run_queue.enqueue(db, run_id)
+    except RunQueueFullError as e:
+        await crud_run.run.request_cancel(db, id=run_id) # Leaves it resumable later
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    db.expire_all()
+    return await crud_run.run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
+
 from datetime import datetime, timezone # Ensure this is imported
 
 
@@ -133,12 +208,15 @@ async def rerun_from_block(
     run_id: int,
     block_id: int,
     input_overrides: dict = Body(default_factory=dict),
+    reuse_unchanged: bool = True,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Rerun all blocks from block_id onward in the context of an existing run.
     Includes any manual edits made to previous block outputs.
+    With reuse_unchanged, blocks after block_id whose rendered prompts, model and config are
+    identical to a completed block run of this sequence reuse its outputs instead of calling the LLM.
     The returned run's .block_runs includes previous (edited) blocks as well.
     """
     run = await crud_run.run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
@@ -178,51 +256,17 @@ async def rerun_from_block(
 
     # Create a new run object for rerun
     from app.schemas.run import RunCreate
-    new_run_in = RunCreate(sequence_id=sequence.id, input_overrides_json=context)
-    new_run = await crud_run.run.create_with_user_and_sequence(db=db, obj_in=new_run_in, user_id=current_user.id)
+    new_run_in = RunCreate(sequence_id=sequence.id, input_overrides_json=context, use_cache=run.use_cache)
+    # Created RUNNING (without a lease): this request executes it, so the run queue must never claim it
+    new_run = await crud_run.run.create_with_user_and_sequence(
+        db=db, user_id=current_user.id,
+        obj_in={**new_run_in.model_dump(), "status": models.RunStatusEnum.RUNNING, "started_at": datetime.now(timezone.utc)},
+    )
 
     # Execute only blocks from block_index onward
-    for block in blocks[block_index:]:
-        block_run_schema = BlockRunCreate(
-            run_id=new_run.id, block_id=block.id, status=models.RunStatusEnum.RUNNING,
-            block_name_snapshot=block.name, block_type_snapshot=block.type
-        )
-        db_block_run = models.BlockRun(**block_run_schema.model_dump())
-        db_block_run.started_at = datetime.now(timezone.utc)
-        db.add(db_block_run)
-        await db.flush()
-        (block_output_data, rendered_prompt, llm_raw_output,
-         named_outputs_db, list_outputs_db, matrix_outputs_db, error_message) = await execution_engine._execute_single_block_logic(
-            db, block, context, sequence.default_llm_model
-        )
-        # For each output variable, upsert it as a variable in DB
-        for output_var, value in block_output_data.items():
-            await variable.upsert_variable(
-                db=db,
-                name=output_var,
-                value=value,
-                user_id=current_user.id,
-                sequence_id=sequence.id,
-                type=VariableTypeEnum.OUTPUT._value_   # or .INPUT if you prefer, but .GLOBAL is typical for outputs
-            )
-
-        db_block_run.prompt_text = rendered_prompt
-        db_block_run.llm_output_text = llm_raw_output
-        db_block_run.named_outputs_json = named_outputs_db
-        db_block_run.list_outputs_json = list_outputs_db
-        db_block_run.matrix_outputs_json = matrix_outputs_db
-        db_block_run.completed_at = datetime.now(timezone.utc)
-        db_block_run.status = models.RunStatusEnum.FAILED if error_message else models.RunStatusEnum.COMPLETED
-        if error_message:
-            db_block_run.error_message = error_message
-            break
-        context.update(block_output_data)
-        await db.flush()
-    new_run.status = models.RunStatusEnum.COMPLETED
-    new_run.completed_at = datetime.now(timezone.utc)
-    db.add(new_run)
-    await db.commit()
-    await db.refresh(new_run)
+    await execution_engine.execute_rerun(
+        db, new_run, sequence, blocks[block_index:], context, reuse_unchanged=reuse_unchanged
+    )
 
     # --- Fetch the detailed run (with block_runs of new run) ---
     run_with_details = await crud_run.run.get_by_id_and_user(db, id=new_run.id, user_id=current_user.id)
@@ -286,6 +330,7 @@ async def edit_block_run_output(
         pass
 
     block_run.list_outputs_json = new_output.get("list_outputs_json", block_run.list_outputs_json)
+    block_run.input_fingerprint = None # Edited outputs no longer correspond to the block's inputs, never reuse them
     block_run.matrix_outputs_json = new_output.get("matrix_outputs_json", block_run.matrix_outputs_json)
     block_run.updated_at = make_naive(datetime.now(timezone.utc))
     await db.commit()
@@ -321,3 +366,27 @@ async def edit_block_run_output(
     await db.refresh(run)
 
     return block_run
+
+
+@router.post("/{run_id}/block/{block_run_id}/retry_failed_items", response_model=schemas.BlockRunRead)
+async def retry_failed_block_run_items(
+    *,
+    run_id: int,
+    block_run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Re-execute only the failed items/cells of a PARTIAL list or matrix block run and patch
+    them into its outputs in place. The block run becomes COMPLETED once no item fails anymore.
+    """
+    run = await crud_run.run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found or not owned by user")
+    block_run = next((br for br in run.block_runs if br.id == block_run_id), None)
+    if not block_run:
+        raise HTTPException(status_code=404, detail="Block run not found")
+    try:
+        return await execution_engine.retry_failed_items(db, run, block_run, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
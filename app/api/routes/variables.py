@@ -6,6 +6,7 @@ from app import schemas, models
 from app.crud import crud_variable, crud_sequence, crud_block, crud_global_list
 from app.api import deps
 from app.db.session import get_db
+from app.services.global_list_cache import global_list_cache
 from .blocks import get_owned_sequence
 
 router = APIRouter()
@@ -188,10 +189,11 @@ async def list_available_variables_for_sequence(
             "value": val
         }
 
-    # 2. User's Global Lists
-    user_global_lists = await crud_global_list.global_list.get_multi_by_owner(db, user_id=current_user.id)
+    # 2. User's Global Lists (cached, see global_list_cache)
+    user_global_lists = await global_list_cache.lists(db, current_user.id)
+    user_global_list_values = await global_list_cache.item_values(db, user_global_lists)
     for glist in user_global_lists:
-        val = [item.value for item in glist.items] if glist.items else []
+        val = user_global_list_values[glist.id]
         if glist.name not in available_vars_dict:
             available_vars_dict[glist.name] = {
                 "name": glist.name,
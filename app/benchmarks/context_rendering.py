@@ -0,0 +1,73 @@
+"""
+Benchmark: rendering every cell of a large matrix with a copied context per cell
+({**context, **bindings}, the old engine behaviour) versus a LayeredContext view.
+
+    python -m app.benchmarks.context_rendering --rows 100 --cols 100 --lists 5 --list-size 10000
+
+Both variants render the same precompiled template, so the difference is the context handling alone.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.services.matrix_engine import MatrixDimension, cell_bindings, iter_cells
+from app.services.prompt_utils import LayeredContext, compile_prompt, render_compiled
+
+TEMPLATE = "Compare <<item1>> (#{{ item1_index }}) with <<item2>> (#{{ item2_index }}) regarding <<topic>>."
+
+
+def build_context(lists: int, list_size: int, scalars: int) -> Dict[str, Any]:
+    """A sequence context shaped like _gather_sequence_context output: scalars plus large global lists."""
+    context: Dict[str, Any] = {"topic": "pricing"}
+    for i in range(scalars):
+        context[f"Variable {i}"] = context[f"variable_{i}"] = f"value {i}"
+    for i in range(lists):
+        values = [f"list {i} item {j}" for j in range(list_size)]
+        context[f"Global List {i}"] = context[f"global_list_{i}"] = values
+    return context
+
+
+def run(label: str, make_context: Callable[[Dict[str, Any], Dict[str, Any]], Any],
+        context: Dict[str, Any], dimensions: List[MatrixDimension]) -> None:
+    template = compile_prompt(TEMPLATE)
+    gc.collect()
+    collections_before = sum(stat["collections"] for stat in gc.get_stats())
+    tracemalloc.start()
+    started = time.perf_counter()
+    rendered = 0
+    for coords in iter_cells(dimensions):
+        render_compiled(template, make_context(context, cell_bindings(dimensions, coords)), TEMPLATE)
+        rendered += 1
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - collections_before
+    print(
+        f"{label:<10} {rendered} cells  {elapsed * 1000:9.1f} ms  {elapsed / rendered * 1e6:7.1f} us/cell  "
+        f"peak {peak / 1024:9.1f} KiB  gc runs {collections}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--cols", type=int, default=100)
+    parser.add_argument("--lists", type=int, default=5, help="Global lists in the context")
+    parser.add_argument("--list-size", type=int, default=10000)
+    parser.add_argument("--scalars", type=int, default=200, help="Scalar variables in the context")
+    args = parser.parse_args()
+
+    context = build_context(args.lists, args.list_size, args.scalars)
+    dimensions = [
+        MatrixDimension(0, "rows", [f"row {i}" for i in range(args.rows)]),
+        MatrixDimension(1, "cols", [f"col {j}" for j in range(args.cols)]),
+    ]
+    print(f"Context: {len(context)} keys; matrix {args.rows} x {args.cols}")
+    run("copied", lambda base, bindings: {**base, **bindings}, context, dimensions)
+    run("layered", LayeredContext, context, dimensions)
+
+
+if __name__ == "__main__":
+    main()
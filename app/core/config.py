@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Union, Any
+from typing import List, Union, Any, Dict, Optional
 from pydantic import AnyHttpUrl, field_validator
 
 class Settings(BaseSettings):
@@ -35,6 +35,115 @@ class Settings(BaseSettings):
     # LLM API Key
     CLAUDE_API_KEY: str
 
+    # LLM HTTP connection pool (shared by all LLM calls in a worker process)
+    LLM_HTTP_MAX_CONNECTIONS: int = 500
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 30.0 # seconds
+    LLM_HTTP_TIMEOUT: float = 600.0 # seconds, long generations can take minutes
+    LLM_HTTP_CONNECT_TIMEOUT: float = 10.0 # seconds
+
+    # LLM call concurrency for list blocks
+    LLM_BLOCK_MAX_CONCURRENCY: int = 8 # Default in-flight calls per block (overridable per block)
+    LLM_RUN_MAX_CONCURRENCY: int = 32 # Hard cap on in-flight calls per run, across all its blocks
+
+    # Block scheduling within a run
+    RUN_DAG_SCHEDULING_ENABLED: bool = True # Run blocks that don't depend on each other concurrently
+    RUN_MAX_PARALLEL_BLOCKS: int = 4 # Blocks of one run executing at the same time
+
+    # LLM response cache (in-process LRU + llm_response_cache table)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PERSISTENT_ENABLED: bool = True
+    LLM_CACHE_MEMORY_MAX_ENTRIES: int = 10000
+    LLM_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 7 # 7 days, 0 = never expire
+    LLM_CACHE_WRITE_BATCH_SIZE: int = 200 # Buffered persistent writes flushed in batches of this size
+
+    # LLM provider rate limits (per model, per worker process)
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_DEFAULT_REQUESTS_PER_MINUTE: int = 1000
+    LLM_DEFAULT_TOKENS_PER_MINUTE: int = 400000
+    # Per-model overrides, e.g. {"claude-3-opus-20240229": {"requests_per_minute": 50, "tokens_per_minute": 40000}}
+    LLM_MODEL_RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    # AIMD concurrency control: backs off on 429/529, grows again on success
+    LLM_AIMD_INITIAL_CONCURRENCY: int = 16
+    LLM_AIMD_MIN_CONCURRENCY: int = 1
+    LLM_AIMD_MAX_CONCURRENCY: int = 256
+    LLM_AIMD_DECREASE_FACTOR: float = 0.5
+    LLM_AIMD_DECREASE_COOLDOWN_SECONDS: float = 2.0
+    # Priority lanes (interactive > standard > batch): share of the concurrency limit a lane
+    # and the lanes below it may hold together, the rest stays free for higher lanes
+    LLM_LANE_CONCURRENCY_SHARES: Dict[str, float] = {"interactive": 1.0, "standard": 0.8, "batch": 0.6}
+    # Weighted fair queuing between users within a lane, e.g. {"42": 2.0}; unlisted users weigh 1.0
+    LLM_USER_WEIGHTS: Dict[int, float] = {}
+    # Throttled calls are re-queued instead of failing the run
+    LLM_THROTTLE_MAX_RETRIES: int = 8
+    LLM_THROTTLE_BASE_BACKOFF_SECONDS: float = 1.0
+    LLM_THROTTLE_MAX_BACKOFF_SECONDS: float = 60.0
+
+    # Retries for transient LLM failures (overridable per sequence and per block)
+    LLM_RETRY_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 20.0
+    # Hedged requests: duplicate a call still pending after the model's observed p95 latency
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_MIN_SAMPLES: int = 20 # Latency samples needed before hedging kicks in
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    LLM_LATENCY_WINDOW: int = 500 # Latency samples kept per model
+
+    # Identical concurrent LLM calls (same prompt, model and params) share one upstream request
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Compiled Jinja prompt templates kept in memory (LRU), shared by every render
+    PROMPT_TEMPLATE_CACHE_SIZE: int = 1024
+
+    # Users' global lists cached in memory (runs, previews, available_for_sequence); API writes invalidate them
+    GLOBAL_LIST_CACHE_ENABLED: bool = True
+    GLOBAL_LIST_CACHE_MAX_LISTS: int = 5000 # Lists whose items are kept in memory (LRU over all users)
+    GLOBAL_LIST_CACHE_TTL_SECONDS: float = 300.0 # Bounds staleness when an invalidation from another process is lost
+
+    # Cross-process cache invalidation over UDP multicast, joined by every API and worker process
+    CACHE_INVALIDATION_MULTICAST: str = "" # "group:port", e.g. "239.255.42.99:49152"; empty = invalidate this process only
+    CACHE_INVALIDATION_INTERFACE: str = "0.0.0.0" # Interface address to join and send on, "127.0.0.1" = this host only
+    CACHE_INVALIDATION_HOPS: int = 1 # Multicast TTL; 1 keeps invalidations on the local network
+
+    # Background run execution (DB-backed run queue, see app/worker.py)
+    RUN_WORKERS_IN_API_PROCESS: bool = True # Also execute runs inside the API process; False = dedicated workers only
+    RUN_WORKER_COUNT: int = 4 # Sequence runs executed concurrently per process
+    RUN_QUEUE_MAX_SIZE: int = 1000 # Pending runs accepted before POST /runs/ answers 503
+    RUN_QUEUE_POLL_INTERVAL_SECONDS: float = 2.0 # Idle workers look for claimable runs this often
+    RUN_LEASE_SECONDS: float = 120.0 # A claim not renewed for this long is considered abandoned
+    RUN_HEARTBEAT_INTERVAL_SECONDS: float = 30.0 # Must be well below RUN_LEASE_SECONDS
+    RUN_MAX_CLAIMS: int = 3 # Runs abandoned this many times are failed instead of re-claimed
+    RUN_CANCEL_POLL_INTERVAL_SECONDS: float = 1.0 # How often a running run checks whether it was cancelled elsewhere
+    RUN_SHUTDOWN_TIMEOUT_SECONDS: float = 60.0 # How long shutdown waits for in-flight runs before releasing them
+
+    # Item-level checkpoints: finished LLM calls are persisted while a run executes so it can be resumed
+    RUN_CHECKPOINTS_ENABLED: bool = True
+    RUN_CHECKPOINT_BATCH_SIZE: int = 20
+    RUN_CHECKPOINT_FLUSH_INTERVAL_SECONDS: float = 5.0 # Crashed workers lose at most this much finished work
+    # List/matrix blocks: a failed item gets an error marker instead of failing the block (overridable per block)
+    RUN_TOLERATE_ITEM_ERRORS: bool = False
+    # Reuse a prior completed block run with the same input fingerprint in new runs (reruns always may)
+    RUN_REUSE_UNCHANGED_BLOCKS: bool = False
+
+    # Batch runs: one sequence over many uploaded input rows (POST /batches/)
+    RUN_BATCH_MAX_ROWS: int = 100000
+    RUN_BATCH_DEFAULT_MAX_CONCURRENCY: int = 8 # Child runs of one batch executing at once, across all workers
+    RUN_BATCH_INSERT_CHUNK_SIZE: int = 500 # Rows committed (and claimable) per insert while the upload streams in
+
+    # Pre-flight estimates (POST /engine/estimate) and cost admission control for POST /runs/
+    LLM_DEFAULT_PRICE_PER_MTOK: Dict[str, float] = {"input": 15.0, "output": 75.0} # USD per million tokens
+    LLM_MODEL_PRICES_PER_MTOK: Dict[str, Dict[str, float]] = {} # Per-model overrides, e.g. {"claude-3-haiku-20240307": {"input": 0.25, "output": 1.25}}
+    RUN_ESTIMATE_OUTPUT_TOKENS_PER_CALL: int = 500 # Assumed output length, capped by the block's max_tokens
+    RUN_ESTIMATE_CALL_SECONDS: float = 10.0 # Assumed call latency until the model has observed latencies
+    RUN_ESTIMATE_SAMPLE_PROMPTS: int = 200 # Item prompts rendered per list block to estimate input tokens
+    RUN_MAX_ESTIMATED_COST_USD: Optional[float] = None # Runs estimated above this are rejected; None = no limit
+    RUN_USER_COST_BUDGETS_USD: Dict[int, float] = {} # Per-user overrides of RUN_MAX_ESTIMATED_COST_USD
+
+    # Live run progress (GET /runs/{run_id}/events, server-sent events)
+    RUN_EVENTS_HISTORY_SIZE: int = 1000 # Events kept per running run for clients subscribing late
+    RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE: int = 1000 # Undelivered events per client before its oldest are dropped
+    RUN_EVENTS_KEEPALIVE_SECONDS: float = 15.0 # Idle streams send a keepalive (and re-check the run status) this often
+
     # Optional: First superuser for initial setup
     FIRST_SUPERUSER_EMAIL: str | None = None
     FIRST_SUPERUSER_PASSWORD: str | None = None
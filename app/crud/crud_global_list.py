@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -52,6 +52,33 @@ class CRUDGlobalList(CRUDBase[GlobalList, GlobalListCreate, GlobalListUpdate]):
         )
         return result.scalars().all()
 
+    async def get_summaries_by_owner(self, db: AsyncSession, *, user_id: int) -> List[Tuple[int, str, Optional[str], int]]:
+        """(id, name, description, version) of every list the user owns, ordered by name, without loading any items."""
+        result = await db.execute(
+            select(self.model.id, self.model.name, self.model.description, self.model.version)
+            .filter(self.model.user_id == user_id)
+            .order_by(self.model.name)
+        )
+        return [(row.id, row.name, row.description, row.version) for row in result.all()]
+
+    def mark_changed(self, glist: GlobalList) -> None:
+        """Bumps the list's version (see global_list_cache); committed together with the write it belongs to."""
+        glist.version = (glist.version or 0) + 1
+
+    async def get_item_values(self, db: AsyncSession, *, global_list_ids: List[int]) -> Dict[int, List[Any]]:
+        """Item values of several lists fetched in one query, by list id (a list without items maps to [])."""
+        values: Dict[int, List[Any]] = {list_id: [] for list_id in global_list_ids}
+        if not global_list_ids:
+            return values
+        result = await db.execute(
+            select(GlobalListItem.global_list_id, GlobalListItem.value)
+            .filter(GlobalListItem.global_list_id.in_(global_list_ids))
+            .order_by(GlobalListItem.global_list_id, GlobalListItem.id) # Insertion order, as GlobalList.items
+        )
+        for list_id, value in result.all():
+            values[list_id].append(value)
+        return values
+
     async def get_by_id_and_owner(
         self, db: AsyncSession, *, id: int, user_id: int
     ) -> Optional[GlobalList]:
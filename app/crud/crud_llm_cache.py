@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, or_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic import BaseModel
+
+from app.crud.base import CRUDBase
+from app.models.llm_cache import LLMCacheEntry
+
+class CRUDLLMCacheEntry(CRUDBase[LLMCacheEntry, BaseModel, BaseModel]): # Written by the LLM layer only
+    async def get_valid_by_key(self, db: AsyncSession, *, cache_key: str) -> Optional[LLMCacheEntry]:
+        result = await db.execute(
+            select(self.model).filter(
+                self.model.cache_key == cache_key,
+                or_(self.model.expires_at == None, self.model.expires_at > datetime.now(timezone.utc)),
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def bulk_store(self, db: AsyncSession, *, entries: List[Dict[str, Any]], hit_counts: Dict[str, int]) -> None:
+        """
+        Writes buffered cache entries and hit counters in one transaction. Entries are upserted
+        (INSERT ... ON CONFLICT DO UPDATE), so keys another worker stored concurrently neither fail
+        the batch nor cost the other entries or the hit counters.
+        """
+        if entries:
+            insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+            statement = insert(self.model).values([{**entry, "hit_count": 0} for entry in entries])
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[self.model.cache_key],
+                set_={
+                    "response_text": statement.excluded.response_text,
+                    "expires_at": statement.excluded.expires_at,
+                    "updated_at": func.now(),
+                },
+            ))
+        for cache_key, hits in hit_counts.items():
+            await db.execute(
+                update(self.model).where(self.model.cache_key == cache_key).values(hit_count=self.model.hit_count + hits)
+            )
+        await db.commit()
+
+llm_cache_entry = CRUDLLMCacheEntry(LLMCacheEntry)
@@ -1,11 +1,13 @@
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from sqlalchemy import and_
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy import and_, case, delete, func, or_, update
+from sqlalchemy.exc import IntegrityError
 
 from app.crud.base import CRUDBase
-from app.models.run import Run, BlockRun
+from app.models.run import Run, RunBatch, BlockRun, BlockItemCheckpoint, RunStatusEnum
 from app.schemas.run import RunCreate, RunUpdate, BlockRunCreate # BlockRunUpdate not strictly needed from API
 from pydantic import BaseModel
 
@@ -51,10 +53,293 @@ class CRUDRun(CRUDBase[Run, RunCreate, RunUpdate]):
         )
         return result.scalar_one_or_none()
 
+    async def get_status(self, db: AsyncSession, *, id: int) -> Optional[RunStatusEnum]:
+        result = await db.execute(select(self.model.status).filter(self.model.id == id))
+        return result.scalar_one_or_none()
+
+    async def request_cancel(self, db: AsyncSession, *, id: int) -> bool:
+        """Marks a PENDING or RUNNING run CANCELLED. False if it had already finished."""
+        result = await db.execute(
+            update(self.model)
+            .where(
+                self.model.id == id,
+                self.model.status.in_([RunStatusEnum.PENDING, RunStatusEnum.RUNNING]),
+            )
+            .values(status=RunStatusEnum.CANCELLED, completed_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def reset_for_resume(self, db: AsyncSession, *, id: int) -> bool:
+        """Puts a FAILED or CANCELLED run back to PENDING with a fresh claim budget. False if it was not resumable."""
+        result = await db.execute(
+            update(self.model)
+            .where(
+                self.model.id == id,
+                self.model.status.in_([RunStatusEnum.FAILED, RunStatusEnum.CANCELLED]),
+            )
+            .values(
+                status=RunStatusEnum.PENDING, completed_at=None, error_message=None,
+                claimed_by=None, lease_expires_at=None, claim_count=0,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def mark_started(self, db: AsyncSession, *, id: int, input_overrides_json: Optional[Dict[str, Any]]) -> bool:
+        """Marks a PENDING (or claimed) run RUNNING. False if it was cancelled or finished in the meantime."""
+        result = await db.execute(
+            update(self.model)
+            .where(
+                self.model.id == id,
+                self.model.status.in_([RunStatusEnum.PENDING, RunStatusEnum.RUNNING]),
+            )
+            .values(
+                status=RunStatusEnum.RUNNING, started_at=datetime.now(timezone.utc),
+                input_overrides_json=input_overrides_json,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def finish(
+        self, db: AsyncSession, *, id: int, status: RunStatusEnum, error_message: Optional[str] = None,
+        results_summary_json: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Writes the final status of a RUNNING run, in the caller's transaction (not committed).
+        False if the run was cancelled meanwhile; its CANCELLED status is then left alone.
+        """
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.id == id, self.model.status == RunStatusEnum.RUNNING)
+            .values(
+                status=status, completed_at=datetime.now(timezone.utc), error_message=error_message,
+                results_summary_json=results_summary_json,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    # --- DB-backed run queue ---
+
+    def _claimable(self, now: datetime):
+        # PENDING runs, plus RUNNING runs whose worker stopped renewing its lease.
+        # Child runs of a batch only while fewer than the batch's max_concurrency siblings are running
+        # (checked per claim, so concurrent workers may overshoot it by a run or two)
+        sibling = aliased(self.model)
+        running_siblings = (
+            select(func.count(sibling.id))
+            .where(sibling.batch_id == self.model.batch_id, sibling.status == RunStatusEnum.RUNNING)
+            .scalar_subquery()
+        )
+        batch_limit = select(RunBatch.max_concurrency).where(RunBatch.id == self.model.batch_id).scalar_subquery()
+        return and_(
+            or_(
+                self.model.status == RunStatusEnum.PENDING,
+                and_(self.model.status == RunStatusEnum.RUNNING, self.model.lease_expires_at < now),
+            ),
+            or_(self.model.batch_id == None, running_siblings < batch_limit),
+        )
+
+    def _claim_order(self):
+        # Sequence runs before batch children, then the user with the fewest runs executing
+        # (so one user's backlog cannot take every worker), then oldest first
+        user_run = aliased(self.model)
+        running_for_user = (
+            select(func.count(user_run.id))
+            .where(user_run.user_id == self.model.user_id, user_run.status == RunStatusEnum.RUNNING)
+            .scalar_subquery()
+        )
+        return (
+            case((self.model.batch_id == None, 0), else_=1),
+            running_for_user,
+            self.model.created_at,
+            self.model.id,
+        )
+
+    async def claim_next(self, db: AsyncSession, *, worker_id: str, lease_seconds: float) -> Optional[Run]:
+        """
+        Atomically claims the next claimable run for `worker_id` (see _claim_order) and commits the claim.
+        Postgres uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never block on
+        each other; other dialects (SQLite) use a compare-and-swap UPDATE on the candidate row.
+        """
+        now = datetime.now(timezone.utc)
+        claim_values = dict(
+            status=RunStatusEnum.RUNNING,
+            claimed_by=worker_id,
+            claimed_at=now,
+            heartbeat_at=now,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            claim_count=self.model.claim_count + 1,
+        )
+        if db.bind.dialect.name == "postgresql":
+            result = await db.execute(
+                select(self.model.id)
+                .filter(self._claimable(now))
+                .order_by(*self._claim_order())
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            run_id = result.scalar_one_or_none()
+            if run_id is None:
+                await db.rollback()
+                return None
+            await db.execute(update(self.model).where(self.model.id == run_id).values(**claim_values))
+            await db.commit()
+            return await self.get(db, id=run_id)
+
+        candidates = await db.execute(
+            select(self.model.id)
+            .filter(self._claimable(now))
+            .order_by(*self._claim_order())
+            .limit(10)
+        )
+        for run_id in candidates.scalars().all():
+            # Only one worker's UPDATE can still match the claimable condition
+            result = await db.execute(
+                update(self.model)
+                .where(self.model.id == run_id, self._claimable(now))
+                .values(**claim_values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if result.rowcount == 1:
+                return await self.get(db, id=run_id)
+        return None
+
+    async def renew_lease(self, db: AsyncSession, *, run_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Heartbeat. False means the claim was lost (lease expired and another worker took the run)."""
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.id == run_id, self.model.claimed_by == worker_id)
+            .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def release_claim(self, db: AsyncSession, *, run_id: int, worker_id: str) -> bool:
+        """Returns an unfinished run to PENDING so another worker can pick it up right away."""
+        result = await db.execute(
+            update(self.model)
+            .where(
+                self.model.id == run_id,
+                self.model.claimed_by == worker_id,
+                self.model.status == RunStatusEnum.RUNNING,
+            )
+            .values(status=RunStatusEnum.PENDING, claimed_by=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def count_pending(self, db: AsyncSession) -> int:
+        """Pending interactive runs; batch child runs have their own limit (RUN_BATCH_MAX_ROWS)."""
+        result = await db.execute(
+            select(func.count(self.model.id))
+            .filter(self.model.status == RunStatusEnum.PENDING, self.model.batch_id == None)
+        )
+        return result.scalar_one()
+
 class CRUDBlockRun(CRUDBase[BlockRun, BlockRunCreate, BaseModel]): # UpdateSchema not used from API
     # BlockRuns are typically created by the system (execution engine), not directly via API in full detail.
     # The create method from CRUDBase can be used internally by the engine.
-    pass
+    async def get_reusable(self, db: AsyncSession, *, sequence_id: int, fingerprint: str) -> Optional[BlockRun]:
+        """Latest COMPLETED block run of the sequence with exactly these inputs."""
+        result = await db.execute(
+            select(self.model)
+            .join(Run, Run.id == self.model.run_id)
+            .filter(
+                Run.sequence_id == sequence_id,
+                self.model.input_fingerprint == fingerprint,
+                self.model.status == RunStatusEnum.COMPLETED,
+            )
+            .order_by(self.model.completed_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+class CRUDRunBatch(CRUDBase[RunBatch, BaseModel, BaseModel]): # Created by the batch upload endpoint only
+    async def get_by_id_and_user(self, db: AsyncSession, *, id: int, user_id: int) -> Optional[RunBatch]:
+        result = await db.execute(select(self.model).filter(self.model.id == id, self.model.user_id == user_id))
+        return result.scalar_one_or_none()
+
+    async def get_multi_by_user(self, db: AsyncSession, *, user_id: int, skip: int = 0, limit: int = 100) -> List[RunBatch]:
+        result = await db.execute(
+            select(self.model)
+            .filter(self.model.user_id == user_id)
+            .order_by(self.model.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def status_counts(self, db: AsyncSession, *, batch_id: int) -> Dict[RunStatusEnum, int]:
+        result = await db.execute(
+            select(Run.status, func.count(Run.id)).filter(Run.batch_id == batch_id).group_by(Run.status)
+        )
+        return {status: count for status, count in result.all()}
+
+    async def get_runs_page(
+        self, db: AsyncSession, *, batch_id: int, after_row_index: int = -1, limit: int = 500
+    ) -> List[Run]:
+        """Child runs in row order, keyset-paginated on batch_row_index."""
+        result = await db.execute(
+            select(Run)
+            .filter(Run.batch_id == batch_id, Run.batch_row_index > after_row_index)
+            .order_by(Run.batch_row_index)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def cancel_runs(self, db: AsyncSession, *, batch_id: int) -> List[int]:
+        """Marks every unfinished child run CANCELLED and returns their ids."""
+        unfinished = [RunStatusEnum.PENDING, RunStatusEnum.RUNNING]
+        result = await db.execute(select(Run.id).filter(Run.batch_id == batch_id, Run.status.in_(unfinished)))
+        run_ids = list(result.scalars().all())
+        await db.execute(
+            update(Run)
+            .where(Run.batch_id == batch_id, Run.status.in_(unfinished))
+            .values(status=RunStatusEnum.CANCELLED, completed_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return run_ids
+
+class CRUDBlockItemCheckpoint(CRUDBase[BlockItemCheckpoint, BaseModel, BaseModel]): # Written by the execution engine only
+    async def get_outputs(self, db: AsyncSession, *, run_id: int, block_id: int) -> Dict[str, str]:
+        """prompt_hash -> output_text of every checkpointed call of the block."""
+        result = await db.execute(
+            select(self.model.prompt_hash, self.model.output_text)
+            .filter(self.model.run_id == run_id, self.model.block_id == block_id)
+        )
+        return {prompt_hash: output_text for prompt_hash, output_text in result.all()}
+
+    async def bulk_store(self, db: AsyncSession, *, entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            db.add(self.model(**entry))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Some were stored already (e.g. by a previous attempt of the run); store the rest one by one
+            await db.rollback()
+            for entry in entries:
+                db.add(self.model(**entry))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    await db.rollback()
+
+    async def delete_for_run(self, db: AsyncSession, *, run_id: int) -> None:
+        """Called once a run completed; its block runs hold the outputs from then on. Does not commit."""
+        await db.execute(delete(self.model).where(self.model.run_id == run_id))
 
 run = CRUDRun(Run)
 block_run = CRUDBlockRun(BlockRun)
+run_batch = CRUDRunBatch(RunBatch)
+block_item_checkpoint = CRUDBlockItemCheckpoint(BlockItemCheckpoint)
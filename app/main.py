@@ -1,26 +1,55 @@
 # (Content from previous response - unchanged and correct)
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 from app.core.config import settings
 from app.api.routes import (
-    auth, sequences, blocks, variables, global_lists, engine, runs
+    auth, sequences, blocks, variables, global_lists, engine, runs, batches
 )
 # For Alembic auto-generation, ensure models are imported somewhere Base can see them
 from app.db import base as db_base # To ensure Base.metadata is populated
-from app.models import User, Sequence, Block, Variable, GlobalList, GlobalListItem, Run, BlockRun # Explicitly import models
+from app.models import User, Sequence, Block, Variable, GlobalList, GlobalListItem, Run, RunBatch, BlockRun, LLMCacheEntry # Explicitly import models
+from app.services.llm_interface import init_llm_client, close_llm_client
+from app.services.llm_cache import response_cache
+from app.services.cache_invalidation import cache_invalidation
+from app.services.run_queue import run_queue
 
 # Setup logging
 logging.basicConfig(level=logging.INFO if settings.ENVIRONMENT == "prod" else logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Application startup...")
+    try:
+        from app.db.session import engine as db_engine # Renamed to avoid conflict
+        async with db_engine.connect() as connection:
+            logger.info("Database connection successful.")
+    except Exception as e:
+        logger.error(f"Database connection failed on startup: {e}")
+    # One pooled async LLM client per worker process, shared by every request
+    await init_llm_client()
+    await cache_invalidation.start()
+    # Sequence runs execute on background workers, not in the request that created them
+    if settings.RUN_WORKERS_IN_API_PROCESS:
+        run_queue.start()
+    yield
+    logger.info("Application shutdown...")
+    await run_queue.shutdown() # Drains in-flight runs before the LLM client goes away
+    await response_cache.close()
+    await close_llm_client()
+    cache_invalidation.close()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     version="0.1.0",
-    description="Backend for MPSG AI Sequence Generator"
+    description="Backend for MPSG AI Sequence Generator",
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -44,6 +73,7 @@ app.include_router(variables.router, prefix=f"{settings.API_V1_STR}/variables",
 app.include_router(global_lists.router, prefix=f"{settings.API_V1_STR}/global-lists", tags=["Global Lists"])
 app.include_router(engine.router, prefix=f"{settings.API_V1_STR}/engine", tags=["Execution Engine Utilities"])
 app.include_router(runs.router, prefix=f"{settings.API_V1_STR}/runs", tags=["Runs & Execution History"])
+app.include_router(batches.router, prefix=f"{settings.API_V1_STR}/batches", tags=["Batch Runs"])
 
 
 @app.get(f"{settings.API_V1_STR}/healthcheck", tags=["Health Check"])
@@ -52,17 +82,6 @@ async def healthcheck():
     # Could add a DB ping here for a more comprehensive health check
     return {"status": "ok", "project_name": settings.PROJECT_NAME, "environment": settings.ENVIRONMENT}
 
-# Optional: Add startup event for DB connection test or other init tasks
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Application startup...")
-    try:
-        from app.db.session import engine as db_engine # Renamed to avoid conflict
-        async with db_engine.connect() as connection:
-            logger.info("Database connection successful.")
-    except Exception as e:
-        logger.error(f"Database connection failed on startup: {e}")
-
 if __name__ == "__main__":
     import uvicorn
     # This is for direct execution (e.g. python app/main.py)
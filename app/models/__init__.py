@@ -9,7 +9,8 @@ from .sequence import Sequence # noqa
 from .block import Block, BlockTypeEnum # noqa
 from .variable import Variable, VariableTypeEnum # noqa
 from .global_list import GlobalList, GlobalListItem # noqa
-from .run import Run, BlockRun, RunStatusEnum # noqa
+from .run import Run, RunBatch, BlockRun, BlockItemCheckpoint, RunStatusEnum # noqa
+from .llm_cache import LLMCacheEntry # noqa
 
 # You can also define __all__ if you want to control what `from app.models import *` imports
 __all__ = [
@@ -20,10 +21,13 @@ __all__ = [
     "Variable",
     "VariableTypeEnum",
     "Run",
+    "RunBatch",
     "BlockRun",
+    "BlockItemCheckpoint",
     "RunStatusEnum",
     "GlobalList",
     "GlobalListItem",
+    "LLMCacheEntry",
     "Base" # from app.db.base
 ]
 
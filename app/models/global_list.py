@@ -8,6 +8,7 @@ class GlobalList(Base):
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1") # Bumped on every write to the list or its items
 
     owner = relationship("User", back_populates="global_lists")
     items = relationship("GlobalListItem", back_populates="global_list", cascade="all, delete-orphan", lazy="selectin")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime
+from app.db.base import Base
+
+class LLMCacheEntry(Base): # Persistent tier of the LLM response cache
+    __tablename__ = "llm_response_cache"
+    # sha256 of (rendered prompt, model, temperature, max_tokens), see services/llm_cache.py
+    cache_key = Column(String(64), unique=True, index=True, nullable=False)
+    model = Column(String, nullable=False)
+    temperature = Column(Float, nullable=False)
+    max_tokens = Column(Integer, nullable=False)
+    response_text = Column(Text, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=True) # NULL = never expires
+    hit_count = Column(Integer, nullable=False, default=0)
@@ -1,6 +1,6 @@
 # (Content from previous response - unchanged and correct)
 import enum
-from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey, DateTime, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey, DateTime, Boolean, UniqueConstraint, Enum as SQLAlchemyEnum
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from app.models.block import BlockTypeEnum # Re-import for snapshot type
@@ -11,12 +11,13 @@ class RunStatusEnum(str, enum.Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     CANCELLED = "cancelled" # Optional
+    PARTIAL = "partial" # Finished, but some list items / matrix cells failed (tolerant item errors)
 
 class Run(Base): # Represents a single execution of a sequence
     __tablename__ = "runs"
     sequence_id = Column(Integer, ForeignKey("sequences.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False) # User who initiated the run
-    status = Column(SQLAlchemyEnum(RunStatusEnum), nullable=False, default=RunStatusEnum.PENDING)
+    status = Column(SQLAlchemyEnum(RunStatusEnum), nullable=False, default=RunStatusEnum.PENDING, index=True)
     
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
@@ -27,10 +28,44 @@ class Run(Base): # Represents a single execution of a sequence
 
     # Optional: Store the LLM model used for this run if it was overridden globally for the run
     llm_model_override = Column(String, nullable=True)
+    # LLM response cache switch for the whole run. NULL = default policy (cache deterministic calls only)
+    use_cache = Column(Boolean, nullable=True)
+
+    # Worker claim (DB-backed run queue). A RUNNING run whose lease has expired is claimable again.
+    claimed_by = Column(String, nullable=True) # Worker id holding the run
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    claim_count = Column(Integer, nullable=False, default=0) # Times the run was claimed (re-claims after crashes)
+
+    # Child runs of a batch run: one per uploaded input row
+    batch_id = Column(Integer, ForeignKey("run_batches.id"), nullable=True, index=True)
+    batch_row_index = Column(Integer, nullable=True)
 
     sequence = relationship("Sequence", back_populates="runs")
     user = relationship("User", back_populates="runs")
+    batch = relationship("RunBatch", back_populates="runs")
     block_runs = relationship("BlockRun", back_populates="run", cascade="all, delete-orphan", order_by="BlockRun.started_at") # Order by execution start
+    item_checkpoints = relationship("BlockItemCheckpoint", back_populates="run", cascade="all, delete-orphan")
+
+class RunBatch(Base): # One sequence executed over many input rows, each row a child Run
+    __tablename__ = "run_batches"
+    sequence_id = Column(Integer, ForeignKey("sequences.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # PENDING while rows are uploaded, RUNNING once queued, CANCELLED or FAILED (bad upload).
+    # Completion is derived from the child runs, see services/batch_runs.py
+    status = Column(SQLAlchemyEnum(RunStatusEnum), nullable=False, default=RunStatusEnum.PENDING)
+    input_format = Column(String, nullable=False) # "csv" or "jsonl"
+    input_columns_json = Column(JSON, nullable=True) # Input variable names in upload order, used for the CSV export
+    total_runs = Column(Integer, nullable=False, default=0)
+    max_concurrency = Column(Integer, nullable=False) # Child runs executing at once, across all workers
+    llm_model_override = Column(String, nullable=True)
+    use_cache = Column(Boolean, nullable=True)
+    error_message = Column(Text, nullable=True)
+
+    sequence = relationship("Sequence", back_populates="run_batches")
+    user = relationship("User", back_populates="run_batches")
+    runs = relationship("Run", back_populates="batch", cascade="all, delete-orphan")
 
 class BlockRun(Base): # Represents the execution of a single block within a Run
     __tablename__ = "block_runs"
@@ -56,5 +91,26 @@ class BlockRun(Base): # Represents the execution of a single block within a Run
     
     error_message = Column(Text, nullable=True) # If this specific block run failed
 
+    # LLM response cache counters for the calls made by this block run
+    cache_hits = Column(Integer, nullable=False, default=0)
+    cache_misses = Column(Integer, nullable=False, default=0)
+    # Retry/hedge/latency metrics for the upstream LLM calls (see LLMCallStats.metrics_json)
+    llm_call_metrics_json = Column(JSON, nullable=True)
+    # sha256 of the block type, model, config and rendered prompt(s); equal fingerprints mean equal LLM inputs
+    input_fingerprint = Column(String(64), nullable=True, index=True)
+    reused_from_block_run_id = Column(Integer, nullable=True) # Outputs copied from this block run instead of calling the LLM
+
     run = relationship("Run", back_populates="block_runs")
     block = relationship("Block", back_populates="block_runs") # Link to the original block
+
+
+class BlockItemCheckpoint(Base): # One finished LLM call of a block, persisted while the run is still executing
+    __tablename__ = "block_item_checkpoints"
+    __table_args__ = (UniqueConstraint("run_id", "block_id", "prompt_hash", name="uq_block_item_checkpoint"),)
+    run_id = Column(Integer, ForeignKey("runs.id"), nullable=False, index=True)
+    block_id = Column(Integer, nullable=False) # Not a FK: checkpoints only matter while the block still exists
+    item_index = Column(Integer, nullable=False) # First list item / cell (in loop order) with this prompt
+    prompt_hash = Column(String(64), nullable=False) # sha256 of the rendered prompt; a changed prompt is not resumed
+    output_text = Column(Text, nullable=False)
+
+    run = relationship("Run", back_populates="item_checkpoints")
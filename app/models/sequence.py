@@ -1,5 +1,5 @@
 # (Content from previous response - unchanged and correct)
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -9,8 +9,10 @@ class Sequence(Base):
     description = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     default_llm_model = Column(String, nullable=True, default="claude-3-opus-20240229") # Example default
+    llm_retry_config_json = Column(JSON, nullable=True) # LLMRetryConfig overrides for all blocks, NULL = settings defaults
 
     owner = relationship("User", back_populates="sequences")
     blocks = relationship("Block", back_populates="sequence", cascade="all, delete-orphan", order_by="Block.order")
     variables = relationship("Variable", back_populates="sequence", cascade="all, delete-orphan")
     runs = relationship("Run", back_populates="sequence", cascade="all, delete-orphan")
+    run_batches = relationship("RunBatch", back_populates="sequence", cascade="all, delete-orphan")
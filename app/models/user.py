@@ -14,5 +14,6 @@ class User(Base):
     sequences = relationship("Sequence", back_populates="owner", cascade="all, delete-orphan")
     global_lists = relationship("GlobalList", back_populates="owner", cascade="all, delete-orphan")
     runs = relationship("Run", back_populates="user", cascade="all, delete-orphan")
+    run_batches = relationship("RunBatch", back_populates="user", cascade="all, delete-orphan")
     variables = relationship("Variable", back_populates="owner")
 
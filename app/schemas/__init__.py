@@ -9,5 +9,5 @@ from .block import (
 )
 from .variable import VariableCreate, VariableRead, VariableUpdate, VariableTypeEnum, AvailableVariable
 from .global_list import GlobalListCreate, GlobalListRead, GlobalListUpdate, GlobalListItemCreate, GlobalListItemRead, GlobalListItemUpdate
-from .run import RunCreate, RunRead, RunUpdate, BlockRunRead, BlockRunCreate, RunReadWithDetails
+from .run import RunCreate, RunRead, RunUpdate, BlockRunRead, BlockRunCreate, RunReadWithDetails, RunBatchRead, RunBatchProgress
 from .msg import Msg
@@ -5,8 +5,18 @@ from datetime import datetime
 from app.models.block import BlockTypeEnum # Import Enum from models
 
 # --- Block Config Schemas ---
+class LLMRetryConfig(BaseModel):
+    max_attempts: Optional[int] = Field(default=None, ge=1, le=10, description="Attempts per LLM call, including the first. Defaults to LLM_RETRY_MAX_ATTEMPTS.")
+    base_delay_seconds: Optional[float] = Field(default=None, ge=0, description="Base of the full-jitter exponential backoff between attempts.")
+    max_delay_seconds: Optional[float] = Field(default=None, ge=0, description="Upper bound for a single backoff delay.")
+    hedge: Optional[bool] = Field(default=None, description="Send a duplicate request when a call is slower than the model's observed p95 latency.")
+
 class BlockConfigBase(BaseModel):
     prompt: Optional[str] = Field(default="", description="Prompt template for the LLM. Use Jinja2 syntax like {{variable_name}}.")
+    temperature: Optional[float] = Field(default=None, ge=0, le=1, description="Sampling temperature. Defaults to the LLM interface default.")
+    max_tokens: Optional[int] = Field(default=None, ge=1, description="Max output tokens per LLM call. Defaults to the LLM interface default.")
+    use_cache: Optional[bool] = Field(default=None, description="Use the LLM response cache for this block. Overrides the run setting; default caches only temperature 0 calls.")
+    retry: Optional[LLMRetryConfig] = Field(default=None, description="Retry/hedging overrides for this block's LLM calls. Applied over the sequence's llm_retry_config_json.")
 
 class BlockConfigStandard(BlockConfigBase):
     output_variable_name: str = Field(default="output", description="Name of the variable to store the LLM output.")
@@ -19,18 +29,22 @@ class BlockConfigSingleList(BlockConfigBase):
     prompt: str = Field(..., description="Prompt template. Use {{item}} for the current list item and {{item_index}} for its index.")
     input_list_variable_name: str = Field(..., description="Name of the global list or variable (which should be a list) to iterate over.")
     output_list_variable_name: str = Field(default="processed_list", description="Name for the new list variable containing results.")
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=256, description="Max list items processed concurrently. Defaults to LLM_BLOCK_MAX_CONCURRENCY; always capped by the per-run limit.")
+    tolerate_item_errors: Optional[bool] = Field(default=None, description="A failed item gets an error marker in its slot instead of failing the block; the block finishes PARTIAL. Defaults to RUN_TOLERATE_ITEM_ERRORS.")
     # store_in_global_list: Optional[bool] = Field(default=False) # Future: option to save output list as a new global list
     # global_list_name: Optional[str] = Field(default=None) # Future: name if stored
 
 class BlockConfigMultiListInputItem(BaseModel):
     name: str = Field(..., description="Name of the global list or variable (which should be a list).")
     # item_placeholder_in_prompt: str = Field(..., description="Placeholder name for items from this list in the prompt, e.g., {{claims_item}}")
-    # priority: int = Field(default=1, ge=1, description="Priority for looping. Lower numbers are higher priority.") # Future: for complex iteration logic
+    priority: int = Field(default=1, ge=1, description="Priority for looping. Lower numbers are higher priority (outer loop).")
 
 class BlockConfigMultiList(BlockConfigBase):
     prompt: str = Field(..., description="Prompt template. Use placeholders like {{item1}}, {{item2}} for current items from respective lists.")
-    input_lists_config: List[BlockConfigMultiListInputItem] = Field(..., min_length=1, description="Configuration for input lists. The engine will typically use the first as primary, second as secondary for matrix, etc.")
-    output_matrix_variable_name: str = Field(default="comparison_matrix", description="Name for the new matrix (list of lists or dict of dicts) variable.")
+    input_lists_config: List[BlockConfigMultiListInputItem] = Field(..., min_length=1, description="Configuration for input lists. The engine iterates the cartesian product of all lists; list N is bound to {{itemN}} and is axis N-1 of the output matrix.")
+    output_matrix_variable_name: str = Field(default="comparison_matrix", description="Name for the new matrix (nested lists, one level per input list) variable.")
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=256, description="Max matrix cells processed concurrently. Defaults to LLM_BLOCK_MAX_CONCURRENCY; always capped by the per-run limit.")
+    tolerate_item_errors: Optional[bool] = Field(default=None, description="A failed cell gets an error marker in its slot instead of failing the block; the block finishes PARTIAL. Defaults to RUN_TOLERATE_ITEM_ERRORS.")
 
 # --- Main Block Schemas ---
 class BlockBase(BaseModel):
@@ -1,8 +1,37 @@
 # app/schemas/engine.py
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 class PreviewPromptRequest(BaseModel):
     sequence_id: int
     block_id: int
     input_overrides: Optional[Dict[str, Any]] = None
+
+
+class EstimateRequest(BaseModel):
+    sequence_id: int
+    input_overrides: Optional[Dict[str, Any]] = None
+    llm_model_override: Optional[str] = None
+
+class BlockEstimate(BaseModel):
+    block_id: int
+    name: str
+    type: str
+    model: str
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    wall_time_seconds: float
+    cost_usd: float
+    error: Optional[str] = None # The block could not be resolved (e.g. its input list is missing)
+
+class SequenceEstimate(BaseModel):
+    sequence_id: int
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    wall_time_seconds: float
+    cost_usd: float
+    budget_usd: Optional[float] = None
+    within_budget: bool
+    blocks: List[BlockEstimate]
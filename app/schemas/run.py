@@ -16,6 +16,11 @@ class BlockRunBase(BaseModel):
     list_outputs_json: Optional[Dict[str, Any]] = None # e.g. {"values": [...]}
     matrix_outputs_json: Optional[Dict[str, Any]] = None # e.g. {"values": [[...]]}
     error_message: Optional[str] = None
+    cache_hits: int = 0
+    cache_misses: int = 0
+    llm_call_metrics_json: Optional[Dict[str, Any]] = None
+    input_fingerprint: Optional[str] = None
+    reused_from_block_run_id: Optional[int] = None
 
 class BlockRunCreate(BlockRunBase):
     run_id: int
@@ -43,10 +48,12 @@ class RunBase(BaseModel):
     status: RunStatusEnum = RunStatusEnum.PENDING
     input_overrides_json: Optional[Dict[str, Any]] = Field(None, example={"customer_query": "My order is late."})
     llm_model_override: Optional[str] = Field(None, example="claude-3-haiku-20240307")
+    use_cache: Optional[bool] = None
 class RunCreate(BaseModel):
     sequence_id: int
     input_overrides_json: Optional[Dict[str, Any]] = Field(None, example={"customer_query": "My order is late."})
     llm_model_override: Optional[str] = Field(None, example="claude-3-haiku-20240307")
+    use_cache: Optional[bool] = Field(None, description="Use the LLM response cache for this run. Default: only for deterministic (temperature 0) calls.")
 
 
 class RunUpdate(BaseModel): # For internal updates by the execution engine
@@ -65,6 +72,10 @@ class RunRead(RunBase):
     results_summary_json: Optional[Dict[str, Any]] = None
     prompt_text: Optional[str] = None
     error_message: Optional[str] = None
+    claimed_by: Optional[str] = None
+    claim_count: int = 0
+    batch_id: Optional[int] = None
+    batch_row_index: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -73,3 +84,32 @@ class RunRead(RunBase):
 
 class RunReadWithDetails(RunRead):
     block_runs: List[BlockRunRead] = []
+
+# --- RunBatch Schemas ---
+class RunBatchProgress(BaseModel):
+    total: int = 0
+    pending: int = 0
+    running: int = 0
+    completed: int = 0
+    partial: int = 0
+    failed: int = 0
+    cancelled: int = 0
+
+class RunBatchRead(BaseModel):
+    id: int
+    sequence_id: int
+    user_id: int
+    status: RunStatusEnum # Derived from the child runs once the batch is queued
+    input_format: str
+    input_columns_json: Optional[List[str]] = None
+    total_runs: int
+    max_concurrency: int
+    llm_model_override: Optional[str] = None
+    use_cache: Optional[bool] = None
+    error_message: Optional[str] = None
+    progress: RunBatchProgress = RunBatchProgress()
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
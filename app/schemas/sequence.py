@@ -2,6 +2,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
+from app.schemas.block import LLMRetryConfig
 # Forward references for nested schemas if needed, or import directly
 # from .block import BlockRead
 # from .variable import VariableRead
@@ -10,6 +11,7 @@ class SequenceBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255, example="Customer Support Email Categorizer")
     description: Optional[str] = Field(None, example="A sequence to categorize incoming support emails.")
     default_llm_model: Optional[str] = Field("claude-3-opus-20240229", example="claude-3-haiku-20240307")
+    llm_retry_config_json: Optional[LLMRetryConfig] = Field(None, description="Retry/hedging defaults for every LLM call of the sequence.")
 
 class SequenceCreate(SequenceBase):
     pass # user_id will be injected from current_user
@@ -18,6 +20,7 @@ class SequenceUpdate(SequenceBase):
     name: Optional[str] = Field(None, min_length=1, max_length=255)
     description: Optional[str] = None
     default_llm_model: Optional[str] = None
+    llm_retry_config_json: Optional[LLMRetryConfig] = None
 
 class SequenceRead(SequenceBase):
     id: int
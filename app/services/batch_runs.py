@@ -0,0 +1,235 @@
+import codecs
+import csv
+import io
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List
+
+from app import models
+from app.core.config import settings
+from app.crud import crud_block, crud_run
+from app.db.session import AsyncSessionFactory
+from app.models.run import RunStatusEnum
+from app.services import run_estimator
+from app.services.run_queue import run_queue
+
+logger = logging.getLogger(__name__)
+
+INPUT_FORMATS = ("csv", "jsonl")
+
+
+class BatchInputError(ValueError):
+    pass
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decodes a byte stream into lines (keeping their line endings) without buffering the whole upload."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop() # Unfinished last line, completed by the next chunk
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def iter_input_rows(chunks: AsyncIterator[bytes], input_format: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parses an uploaded CSV (header row = input variable names) or JSONL (one JSON object
+    per line) stream into input_overrides dicts, one per row.
+    """
+    if input_format == "jsonl":
+        line_number = 0
+        async for line in _iter_lines(chunks):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise BatchInputError(f"Line {line_number} is not valid JSON: {e}")
+            if not isinstance(row, dict):
+                raise BatchInputError(f"Line {line_number} must be a JSON object of input values.")
+            yield row
+        return
+
+    header = None
+    record = ""
+    async for line in _iter_lines(chunks):
+        # A quoted field may contain line breaks: a record is complete once its quotes are balanced
+        record += line
+        if record.count('"') % 2:
+            continue
+        fields = next(csv.reader([record]), [])
+        record = ""
+        if not any(field.strip() for field in fields):
+            continue
+        if header is None:
+            header = [field.strip() for field in fields]
+            if not all(header):
+                raise BatchInputError("CSV header contains an empty column name.")
+            continue
+        if len(fields) != len(header):
+            raise BatchInputError(f"CSV row has {len(fields)} fields, the header has {len(header)}.")
+        yield dict(zip(header, fields))
+    if record.strip():
+        raise BatchInputError("CSV ends inside a quoted field.")
+
+
+async def check_batch_budget(
+    db, batch: models.RunBatch, sequence: models.Sequence, rows: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Applies the per-run cost budget of POST /runs to every row before any child run is queued:
+    the upload is read in full and each row estimated, so one row over budget rejects the batch.
+    Returns the rows to pass on to create_batch_runs.
+    """
+    checked: List[Dict[str, Any]] = []
+    async for row in rows:
+        if len(checked) >= settings.RUN_BATCH_MAX_ROWS:
+            raise BatchInputError(f"Batches are limited to {settings.RUN_BATCH_MAX_ROWS} rows.")
+        estimate = await run_estimator.estimate_sequence(
+            db, sequence, batch.user_id, input_overrides=row, llm_model_override=batch.llm_model_override
+        )
+        if not estimate["within_budget"]:
+            raise BatchInputError(
+                f"Row {len(checked) + 1}: estimated cost ${estimate['cost_usd']:.2f} ({estimate['llm_calls']} LLM calls) "
+                f"exceeds the per-run budget of ${estimate['budget_usd']:.2f}."
+            )
+        checked.append(row)
+
+    async def replay() -> AsyncIterator[Dict[str, Any]]:
+        for row in checked:
+            yield row
+    return replay()
+
+
+async def create_batch_runs(db, batch: models.RunBatch, rows: AsyncIterator[Dict[str, Any]]) -> int:
+    """
+    Creates one PENDING child run per input row. Rows are committed in chunks of
+    RUN_BATCH_INSERT_CHUNK_SIZE, so workers start executing while the upload is still streaming.
+    """
+    columns: Dict[str, None] = {}
+    chunk: List[models.Run] = []
+    total = 0
+
+    async def commit_chunk() -> None:
+        db.add_all(chunk)
+        batch.total_runs = total
+        batch.input_columns_json = list(columns)
+        await db.commit()
+        chunk.clear()
+        run_queue.notify()
+        await db.refresh(batch, attribute_names=["status"])
+        if batch.status == RunStatusEnum.CANCELLED:
+            raise BatchInputError("Batch was cancelled during the upload.")
+
+    async for row in rows:
+        if total >= settings.RUN_BATCH_MAX_ROWS:
+            raise BatchInputError(f"Batches are limited to {settings.RUN_BATCH_MAX_ROWS} rows.")
+        columns.update(dict.fromkeys(row))
+        chunk.append(models.Run(
+            sequence_id=batch.sequence_id, user_id=batch.user_id, status=RunStatusEnum.PENDING,
+            input_overrides_json=row, llm_model_override=batch.llm_model_override, use_cache=batch.use_cache,
+            batch_id=batch.id, batch_row_index=total,
+        ))
+        total += 1
+        if len(chunk) >= settings.RUN_BATCH_INSERT_CHUNK_SIZE:
+            await commit_chunk()
+    if chunk:
+        await commit_chunk()
+    logger.info(f"Batch {batch.id}: queued {total} runs")
+    return total
+
+
+def batch_progress(counts: Dict[RunStatusEnum, int]) -> Dict[str, int]:
+    progress = {status.value: counts.get(status, 0) for status in RunStatusEnum}
+    progress["total"] = sum(counts.values())
+    return progress
+
+
+def batch_status(batch: models.RunBatch, counts: Dict[RunStatusEnum, int]) -> RunStatusEnum:
+    """A queued batch is RUNNING until every child run finished, then COMPLETED, PARTIAL or FAILED."""
+    if batch.status != RunStatusEnum.RUNNING:
+        return batch.status
+    if counts.get(RunStatusEnum.PENDING) or counts.get(RunStatusEnum.RUNNING):
+        return RunStatusEnum.RUNNING
+    succeeded = counts.get(RunStatusEnum.COMPLETED, 0)
+    if succeeded == sum(counts.values()):
+        return RunStatusEnum.COMPLETED
+    if succeeded or counts.get(RunStatusEnum.PARTIAL):
+        return RunStatusEnum.PARTIAL
+    return RunStatusEnum.FAILED
+
+
+def _run_outputs(run: models.Run) -> Dict[str, Any]:
+    """Output variables of a run, flattened from results_summary_json (one entry per block)."""
+    outputs: Dict[str, Any] = {}
+    for block_outputs in (run.results_summary_json or {}).values():
+        if not isinstance(block_outputs, dict):
+            continue
+        if "name" in block_outputs and "values" in block_outputs: # Stored list/matrix outputs (edited block runs)
+            outputs[block_outputs["name"]] = block_outputs["values"]
+        else:
+            outputs.update(block_outputs)
+    return outputs
+
+
+def _output_columns(blocks: List[models.Block]) -> List[str]:
+    columns: Dict[str, None] = {}
+    for block in blocks:
+        config = block.config_json or {}
+        for key in ("output_variable_name", "output_list_variable_name", "output_matrix_variable_name"):
+            if config.get(key):
+                columns[config[key]] = None
+        columns.update(dict.fromkeys(config.get("output_names") or []))
+    return list(columns)
+
+
+def _csv_line(values: List[Any]) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(
+        value if isinstance(value, str) or value is None else json.dumps(value, ensure_ascii=False)
+        for value in values
+    )
+    return out.getvalue()
+
+
+async def iter_batch_results(batch: models.RunBatch, output_format: str, page_size: int = 500) -> AsyncIterator[str]:
+    """
+    Streams one result line per child run, in row order: its status, inputs and output variables.
+    Uses its own session so the response can outlive the request's session.
+    """
+    async with AsyncSessionFactory() as db:
+        input_columns = batch.input_columns_json or []
+        output_columns = _output_columns(await crud_block.block.get_multi_by_sequence(db, sequence_id=batch.sequence_id))
+        if output_format == "csv":
+            yield _csv_line(["row_index", "run_id", "status", "error_message", *input_columns, *output_columns])
+
+        after_row_index = -1
+        while True:
+            runs = await crud_run.run_batch.get_runs_page(
+                db, batch_id=batch.id, after_row_index=after_row_index, limit=page_size
+            )
+            if not runs:
+                return
+            for run in runs:
+                inputs = run.input_overrides_json or {}
+                outputs = _run_outputs(run)
+                if output_format == "csv":
+                    yield _csv_line([
+                        run.batch_row_index, run.id, run.status.value, run.error_message,
+                        *(inputs.get(column) for column in input_columns),
+                        *(outputs.get(column) for column in output_columns),
+                    ])
+                else:
+                    yield json.dumps({
+                        "row_index": run.batch_row_index, "run_id": run.id, "status": run.status.value,
+                        "error_message": run.error_message, "inputs": inputs, "outputs": outputs,
+                    }, ensure_ascii=False, default=str) + "\n"
+            after_row_index = runs[-1].batch_row_index
+            db.expunge_all() # Keep memory flat on large batches
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import socket
+import struct
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _multicast_socket(group: str, port: int, interface: str, hops: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    # Every process on the host binds the same port
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", port))
+    membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, hops)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1) # Other processes on this host must hear it too
+    sock.setblocking(False)
+    return sock
+
+
+class _InvalidationProtocol(asyncio.DatagramProtocol):
+    def __init__(self, bus: "CacheInvalidationBus"):
+        self.bus = bus
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.bus._receive(data)
+
+    def error_received(self, exc: Exception) -> None:
+        logger.warning(f"Cache invalidation socket error: {exc}")
+
+
+class CacheInvalidationBus:
+    """
+    Broadcasts cache invalidations to every API and worker process over UDP multicast
+    (CACHE_INVALIDATION_MULTICAST). Caches register a handler per channel; publish() runs the
+    local handler right away and sends one small JSON datagram the other processes hand to theirs.
+    Delivery is best effort, so caches relying on it also expire their entries after a TTL.
+    Without a multicast group, invalidations stay within the process. To try it on one machine,
+    start two processes with CACHE_INVALIDATION_MULTICAST=239.255.42.99:49152 and
+    CACHE_INVALIDATION_INTERFACE=127.0.0.1.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex # Multicast loops our own datagrams back; they are skipped
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._group: Optional[Tuple[str, int]] = None
+        self.sent = 0
+        self.received = 0
+
+    def register(self, channel: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        self._handlers[channel] = handler
+
+    async def start(self) -> None:
+        """Joins the multicast group; a no-op when none is configured or already joined."""
+        if self._transport is not None or not settings.CACHE_INVALIDATION_MULTICAST:
+            return
+        group, _, port = settings.CACHE_INVALIDATION_MULTICAST.rpartition(":")
+        try:
+            sock = _multicast_socket(group, int(port), settings.CACHE_INVALIDATION_INTERFACE, settings.CACHE_INVALIDATION_HOPS)
+            self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _InvalidationProtocol(self), sock=sock
+            )
+        except (OSError, ValueError) as e:
+            logger.error(
+                f"Cache invalidation broadcast on {settings.CACHE_INVALIDATION_MULTICAST} unavailable, "
+                f"invalidating this process only: {e}"
+            )
+            return
+        self._group = (group, int(port))
+        logger.info(f"Cache invalidations broadcast on {settings.CACHE_INVALIDATION_MULTICAST}")
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def publish(self, channel: str, **payload: Any) -> None:
+        """Invalidates in this process, then tells the others. `payload` must be JSON serializable."""
+        handler = self._handlers.get(channel)
+        if handler is not None:
+            handler(payload)
+        if self._transport is None:
+            return
+        message = json.dumps({"origin": self.origin, "channel": channel, **payload}).encode("utf-8")
+        try:
+            self._transport.sendto(message, self._group)
+            self.sent += 1
+        except OSError as e:
+            logger.warning(f"Broadcasting cache invalidation on '{channel}' failed: {e}")
+
+    def _receive(self, data: bytes) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning("Ignoring malformed cache invalidation datagram")
+            return
+        if not isinstance(message, dict) or message.pop("origin", None) == self.origin:
+            return
+        handler = self._handlers.get(message.pop("channel", None))
+        if handler is None:
+            return
+        self.received += 1
+        try:
+            handler(message)
+        except Exception as e:
+            logger.error(f"Cache invalidation handler failed for {message}: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "broadcast": self._transport is not None,
+            "group": settings.CACHE_INVALIDATION_MULTICAST or None,
+            "sent": self.sent,
+            "received": self.received,
+        }
+
+
+cache_invalidation = CacheInvalidationBus()
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+async def gather_bounded(
+    factories: Sequence[Callable[[], Awaitable[Any]]],
+    limit: int,
+    shared_semaphore: Optional[asyncio.Semaphore] = None,
+) -> List[Any]:
+    """
+    Runs the coroutine factories concurrently, at most `limit` at a time (and additionally
+    bounded by `shared_semaphore`, e.g. the per-run LLM semaphore).
+    Results are returned in the same order as `factories`. If one task fails, the
+    remaining tasks are cancelled and the first exception is re-raised.
+    """
+    if not factories:
+        return []
+    block_semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _run_one(factory: Callable[[], Awaitable[Any]]) -> Any:
+        async with block_semaphore:
+            if shared_semaphore is None:
+                return await factory()
+            async with shared_semaphore:
+                return await factory()
+
+    tasks = [asyncio.create_task(_run_one(factory)) for factory in factories]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # Let cancelled tasks unwind before propagating the original error
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
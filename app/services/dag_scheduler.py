@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from app import models
+from app.services.prompt_utils import get_template_variables
+
+logger = logging.getLogger(__name__)
+
+# Loop placeholders bound by the engine itself, never read from the sequence context
+_SINGLE_LIST_PLACEHOLDERS = {"item", "item_index"}
+_MULTI_LIST_PLACEHOLDER = re.compile(r"^item\d+(_name|_index)?$")
+
+
+def context_template_variables(block_type: models.BlockTypeEnum, template_vars: Set[str]) -> Set[str]:
+    """The template variables a block reads from the sequence context: all but its loop placeholders."""
+    if block_type == models.BlockTypeEnum.SINGLE_LIST:
+        return template_vars - _SINGLE_LIST_PLACEHOLDERS
+    if block_type == models.BlockTypeEnum.MULTI_LIST:
+        return {name for name in template_vars if not _MULTI_LIST_PLACEHOLDER.match(name)}
+    return set(template_vars)
+
+
+class BlockDependencies:
+    """What one block reads from and writes to the run context (normalized names)."""
+
+    def __init__(self, block: models.Block, reads: Set[str], writes: Set[str], ambiguous_reason: Optional[str] = None):
+        self.block = block
+        self.reads = reads
+        self.writes = writes
+        self.ambiguous_reason = ambiguous_reason
+
+
+def block_dependencies(block: models.Block, normalize: Callable[[str], str]) -> BlockDependencies:
+    """
+    Reads: the prompt's template variables plus the list inputs of list blocks.
+    Writes: the output variable names of the block type (defaults as in the config schemas).
+    """
+    config = block.config_json or {}
+    reads: Set[str] = set()
+    writes: Set[str] = set()
+    ambiguous_reason = None
+
+    try:
+        template_vars = get_template_variables(config.get("prompt") or "")
+    except ValueError as e:
+        template_vars = set()
+        ambiguous_reason = f"prompt could not be parsed ({e})"
+
+    if block.type == models.BlockTypeEnum.STANDARD:
+        writes.add(config.get("output_variable_name") or "output")
+    elif block.type == models.BlockTypeEnum.DISCRETIZATION:
+        writes.update(config.get("output_names") or [])
+    elif block.type == models.BlockTypeEnum.SINGLE_LIST:
+        if config.get("input_list_variable_name"):
+            reads.add(config["input_list_variable_name"])
+        writes.add(config.get("output_list_variable_name") or "processed_list")
+    elif block.type == models.BlockTypeEnum.MULTI_LIST:
+        reads.update(item["name"] for item in config.get("input_lists_config") or [] if item.get("name"))
+        writes.add(config.get("output_matrix_variable_name") or "comparison_matrix")
+    else:
+        ambiguous_reason = f"unknown block type {block.type}"
+
+    reads.update(context_template_variables(block.type, template_vars))
+    return BlockDependencies(
+        block,
+        reads={normalize(name) for name in reads},
+        writes={normalize(name) for name in writes},
+        ambiguous_reason=ambiguous_reason,
+    )
+
+
+class BlockGraph:
+    """
+    Dependency graph over a sequence's blocks. `dependencies[block_id]` holds the ids of
+    the blocks that must complete first. Blocks whose inputs cannot be determined safely
+    are barriers: they wait for every earlier block and every later block waits for them,
+    which is exactly the old order-based behaviour for that block.
+    """
+
+    def __init__(self, blocks: List[models.Block], dependencies: Dict[int, Set[int]], barriers: Dict[int, str]):
+        self.blocks = blocks
+        self.dependencies = dependencies
+        self.barriers = barriers
+
+
+def build_block_graph(
+    blocks: List[models.Block], known_names: Iterable[str], normalize: Callable[[str], str],
+    dependencies: Optional[List[BlockDependencies]] = None,
+) -> BlockGraph:
+    """
+    `blocks` in Block.order; `known_names` are the context keys available before any block runs.
+    A read depends on the latest earlier block writing that name, and a block that writes a
+    name an earlier block reads or writes stays after it. A block is a barrier when its prompt
+    cannot be parsed or it reads a name that neither an earlier block nor the initial context
+    provides (e.g. the SINGLE_LIST "only list in context" fallback).
+    `dependencies` may hold precomputed block_dependencies of `blocks` (see execution_plan).
+    """
+    known = {normalize(name) for name in known_names}
+    deps_by_block = dependencies or [block_dependencies(block, normalize) for block in blocks]
+    dependencies: Dict[int, Set[int]] = {block.id: set() for block in blocks}
+    barriers: Dict[int, str] = {}
+
+    for index, block_deps in enumerate(deps_by_block):
+        block_id = block_deps.block.id
+        if block_deps.ambiguous_reason:
+            barriers[block_id] = block_deps.ambiguous_reason
+        for name in block_deps.reads:
+            writer = next((earlier for earlier in reversed(deps_by_block[:index]) if name in earlier.writes), None)
+            if writer is not None:
+                dependencies[block_id].add(writer.block.id)
+            elif name not in known:
+                barriers.setdefault(block_id, f"input '{name}' is not produced by an earlier block or the initial context")
+        for later in deps_by_block[index + 1:]:
+            overlap = (block_deps.reads | block_deps.writes) & later.writes
+            if overlap:
+                # Keep the original relative order of the two blocks
+                dependencies[later.block.id].add(block_id)
+
+    for index, block in enumerate(blocks):
+        if block.id in barriers:
+            dependencies[block.id].update(earlier.id for earlier in blocks[:index])
+            for later in blocks[index + 1:]:
+                dependencies[later.id].add(block.id)
+            logger.debug(f"Block {block.id} ('{block.name}') runs in order: {barriers[block.id]}")
+
+    return BlockGraph(blocks, dependencies, barriers)
+
+
+async def run_block_graph(
+    graph: BlockGraph,
+    run_block: Callable[[models.Block], Awaitable[bool]],
+    max_parallel: int,
+) -> None:
+    """
+    Runs each block once all its dependencies completed, at most `max_parallel` at a time.
+    `run_block` returns False when the block failed; after a failure no new blocks are
+    started (in-flight ones finish), matching the stop-on-first-error behaviour of ordered runs.
+    """
+    remaining: Dict[int, models.Block] = {block.id: block for block in graph.blocks}
+    completed: Set[int] = set()
+    running: Dict[asyncio.Task, int] = {}
+    failed = False
+
+    try:
+        while remaining or running:
+            if not failed:
+                for block in graph.blocks: # Block.order breaks ties between ready blocks
+                    if len(running) >= max(1, max_parallel):
+                        break
+                    if block.id in remaining and graph.dependencies[block.id] <= completed:
+                        del remaining[block.id]
+                        running[asyncio.create_task(run_block(block))] = block.id
+            if not running:
+                break # Failed (or nothing runnable); blocks still in `remaining` are never started
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                block_id = running.pop(task)
+                if task.result():
+                    completed.add(block_id)
+                else:
+                    failed = True
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
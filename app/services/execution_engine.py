@@ -3,27 +3,46 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from app import models
-from app.crud import crud_block, crud_variable, crud_run, crud_global_list, crud_sequence
+from app.crud import crud_block, crud_variable, crud_run, crud_sequence
 from app.models.run import Run, RunStatusEnum
 from app.models.variable import VariableTypeEnum
-from app.services.llm_interface import call_claude_api
-from app.services.prompt_utils import render_prompt, discretize_output
+from app.services.llm_interface import PARSE_ERROR_OUTPUT, call_claude_api, LLMCallStats
+from app.services.llm_cache import response_cache
+from app.services.global_list_cache import global_list_cache
+from app.services.prompt_utils import LayeredContext, discretize_output
+from app.services.concurrency import gather_bounded
+from app.services.run_state import RunCancelledError, RunExecutionState, active_runs
+from app.services.run_checkpoint import RunCheckpointStore, prompt_hash
+from app.services.rate_limiter import LANE_BATCH, LANE_INTERACTIVE, LANE_STANDARD
+from app.services.run_events import (
+    BLOCK_COMPLETED, BLOCK_STARTED, ITEM_COMPLETED, RUN_FINISHED, RUN_STARTED, run_events,
+)
+from app.services.llm_retry import RetryPolicy
+from app.services.dag_scheduler import run_block_graph
+from app.services.execution_plan import BlockPlan, execution_plans
+from app.services.matrix_engine import MatrixDimension, build_matrix, cell_bindings, iter_cells, matrix_shape
 from app.schemas.run import BlockRunCreate
 from app.schemas.block import (
-    BlockConfigStandard, BlockConfigDiscretization, 
     BlockConfigSingleList, BlockConfigMultiList, BlockConfigMultiListInputItem
 )
+import asyncio
+import copy
+import hashlib
 import json
 from datetime import datetime, timezone
 import logging
-from typing import Dict, Any, Tuple, List, Optional, Union
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Iterable, Mapping, Tuple, List, Optional, Union
 from app.crud.crud_variable import variable
+from app.core.config import settings
+from app.db.session import AsyncSessionFactory
 
 
 logger = logging.getLogger(__name__)
 
 import re
-def get_context_value(context, name):
+def get_context_value(context: Mapping[str, Any], name: str):
+    # Works on plain dicts and LayeredContext views alike.
     # Try exact match, normalized, and lowercased, and finally scan all keys for a case-insensitive match.
     norm_name = _normalize_key(name)
     for try_key in [
@@ -70,8 +89,13 @@ def _normalize_key(key: str) -> str:
     return re.sub(r'[^a-zA-Z0-9_]', '_', key).replace('__', '_').strip('_').replace(' ', '_')
 
 async def _gather_sequence_context(
-    db: AsyncSession, sequence_id: int, user_id: int, input_overrides: Dict[str, Any] = None
+    db: AsyncSession, sequence_id: int, user_id: int, input_overrides: Dict[str, Any] = None,
+    referenced_names: Optional[Iterable[str]] = None,
 ) -> Dict[str, Any]:
+    """
+    `referenced_names`: the context names the blocks to execute read (see SequencePlan.referenced_names);
+    only global lists matching one of them (after _normalize_key) are loaded. None loads them all.
+    """
     context = {}
     db_vars = await crud_variable.variable.get_multi_by_sequence(db, sequence_id=sequence_id)
     for var_model in db_vars:
@@ -81,12 +105,16 @@ async def _gather_sequence_context(
         context[var_model.name] = val
         context[_normalize_key(var_model.name)] = val
 
-    # Global lists
-    global_lists_models = await crud_global_list.global_list.get_multi_by_owner(db, user_id=user_id, limit=1000)
-    for glist_model in global_lists_models:
-        list_val = [item.value for item in glist_model.items]
-        context[glist_model.name] = list_val
-        context[_normalize_key(glist_model.name)] = list_val
+    # Global lists: only the referenced ones, from the global list cache (missing items fetched in one query)
+    global_lists = await global_list_cache.lists(db, user_id)
+    if referenced_names is not None:
+        wanted = {_normalize_key(name) for name in referenced_names}
+        global_lists = [glist for glist in global_lists if _normalize_key(glist.name) in wanted]
+    global_list_values = await global_list_cache.item_values(db, global_lists)
+    for glist in global_lists:
+        list_val = global_list_values[glist.id]
+        context[glist.name] = list_val
+        context[_normalize_key(glist.name)] = list_val
 
     # Input overrides
     if input_overrides:
@@ -106,15 +134,228 @@ async def _gather_sequence_context(
     return context
 
 
+def _llm_call_kwargs(
+    config, effective_model: str, run_state: RunExecutionState, call_stats: Optional[LLMCallStats]
+) -> Dict[str, Any]:
+    """Keyword arguments for call_claude_api derived from a validated block config."""
+    kwargs: Dict[str, Any] = {
+        "model": effective_model,
+        "use_cache": config.use_cache if config.use_cache is not None else run_state.use_cache,
+        "stats": call_stats,
+        "retry_policy": RetryPolicy.resolve(run_state.retry_config, config.retry.model_dump() if config.retry else None),
+        "priority": run_state.priority,
+    }
+    if config.temperature is not None:
+        kwargs["temperature"] = config.temperature
+    if config.max_tokens is not None:
+        kwargs["max_tokens"] = config.max_tokens
+    return kwargs
+
+
+async def _dispatch_prompts(
+    prompts: List[str], llm_kwargs: Dict[str, Any], limit: int, run_state: RunExecutionState,
+    block_id: Optional[int] = None, tolerate_errors: bool = False,
+) -> List[Union[str, Dict[str, str]]]:
+    """
+    Calls the LLM once per distinct prompt, concurrently, and fans the results back out
+    so the returned list lines up with `prompts` (duplicate list items share one call).
+    With run checkpoints, prompts finished by an earlier attempt of the run are not called
+    again and every new result is checkpointed as soon as it arrives.
+    With `tolerate_errors`, a failed call puts an item error marker in its slots instead of raising.
+    On cancellation, RunCancelledError.partial_results lines up with `prompts` (None = not finished).
+    With a `block_id`, every finished item is published as an item_completed run event.
+    """
+    first_index: Dict[str, int] = {}
+    indices_by_prompt: Dict[str, List[int]] = {}
+    for idx, prompt in enumerate(prompts):
+        first_index.setdefault(prompt, idx)
+        indices_by_prompt.setdefault(prompt, []).append(idx)
+    unique_prompts = list(first_index)
+    stats = llm_kwargs.get("stats")
+    if len(unique_prompts) < len(prompts):
+        logger.debug(f"Collapsed {len(prompts)} prompts to {len(unique_prompts)} distinct LLM calls")
+        if stats is not None:
+            stats.coalesced += len(prompts) - len(unique_prompts)
+    results_by_prompt: Dict[str, str] = {}
+
+    checkpoints = run_state.checkpoints if block_id is not None else None
+    if checkpoints is not None:
+        saved = await checkpoints.load(block_id)
+        for prompt in unique_prompts:
+            output = saved.get(prompt_hash(prompt))
+            if output is not None:
+                results_by_prompt[prompt] = output
+        if results_by_prompt and stats is not None:
+            stats.checkpoint_hits += len(results_by_prompt)
+
+    done = 0
+
+    def publish_items(prompt: str) -> None:
+        nonlocal done
+        if block_id is None:
+            return
+        for idx in indices_by_prompt[prompt]:
+            done += 1
+            run_events.publish(
+                run_state.run_id, ITEM_COMPLETED, block_id=block_id,
+                index=idx, done=done, total=len(prompts), output=results_by_prompt[prompt],
+            )
+
+    for prompt in list(results_by_prompt):
+        publish_items(prompt)
+
+    async def call(prompt: str) -> None:
+        try:
+            output = await call_claude_api(prompt, **llm_kwargs)
+        except Exception as e:
+            if not tolerate_errors:
+                raise
+            logger.warning(f"LLM call for item {first_index[prompt]} failed, keeping an error marker: {e}")
+            results_by_prompt[prompt] = item_error_marker(e)
+            publish_items(prompt)
+            return
+        results_by_prompt[prompt] = output
+        if checkpoints is not None and output != PARSE_ERROR_OUTPUT:
+            checkpoints.record(block_id, first_index[prompt], prompt, output)
+        publish_items(prompt)
+
+    try:
+        await run_state.cancellable(gather_bounded(
+            [lambda p=prompt: call(p) for prompt in unique_prompts if prompt not in results_by_prompt],
+            limit=limit,
+            shared_semaphore=run_state.llm_semaphore,
+        ))
+    except RunCancelledError as e:
+        e.partial_results = [results_by_prompt.get(prompt) for prompt in prompts]
+        raise
+    return [results_by_prompt[prompt] for prompt in prompts]
+
+
+ITEM_ERROR_KEY = "error"
+
+
+def item_error_marker(error: Exception) -> Dict[str, str]:
+    """Placed in the slot of a failed list item / matrix cell (LLM outputs are always strings)."""
+    detail = getattr(error, "detail", None) or str(error) or type(error).__name__
+    return {ITEM_ERROR_KEY: str(detail)}
+
+
+def is_item_error(value: Any) -> bool:
+    return isinstance(value, dict) and set(value) == {ITEM_ERROR_KEY}
+
+
+def _tolerates_item_errors(config: Union[BlockConfigSingleList, BlockConfigMultiList]) -> bool:
+    if config.tolerate_item_errors is not None:
+        return config.tolerate_item_errors
+    return settings.RUN_TOLERATE_ITEM_ERRORS
+
+
+def _has_failed_items(list_outputs_json: Optional[Dict[str, Any]], matrix_outputs_json: Optional[Dict[str, Any]]) -> bool:
+    """True for a list/matrix block run that finished with some failed items (status PARTIAL)."""
+    return bool(
+        (list_outputs_json or {}).get("failed_indices") or (matrix_outputs_json or {}).get("failed_cells")
+    )
+
+
+def _single_list_input(config: BlockConfigSingleList, current_context: Dict[str, Any]) -> List[Any]:
+    # Add a fallback to try all context keys for lists
+    input_list = get_context_value(current_context, config.input_list_variable_name)
+    if not isinstance(input_list, list):
+        # Fallback: find any context value that is a list with 3 strings, and log the candidates.
+        list_candidates = {k: v for k, v in current_context.items() if isinstance(v, list)}
+        # If only one candidate, pick it
+        if len(list_candidates) == 1:
+            input_list = list(list_candidates.values())[0]
+        else:
+            input_list = None
+
+    if not isinstance(input_list, list):
+        raise ValueError(
+            f"Input '{config.input_list_variable_name}' for Single List block is not a list or not found. "
+            f"Available keys: {list(current_context.keys())}. "
+            f"Found value: {input_list} (type: {type(input_list)})"
+        )
+    return input_list
+
+
+def _render_list_item_prompt(
+    plan: BlockPlan, block_context: Mapping[str, Any], input_list: List[Any], idx: int
+) -> str:
+    """`block_context` from plan.block_context, resolved once for all items."""
+    return plan.render(LayeredContext(block_context, {"item": input_list[idx], "item_index": idx}))
+
+
+def _matrix_dimensions(config: BlockConfigMultiList, current_context: Dict[str, Any]) -> List[MatrixDimension]:
+    if not config.input_lists_config or len(config.input_lists_config) < 1: # Typically 2 for matrix
+        raise ValueError("Multi-List block requires at least one input list configuration, typically two for matrix.")
+
+    dimensions = []
+    for position, list_config in enumerate(config.input_lists_config):
+        list_data = get_context_value(current_context, list_config.name)
+        if not isinstance(list_data, list):
+            raise ValueError(f"Input list '{list_config.name}' not found or not a list.")
+        dimensions.append(MatrixDimension(position, list_config.name, list_data, list_config.priority))
+    return dimensions
+
+
+def block_fingerprint(block: models.Block, effective_model: str, prompts: List[str]) -> str:
+    """Input fingerprint of a block execution: sha256 over block type, model, config and every rendered prompt."""
+    payload = json.dumps(
+        {"type": block.type.value, "model": effective_model, "config": block.config_json, "prompts": prompts},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _find_reusable_block_run(block: models.Block, fingerprint: str) -> Optional[models.BlockRun]:
+    # Own session: blocks of a run may look this up concurrently while the run's session is busy
+    try:
+        async with AsyncSessionFactory() as lookup_db:
+            return await crud_run.block_run.get_reusable(lookup_db, sequence_id=block.sequence_id, fingerprint=fingerprint)
+    except Exception as e:
+        logger.warning(f"Reusable block run lookup for block {block.id} failed, executing it: {e}")
+        return None
+
+
+def _reused_block_outputs(prior: models.BlockRun, rendered_prompt_text: str):
+    """_execute_single_block_logic's result tuple, built from a prior block run with the same fingerprint."""
+    return _block_run_output_data(prior), rendered_prompt_text, prior.llm_output_text, \
+           copy.deepcopy(prior.named_outputs_json), copy.deepcopy(prior.list_outputs_json), \
+           copy.deepcopy(prior.matrix_outputs_json), None
+
+
+def _record_block_provenance(db_block_run: models.BlockRun, run_state: RunExecutionState, block_id: int) -> None:
+    db_block_run.input_fingerprint = run_state.block_fingerprints.get(block_id)
+    db_block_run.reused_from_block_run_id = run_state.reused_block_runs.get(block_id)
+
+
+def _record_call_stats(db_block_run: models.BlockRun, call_stats: LLMCallStats) -> None:
+    db_block_run.cache_hits = call_stats.cache_hits
+    db_block_run.cache_misses = call_stats.cache_misses
+    db_block_run.llm_call_metrics_json = call_stats.metrics_json()
+
+
 async def _execute_single_block_logic(
     db: AsyncSession,
     block: models.Block,
     current_context: Dict[str, Any],
-    sequence_default_llm_model: str 
+    sequence_default_llm_model: str,
+    run_state: Optional[RunExecutionState] = None,
+    call_stats: Optional[LLMCallStats] = None,
+    reuse_outputs: bool = False,
+    plan: Optional[BlockPlan] = None,
 ) -> Tuple[Dict[str, Any], str, str, Dict[str, Any] | None, Dict[str, Any] | None, Dict[str, Any] | None, str | None]:
+    """
+    The block's input fingerprint is recorded in run_state.block_fingerprints. With
+    `reuse_outputs`, a prior completed block run of the sequence with the same fingerprint
+    supplies the outputs instead of the LLM (recorded in run_state.reused_block_runs).
+    `plan` is the block's compiled plan, looked up in the plan cache when not given.
+    """
 
-    block_config_dict = block.config_json
-    prompt_template = block_config_dict.get("prompt", "")
+    if run_state is None:
+        run_state = RunExecutionState()
+    if plan is None:
+        plan = execution_plans.block_plan(block)
     effective_model = block.llm_model_override or sequence_default_llm_model
 
     output_data_for_context: Dict[str, Any] = {}
@@ -125,113 +366,132 @@ async def _execute_single_block_logic(
     matrix_outputs_json_for_db = None
     error_message_str = None
 
+    async def find_reusable(prompts: List[str]) -> Optional[models.BlockRun]:
+        fingerprint = block_fingerprint(block, effective_model, prompts)
+        run_state.block_fingerprints[block.id] = fingerprint
+        if not reuse_outputs:
+            return None
+        prior = await _find_reusable_block_run(block, fingerprint)
+        if prior is not None:
+            logger.info(f"Block {block.id} ('{block.name}') inputs unchanged, reusing block run {prior.id}")
+            run_state.reused_block_runs[block.id] = prior.id
+        return prior
+
     try:
         if block.type == models.BlockTypeEnum.STANDARD:
-            config = BlockConfigStandard(**block_config_dict)
-            rendered_prompt_text = render_prompt(config.prompt, current_context)
-            llm_raw_output_text = await call_claude_api(rendered_prompt_text, model=effective_model)
+            config = plan.config
+            llm_kwargs = _llm_call_kwargs(config, effective_model, run_state, call_stats)
+            rendered_prompt_text = plan.render(plan.block_context(current_context))
+            prior = await find_reusable([rendered_prompt_text])
+            if prior is not None:
+                return _reused_block_outputs(prior, rendered_prompt_text)
+            llm_raw_output_text = (await _dispatch_prompts([rendered_prompt_text], llm_kwargs, 1, run_state, block.id))[0]
             output_data_for_context[config.output_variable_name] = llm_raw_output_text
             named_outputs_json_for_db = {config.output_variable_name: llm_raw_output_text}
 
         elif block.type == models.BlockTypeEnum.DISCRETIZATION:
-            config = BlockConfigDiscretization(**block_config_dict)
-            rendered_prompt_text = render_prompt(config.prompt, current_context)
-            llm_raw_output_text = await call_claude_api(rendered_prompt_text, model=effective_model)
+            config = plan.config
+            llm_kwargs = _llm_call_kwargs(config, effective_model, run_state, call_stats)
+            rendered_prompt_text = plan.render(plan.block_context(current_context))
+            prior = await find_reusable([rendered_prompt_text])
+            if prior is not None:
+                return _reused_block_outputs(prior, rendered_prompt_text)
+            llm_raw_output_text = (await _dispatch_prompts([rendered_prompt_text], llm_kwargs, 1, run_state, block.id))[0]
             named_outputs = discretize_output(llm_raw_output_text, config.output_names)
             output_data_for_context.update(named_outputs)
             named_outputs_json_for_db = named_outputs
         
         elif block.type == models.BlockTypeEnum.SINGLE_LIST:
-            config = BlockConfigSingleList(**block_config_dict)
-            # Add a fallback to try all context keys for lists
-            input_list = get_context_value(current_context, config.input_list_variable_name)
-            if not isinstance(input_list, list):
-                # Fallback: find any context value that is a list with 3 strings, and log the candidates.
-                list_candidates = {k: v for k, v in current_context.items() if isinstance(v, list)}
-                # If only one candidate, pick it
-                if len(list_candidates) == 1:
-                    input_list = list(list_candidates.values())[0]
-                else:
-                    input_list = None
-
-            if not isinstance(input_list, list):
-                raise ValueError(
-                    f"Input '{config.input_list_variable_name}' for Single List block is not a list or not found. "
-                    f"Available keys: {list(current_context.keys())}. "
-                    f"Found value: {input_list} (type: {type(input_list)})"
+            config = plan.config
+            llm_kwargs = _llm_call_kwargs(config, effective_model, run_state, call_stats)
+            input_list = _single_list_input(config, current_context)
+            rendered_prompt_text = f"Single List Block. Template: {config.prompt[:100]}... on list '{config.input_list_variable_name}' ({len(input_list)} items)."
+
+            # Render every item prompt up front so template errors surface before any LLM call
+            block_context = plan.block_context(current_context)
+            item_prompts = [
+                _render_list_item_prompt(plan, block_context, input_list, idx) for idx in range(len(input_list))
+            ]
+            prior = await find_reusable(item_prompts)
+            if prior is not None:
+                return _reused_block_outputs(prior, rendered_prompt_text)
+
+            try:
+                item_results = await _dispatch_prompts(
+                    item_prompts, llm_kwargs, run_state.block_concurrency(config.max_concurrency), run_state, block.id,
+                    tolerate_errors=_tolerates_item_errors(config),
                 )
+            except RunCancelledError as ce:
+                # Keep the items finished before the cancel; unfinished ones are None
+                list_outputs_json_for_db = {"name": config.output_list_variable_name, "values": ce.partial_results, "partial": True}
+                raise
 
-            if not isinstance(input_list, list):
-                raise ValueError(f"Input '{config.input_list_variable_name}' for Single List block is not a list or not found. Found type: {type(input_list)}.")
-            
-            
-            item_results = []
-            rendered_prompt_text = f"Single List Block. Template: {config.prompt[:100]}... on list '{config.input_list_variable_name}' ({len(input_list)} items)."
-            
-            for idx, item_value in enumerate(input_list):
-                item_context = {**current_context, "item": item_value, "item_index": idx}
-                item_prompt = render_prompt(config.prompt, item_context)
-                item_llm_output = await call_claude_api(item_prompt, model=effective_model)
-                item_results.append(item_llm_output)
-            
             output_data_for_context[config.output_list_variable_name] = item_results
             llm_raw_output_text = json.dumps(item_results)
             list_outputs_json_for_db = {"name": config.output_list_variable_name, "values": item_results}
+            failed_indices = [idx for idx, result in enumerate(item_results) if is_item_error(result)]
+            if failed_indices:
+                logger.warning(f"Block {block.id} ('{block.name}'): {len(failed_indices)} of {len(item_results)} items failed")
+                list_outputs_json_for_db["failed_indices"] = failed_indices
 
         elif block.type == models.BlockTypeEnum.MULTI_LIST:
-            config = BlockConfigMultiList(**block_config_dict)
-            if not config.input_lists_config or len(config.input_lists_config) < 1: # Typically 2 for matrix
-                raise ValueError("Multi-List block requires at least one input list configuration, typically two for matrix.")
-
-            # Simplified: uses first two lists for matrix-style iteration.
-            # A more complex engine would use priorities from BlockConfigMultiListInputItem.
-            list1_config = config.input_lists_config[0]
-            list1_data = current_context.get(list1_config.name)
-            if not isinstance(list1_data, list):
-                raise ValueError(f"Input list '{list1_config.name}' not found or not a list.")
-
-            matrix_results: Union[List[List[str]], List[str]]
-            rendered_prompt_text = f"Multi List Block. Template: {config.prompt[:100]}..."
-
-            if len(config.input_lists_config) >= 2:
-                list2_config = config.input_lists_config[1]
-                list2_data = current_context.get(list2_config.name)
-                if not isinstance(list2_data, list):
-                    raise ValueError(f"Input list '{list2_config.name}' not found or not a list.")
-                
-                temp_matrix_results = []
-                for idx1, item1_val in enumerate(list1_data):
-                    row_results = []
-                    for idx2, item2_val in enumerate(list2_data):
-                        item_context = {
-                            **current_context,
-                            "item1": item1_val, # Generic name for first list item
-                            "item1_name": list1_config.name, # Name of the list itself
-                            "item1_index": idx1,
-                            "item2": item2_val, # Generic name for second list item
-                            "item2_name": list2_config.name,
-                            "item2_index": idx2,
-                        }
-                        item_prompt = render_prompt(config.prompt, item_context)
-                        item_llm_output = await call_claude_api(item_prompt, model=effective_model)
-                        row_results.append(item_llm_output)
-                    temp_matrix_results.append(row_results)
-                matrix_results = temp_matrix_results
-            else: # Only one list configured, treat as single list iteration
-                temp_list_results = []
-                for idx, item_val in enumerate(list1_data):
-                    item_context = {**current_context, "item1": item_val, "item1_name": list1_config.name, "item1_index": idx}
-                    item_prompt = render_prompt(config.prompt, item_context)
-                    item_llm_output = await call_claude_api(item_prompt, model=effective_model)
-                    temp_list_results.append(item_llm_output)
-                matrix_results = [temp_list_results] # Output is a list containing one list of results
+            config = plan.config
+            llm_kwargs = _llm_call_kwargs(config, effective_model, run_state, call_stats)
+            dimensions = _matrix_dimensions(config, current_context)
+            shape = matrix_shape(dimensions)
+            rendered_prompt_text = (
+                f"Multi List Block. Template: {config.prompt[:100]}... over "
+                f"{' x '.join(f'{d.name} ({len(d.values)})' for d in dimensions)}."
+            )
+
+            # Render every cell prompt up front (in priority loop order) before any LLM call
+            cell_coords = list(iter_cells(dimensions))
+            block_context = plan.block_context(current_context)
+            cell_prompts = [
+                plan.render(LayeredContext(block_context, cell_bindings(dimensions, coords)))
+                for coords in cell_coords
+            ]
+            prior = await find_reusable(cell_prompts)
+            if prior is not None:
+                return _reused_block_outputs(prior, rendered_prompt_text)
+            try:
+                cell_outputs = await _dispatch_prompts(
+                    cell_prompts, llm_kwargs, run_state.block_concurrency(config.max_concurrency), run_state, block.id,
+                    tolerate_errors=_tolerates_item_errors(config),
+                )
+            except RunCancelledError as ce:
+                # Keep the cells finished before the cancel; unfinished ones are None
+                partial_matrix = build_matrix(shape, dict(zip(cell_coords, ce.partial_results or [])))
+                matrix_outputs_json_for_db = {
+                    "name": config.output_matrix_variable_name,
+                    "values": [partial_matrix] if len(dimensions) == 1 else partial_matrix,
+                    "dimensions": [d.name for d in dimensions],
+                    "shape": list(shape),
+                    "partial": True,
+                }
+                raise
+            matrix_results = build_matrix(shape, dict(zip(cell_coords, cell_outputs)))
+            if len(dimensions) == 1:
+                matrix_results = [matrix_results] # Single list keeps the one-row matrix shape
 
             output_data_for_context[config.output_matrix_variable_name] = matrix_results
             llm_raw_output_text = json.dumps(matrix_results)
-            matrix_outputs_json_for_db = {"name": config.output_matrix_variable_name, "values": matrix_results}
+            matrix_outputs_json_for_db = {
+                "name": config.output_matrix_variable_name,
+                "values": matrix_results,
+                "dimensions": [d.name for d in dimensions],
+                "shape": list(shape),
+            }
+            failed_cells = [list(coords) for coords, output in zip(cell_coords, cell_outputs) if is_item_error(output)]
+            if failed_cells:
+                logger.warning(f"Block {block.id} ('{block.name}'): {len(failed_cells)} of {len(cell_coords)} cells failed")
+                matrix_outputs_json_for_db["failed_cells"] = failed_cells # Coordinates in axis order
         else:
             raise NotImplementedError(f"Block type '{block.type}' execution not implemented.")
 
+    except RunCancelledError:
+        logger.info(f"Block {block.id} ('{block.name}') stopped: run cancelled")
+        error_message_str = "Run cancelled."
     except ValueError as ve:
         logger.error(f"Configuration or rendering error in block {block.id} ('{block.name}'): {ve}", exc_info=False) # Keep log cleaner
         error_message_str = str(ve)
@@ -243,6 +503,114 @@ async def _execute_single_block_logic(
            named_outputs_json_for_db, list_outputs_json_for_db, matrix_outputs_json_for_db, \
            error_message_str
 
+async def _execute_block_run(
+    db: AsyncSession,
+    db_lock: asyncio.Lock,
+    run_obj: models.Run,
+    block: models.Block,
+    current_context: Dict[str, Any],
+    sequence_default_llm_model: str,
+    run_state: RunExecutionState,
+    plan: Optional[BlockPlan] = None,
+    reuse_outputs: bool = False,
+) -> Tuple[models.BlockRun, Dict[str, Any]]:
+    """
+    Executes one block of a run as a block run and returns it with the block's output variables
+    (applying them to the caller's context is left to the caller). The RUNNING block run is committed
+    before the block's first LLM call and again with its outputs, so no transaction stays open while
+    LLM calls are awaited. `db_lock` serializes blocks of one run sharing the session.
+    Publishes block_started and block_completed.
+    """
+    async with db_lock:
+        block_run_create_schema = BlockRunCreate(
+            run_id=run_obj.id, block_id=block.id, status=models.RunStatusEnum.RUNNING,
+            block_name_snapshot=block.name, block_type_snapshot=block.type
+        )
+        db_block_run = models.BlockRun(**block_run_create_schema.model_dump())
+        db_block_run.started_at = datetime.now(timezone.utc)
+        db.add(db_block_run)
+        await db.commit()
+    run_events.publish(
+        run_obj.id, BLOCK_STARTED, block_id=block.id, block_run_id=db_block_run.id, name=block.name
+    )
+
+    call_stats = LLMCallStats()
+    # No copy of the context: the block resolves its (minimal) block context before its first await
+    (block_output_data, rendered_prompt, llm_raw_output,
+     named_outputs_db, list_outputs_db, matrix_outputs_db, error_message) = await _execute_single_block_logic(
+        db, block, current_context, sequence_default_llm_model, run_state=run_state, call_stats=call_stats,
+        reuse_outputs=reuse_outputs, plan=plan,
+    )
+
+    async with db_lock:
+        _record_call_stats(db_block_run, call_stats)
+        _record_block_provenance(db_block_run, run_state, block.id)
+        # Batch child runs keep their outputs on their block runs only: concurrent children would
+        # otherwise all update (and lock) the same OUTPUT variable rows of the sequence
+        if run_obj.batch_id is None:
+            for output_var, value in block_output_data.items():
+                await variable.upsert_variable(
+                    db=db,
+                    name=output_var,
+                    value=value,
+                    user_id=run_obj.user_id,
+                    sequence_id=run_obj.sequence_id,
+                    type=VariableTypeEnum.OUTPUT._value_
+                )
+
+        db_block_run.prompt_text = rendered_prompt
+        db_block_run.llm_output_text = llm_raw_output
+        db_block_run.named_outputs_json = named_outputs_db
+        db_block_run.list_outputs_json = list_outputs_db
+        db_block_run.matrix_outputs_json = matrix_outputs_db
+        db_block_run.completed_at = datetime.now(timezone.utc)
+
+        if error_message and run_state.cancelled:
+            # Partial list/matrix outputs stay on the block run, nothing goes into the context
+            db_block_run.status = models.RunStatusEnum.CANCELLED
+            db_block_run.error_message = error_message
+        elif error_message:
+            db_block_run.status = models.RunStatusEnum.FAILED
+            db_block_run.error_message = error_message
+        elif _has_failed_items(list_outputs_db, matrix_outputs_db):
+            # Failed slots hold error markers; POST .../retry_failed_items re-executes just those
+            db_block_run.status = models.RunStatusEnum.PARTIAL
+        else:
+            db_block_run.status = models.RunStatusEnum.COMPLETED
+        await db.commit()
+    run_events.publish(
+        run_obj.id, BLOCK_COMPLETED, block_id=block.id, block_run_id=db_block_run.id,
+        status=db_block_run.status.value, error_message=db_block_run.error_message,
+    )
+    return db_block_run, block_output_data
+
+
+@asynccontextmanager
+async def _cancellation_watch(run_state: RunExecutionState) -> AsyncIterator[None]:
+    """
+    Makes the run cancellable while the block is executing: POST /runs/{id}/cancel sets the event
+    directly when the run executes in this process; the watcher picks up the CANCELLED status
+    written by any other process.
+    """
+    active_runs.register(run_state)
+    cancel_watcher = asyncio.create_task(_watch_for_cancellation(run_state))
+    try:
+        yield
+    finally:
+        cancel_watcher.cancel()
+        active_runs.unregister(run_state)
+
+
+def _add_unstarted_block_runs_cancelled(db: AsyncSession, run_id: int, blocks: List[models.Block]) -> None:
+    now = datetime.now(timezone.utc)
+    for block in blocks:
+        db.add(models.BlockRun(
+            run_id=run_id, block_id=block.id, status=models.RunStatusEnum.CANCELLED,
+            block_name_snapshot=block.name, block_type_snapshot=block.type,
+            completed_at=now, error_message="Run cancelled before this block started.",
+        ))
+
+
 async def execute_sequence(
     db: AsyncSession, run_id: int, sequence_id: int, user_id: int,
     input_overrides_json: Dict[str, Any] = None
@@ -254,92 +622,390 @@ async def execute_sequence(
         raise ValueError("Run not found or access denied.")
     if not sequence_obj:
         raise ValueError("Sequence not found.")
-    
-
-    run_obj.status = models.RunStatusEnum.RUNNING
-    run_obj.started_at = datetime.now(timezone.utc)
-    run_obj.input_overrides_json = input_overrides_json
-    db.add(run_obj)
-    # No commit yet, will commit after all block runs or on failure
+    # Conditional, so a cancel committed since the run was read is not overwritten.
+    # Every block commits its block run when it starts and again with its outputs (see _execute_block_run),
+    # so no transaction stays open while LLM calls are awaited
+    started = await crud_run.run.mark_started(db, id=run_obj.id, input_overrides_json=input_overrides_json)
+    await db.refresh(run_obj)
+    if not started:
+        logger.info(f"Run {run_id} was cancelled before it started")
+        return run_obj
+    run_events.publish(run_obj.id, RUN_STARTED, sequence_id=sequence_id)
 
-    current_context = await _gather_sequence_context(db, sequence_id, user_id, input_overrides_json)
     sequence_default_llm_model = run_obj.llm_model_override or sequence_obj.default_llm_model or "claude-3-opus-20240229"
 
-
     blocks = await crud_block.block.get_multi_by_sequence(db, sequence_id=sequence_id)
+    # Validated configs, compiled templates and block dependencies, reused across runs
+    plan = execution_plans.sequence_plan(sequence_id, blocks)
+    current_context = await _gather_sequence_context(
+        db, sequence_id, user_id, input_overrides_json, referenced_names=plan.referenced_names(_normalize_key)
+    )
     if not blocks:
-        run_obj.status = models.RunStatusEnum.COMPLETED # Or FAILED if no blocks is an error
-        run_obj.completed_at = datetime.now(timezone.utc)
-        run_obj.error_message = "Sequence has no blocks to execute."
-        db.add(run_obj)
+        await crud_run.run.finish(
+            db, id=run_obj.id, status=models.RunStatusEnum.COMPLETED, # Or FAILED if no blocks is an error
+            error_message="Sequence has no blocks to execute.",
+        )
         await db.commit()
         await db.refresh(run_obj)
+        run_events.publish(run_obj.id, RUN_FINISHED, status=run_obj.status.value, error_message=run_obj.error_message)
         return run_obj
 
-    overall_success = True
-    final_outputs_summary = {}
-
-    for block in blocks:
-        block_run_create_schema = BlockRunCreate(
-            run_id=run_obj.id, block_id=block.id, status=models.RunStatusEnum.RUNNING,
-            block_name_snapshot=block.name, block_type_snapshot=block.type
+    unresolved = plan.unresolved_variables(current_context.keys(), _normalize_key)
+    if unresolved:
+        # Fail before any block calls the LLM rather than at the first block lacking an input
+        first_block = next(block for block in blocks if block.id in unresolved)
+        await crud_run.run.finish(
+            db, id=run_obj.id, status=models.RunStatusEnum.FAILED,
+            error_message=(
+                f"Block '{first_block.name}' references variables that no input, global list or earlier block "
+                f"provides: {', '.join(unresolved[first_block.id])}."
+            ),
         )
-        db_block_run = models.BlockRun(**block_run_create_schema.model_dump())
-        db_block_run.started_at = datetime.now(timezone.utc)
-        db.add(db_block_run)
-        await db.flush() # Get ID for db_block_run
+        await db.commit()
+        await db.refresh(run_obj)
+        run_events.publish(run_obj.id, RUN_FINISHED, status=run_obj.status.value, error_message=run_obj.error_message)
+        return run_obj
 
-        (block_output_data, rendered_prompt, llm_raw_output,
-         named_outputs_db, list_outputs_db, matrix_outputs_db, error_message) = await _execute_single_block_logic(
-            db, block, current_context, sequence_default_llm_model
-        )
-         
-        for output_var, value in block_output_data.items():
-            await variable.upsert_variable(
-                db=db,
-                name=output_var,
-                value=value,
-                user_id=run_obj.user_id,
-                sequence_id=run_obj.sequence_id,
-                type=VariableTypeEnum.OUTPUT._value_
-            )
+    run_state = RunExecutionState(
+        run_id=run_obj.id, use_cache=run_obj.use_cache, retry_config=sequence_obj.llm_retry_config_json,
+        checkpoints=RunCheckpointStore(run_obj.id) if settings.RUN_CHECKPOINTS_ENABLED else None,
+        lane=LANE_BATCH if run_obj.batch_id is not None else LANE_STANDARD, user_id=run_obj.user_id,
+    )
+    # Resuming a failed/cancelled run: completed blocks keep their block runs and outputs,
+    # the other block runs are replaced (their finished items come back from the checkpoints)
+    restored_block_runs: Dict[int, models.BlockRun] = {}
+    previous_block_runs = (
+        await db.execute(select(models.BlockRun).where(models.BlockRun.run_id == run_obj.id))
+    ).scalars().all()
+    for previous_block_run in previous_block_runs:
+        if previous_block_run.status == models.RunStatusEnum.COMPLETED and previous_block_run.block_id is not None:
+            restored_block_runs[previous_block_run.block_id] = previous_block_run
+        else:
+            await db.delete(previous_block_run)
+    await db.commit()
+    if restored_block_runs:
+        logger.info(f"Run {run_obj.id}: resuming, {len(restored_block_runs)} completed blocks are reused")
 
+    # Blocks may run concurrently but share this one AsyncSession, so their DB work is serialized
+    db_lock = asyncio.Lock()
+    block_outputs: Dict[int, Dict[str, Any]] = {}
+    failures: Dict[int, str] = {}
+    partial_block_ids = set()
+    started_block_ids = set()
 
-        db_block_run.prompt_text = rendered_prompt
-        db_block_run.llm_output_text = llm_raw_output
-        db_block_run.named_outputs_json = named_outputs_db
-        db_block_run.list_outputs_json = list_outputs_db
-        db_block_run.matrix_outputs_json = matrix_outputs_db
-        db_block_run.completed_at = datetime.now(timezone.utc)
+    async def run_block(block: models.Block) -> bool:
+        if run_state.cancelled:
+            return False
+        started_block_ids.add(block.id)
+        if block.id in restored_block_runs:
+            block_output_data = _block_run_output_data(restored_block_runs[block.id])
+            current_context.update(block_output_data)
+            block_outputs[block.id] = block_output_data
+            run_events.publish(
+                run_obj.id, BLOCK_COMPLETED, block_id=block.id, block_run_id=restored_block_runs[block.id].id,
+                status=models.RunStatusEnum.COMPLETED.value, error_message=None, restored=True,
+            )
+            return True
+        db_block_run, block_output_data = await _execute_block_run(
+            db, db_lock, run_obj, block, current_context, sequence_default_llm_model, run_state,
+            plan=plan.by_block_id[block.id], reuse_outputs=settings.RUN_REUSE_UNCHANGED_BLOCKS,
+        )
+        if db_block_run.status == models.RunStatusEnum.FAILED:
+            failures[block.id] = db_block_run.error_message
+            logger.error(f"Block ID {block.id} failed for run ID {run_obj.id}: {db_block_run.error_message}")
+        elif db_block_run.status in (models.RunStatusEnum.COMPLETED, models.RunStatusEnum.PARTIAL):
+            if db_block_run.status == models.RunStatusEnum.PARTIAL:
+                partial_block_ids.add(block.id)
+            current_context.update(block_output_data)
+            block_outputs[block.id] = block_output_data
+        return db_block_run.error_message is None
 
-        if error_message:
-            db_block_run.status = models.RunStatusEnum.FAILED
-            db_block_run.error_message = error_message
-            overall_success = False
-            logger.error(f"Block ID {block.id} failed for run ID {run_obj.id}: {error_message}")
-            # Stop sequence on first error
-            run_obj.error_message = f"Failed at block '{block.name}': {error_message}"
-            break 
+    async with _cancellation_watch(run_state):
+        if settings.RUN_DAG_SCHEDULING_ENABLED and len(blocks) > 1:
+            # Independent blocks run concurrently; a block starts once the blocks it reads from are done
+            graph = plan.graph(blocks, current_context.keys(), _normalize_key)
+            await run_block_graph(graph, run_block, max_parallel=settings.RUN_MAX_PARALLEL_BLOCKS)
         else:
-            db_block_run.status = models.RunStatusEnum.COMPLETED
-            current_context.update(block_output_data)
-            final_outputs_summary[f"block_{block.id}_{block.name.replace(' ','_')}"] = block_output_data
-        
-        await db.flush()
+            for block in blocks:
+                if not await run_block(block):
+                    break # Stop sequence on first error
+
+    if run_state.cancelled:
+        _add_unstarted_block_runs_cancelled(db, run_obj.id, [block for block in blocks if block.id not in started_block_ids])
 
-    run_obj.status = models.RunStatusEnum.COMPLETED if overall_success else models.RunStatusEnum.FAILED
-    run_obj.completed_at = datetime.now(timezone.utc)
-    run_obj.results_summary_json = final_outputs_summary
+    overall_success = not failures
+    error_message = None
+    if failures:
+        failed_block = next(block for block in blocks if block.id in failures)
+        error_message = f"Failed at block '{failed_block.name}': {failures[failed_block.id]}"
+    final_outputs_summary = {
+        f"block_{block.id}_{block.name.replace(' ','_')}": block_outputs[block.id]
+        for block in blocks if block.id in block_outputs
+    }
+
+    if run_state.cancelled:
+        final_status = models.RunStatusEnum.CANCELLED
+        error_message = error_message or "Run cancelled."
+    elif not overall_success:
+        final_status = models.RunStatusEnum.FAILED
+    else:
+        final_status = models.RunStatusEnum.PARTIAL if partial_block_ids else models.RunStatusEnum.COMPLETED
+    completed = final_status in (models.RunStatusEnum.COMPLETED, models.RunStatusEnum.PARTIAL)
+    if run_state.checkpoints is not None and completed:
+        # Nothing left to resume: every block run is committed. Before the final write, which would
+        # otherwise wait on (SQLite) or race with a checkpoint flush still in progress
+        await run_state.checkpoints.discard()
+        await crud_run.block_item_checkpoint.delete_for_run(db, run_id=run_obj.id)
+    finished = await crud_run.run.finish(
+        db, id=run_obj.id, status=final_status, error_message=error_message,
+        results_summary_json=final_outputs_summary,
+    )
+    if not finished:
+        # Cancelled after the last cancellation check; keep its CANCELLED status
+        final_status = models.RunStatusEnum.CANCELLED
+        completed = False
 
-    db.add(run_obj)
     await db.commit()
     await db.refresh(run_obj)
-    
+    run_events.publish(run_obj.id, RUN_FINISHED, status=run_obj.status.value, error_message=run_obj.error_message)
+    await response_cache.flush() # Persist cache entries buffered during the run
+    if run_state.checkpoints is not None and not completed:
+        await run_state.checkpoints.flush() # Keep every finished item for POST /runs/{id}/resume
+
     # Eagerly load block_runs for the response
     run_obj_with_details = await crud_run.run.get_by_id_and_user(db, id=run_obj.id, user_id=user_id) # This loads details
     return run_obj_with_details if run_obj_with_details else run_obj
 
 
+async def _fail_request_run(db: AsyncSession, run_obj: models.Run, error: Exception) -> None:
+    """
+    Fails a run executed by a request (reruns, single blocks) on an unexpected error, which the
+    run queue does for queued runs, so it is not left RUNNING without a lease.
+    """
+    logger.error(f"Run {run_obj.id} failed: {error}", exc_info=True)
+    error_message = f"Unexpected error: {error}"
+    try:
+        await db.rollback()
+        await crud_run.run.finish(db, id=run_obj.id, status=models.RunStatusEnum.FAILED, error_message=error_message)
+        await db.commit()
+    finally:
+        run_events.publish(run_obj.id, RUN_FINISHED, status=models.RunStatusEnum.FAILED.value, error_message=error_message)
+
+
+async def execute_rerun(
+    db: AsyncSession,
+    run_obj: models.Run,
+    sequence: models.Sequence,
+    blocks: List[models.Block],
+    context: Dict[str, Any],
+    reuse_unchanged: bool = True,
+) -> models.Run:
+    """
+    Executes `blocks` in order as `run_obj`, created RUNNING (and never claimed by the run queue) by
+    POST /runs/{id}/rerun_from_block, over `context`: the original run's inputs plus the outputs
+    of the blocks before the first one of `blocks`. Like execute_sequence, every block run is
+    committed as it goes, the run can be cancelled, and the final status is only written while
+    the run is still RUNNING. With `reuse_unchanged`, blocks after the first reuse the outputs of
+    an identical completed block run instead of calling the LLM.
+    An unexpected error fails the run before it is raised.
+    """
+    run_events.publish(run_obj.id, RUN_STARTED, sequence_id=sequence.id)
+    run_state = RunExecutionState(
+        run_id=run_obj.id, use_cache=run_obj.use_cache, retry_config=sequence.llm_retry_config_json,
+        lane=LANE_INTERACTIVE, user_id=run_obj.user_id,
+    )
+    db_lock = asyncio.Lock()
+    started_block_ids = set()
+    error_message = None
+    partial = False
+    try:
+        async with _cancellation_watch(run_state):
+            for position, block in enumerate(blocks):
+                if run_state.cancelled:
+                    break
+                started_block_ids.add(block.id)
+                db_block_run, block_output_data = await _execute_block_run(
+                    db, db_lock, run_obj, block, context, sequence.default_llm_model, run_state,
+                    reuse_outputs=reuse_unchanged and position > 0, # The requested block itself is always re-executed
+                )
+                if db_block_run.error_message is not None:
+                    if db_block_run.status == models.RunStatusEnum.FAILED:
+                        error_message = f"Failed at block '{block.name}': {db_block_run.error_message}"
+                    break
+                partial = partial or db_block_run.status == models.RunStatusEnum.PARTIAL
+                context.update(block_output_data)
+
+        # As execute_sequence: a failed block fails the run, blocks with failed items make it PARTIAL
+        if run_state.cancelled:
+            _add_unstarted_block_runs_cancelled(db, run_obj.id, [block for block in blocks if block.id not in started_block_ids])
+            final_status = models.RunStatusEnum.CANCELLED
+            error_message = error_message or "Run cancelled."
+        elif error_message:
+            final_status = models.RunStatusEnum.FAILED
+        else:
+            final_status = models.RunStatusEnum.PARTIAL if partial else models.RunStatusEnum.COMPLETED
+        await crud_run.run.finish(db, id=run_obj.id, status=final_status, error_message=error_message)
+        await db.commit()
+        await db.refresh(run_obj)
+        run_events.publish(run_obj.id, RUN_FINISHED, status=run_obj.status.value, error_message=run_obj.error_message)
+    except Exception as e:
+        await _fail_request_run(db, run_obj, e)
+        raise
+    finally:
+        run_events.forget(run_obj.id) # Not executed by the run queue, so nothing else drops its events
+    await response_cache.flush()
+    return run_obj
+
+
+async def retry_failed_items(
+    db: AsyncSession, run_obj: models.Run, block_run: models.BlockRun, user_id: int
+) -> models.BlockRun:
+    """
+    Re-executes only the failed items/cells of a PARTIAL list or matrix block run and patches
+    the results into its outputs in place. Items failing again keep their error marker.
+    """
+    if block_run.status != models.RunStatusEnum.PARTIAL or not _has_failed_items(block_run.list_outputs_json, block_run.matrix_outputs_json):
+        raise ValueError("Block run has no failed items to retry.")
+    block = await crud_block.block.get(db, id=block_run.block_id) if block_run.block_id is not None else None
+    if block is None:
+        raise ValueError("The block of this block run no longer exists.")
+    sequence_obj = await crud_sequence.sequence.get(db, id=run_obj.sequence_id)
+    plan = execution_plans.block_plan(block)
+
+    # The context the block saw: the run's inputs plus the outputs of the run's other finished blocks
+    context = await _gather_sequence_context(
+        db, run_obj.sequence_id, user_id, run_obj.input_overrides_json,
+        referenced_names=plan.dependencies(_normalize_key).reads,
+    )
+    other_block_runs = (await db.execute(
+        select(models.BlockRun).where(
+            models.BlockRun.run_id == run_obj.id,
+            models.BlockRun.id != block_run.id,
+            models.BlockRun.status.in_([models.RunStatusEnum.COMPLETED, models.RunStatusEnum.PARTIAL]),
+        )
+    )).scalars().all()
+    for other_block_run in other_block_runs:
+        context.update(_block_run_output_data(other_block_run))
+
+    if block.type == models.BlockTypeEnum.SINGLE_LIST:
+        config = plan.config
+        outputs = dict(block_run.list_outputs_json)
+        values = list(outputs["values"])
+        input_list = _single_list_input(config, context)
+        if len(input_list) != len(values):
+            raise ValueError("The block's input list changed since this run; rerun the block instead.")
+        positions = list(outputs["failed_indices"])
+        block_context = plan.block_context(context)
+        prompts = [_render_list_item_prompt(plan, block_context, input_list, idx) for idx in positions]
+        failed_key = "failed_indices"
+    elif block.type == models.BlockTypeEnum.MULTI_LIST:
+        config = plan.config
+        outputs = dict(block_run.matrix_outputs_json)
+        values = copy.deepcopy(outputs["values"])
+        dimensions = _matrix_dimensions(config, context)
+        if list(matrix_shape(dimensions)) != outputs.get("shape"):
+            raise ValueError("The block's input lists changed since this run; rerun the block instead.")
+        positions = [tuple(coords) for coords in outputs["failed_cells"]]
+        block_context = plan.block_context(context)
+        prompts = [plan.render(LayeredContext(block_context, cell_bindings(dimensions, coords))) for coords in positions]
+        failed_key = "failed_cells"
+    else:
+        raise ValueError("Only list and matrix blocks have items to retry.")
+
+    run_state = RunExecutionState(
+        run_id=run_obj.id, use_cache=run_obj.use_cache, retry_config=sequence_obj.llm_retry_config_json,
+        lane=LANE_INTERACTIVE, user_id=user_id,
+    )
+    call_stats = LLMCallStats()
+    effective_model = block.llm_model_override or run_obj.llm_model_override or sequence_obj.default_llm_model or "claude-3-opus-20240229"
+    llm_kwargs = _llm_call_kwargs(config, effective_model, run_state, call_stats)
+    results = await _dispatch_prompts(
+        prompts, llm_kwargs, run_state.block_concurrency(config.max_concurrency), run_state, tolerate_errors=True
+    )
+
+    still_failed = []
+    for position, result in zip(positions, results):
+        if failed_key == "failed_indices":
+            values[position] = result
+        else:
+            _set_matrix_cell(values, position, result)
+        if is_item_error(result):
+            still_failed.append(position if failed_key == "failed_indices" else list(position))
+    logger.info(f"Block run {block_run.id}: retried {len(positions)} failed items, {len(still_failed)} still failing")
+
+    outputs["values"] = values
+    if still_failed:
+        outputs[failed_key] = still_failed
+    else:
+        outputs.pop(failed_key, None)
+    # New dicts so the JSON columns are flagged as changed
+    if failed_key == "failed_indices":
+        block_run.list_outputs_json = outputs
+    else:
+        block_run.matrix_outputs_json = outputs
+    block_run.llm_output_text = json.dumps(values)
+    block_run.status = models.RunStatusEnum.PARTIAL if still_failed else models.RunStatusEnum.COMPLETED
+    block_run.cache_hits += call_stats.cache_hits
+    block_run.cache_misses += call_stats.cache_misses
+    block_run.completed_at = datetime.now(timezone.utc)
+
+    await variable.upsert_variable(
+        db=db,
+        name=outputs["name"],
+        value=values,
+        user_id=run_obj.user_id,
+        sequence_id=run_obj.sequence_id,
+        type=VariableTypeEnum.OUTPUT._value_
+    )
+    summary = dict(run_obj.results_summary_json or {})
+    summary[f"block_{block.id}_{(block_run.block_name_snapshot or block.name).replace(' ','_')}"] = {outputs["name"]: values}
+    run_obj.results_summary_json = summary
+    if (
+        run_obj.status == models.RunStatusEnum.PARTIAL and not still_failed
+        and not any(other.status == models.RunStatusEnum.PARTIAL for other in other_block_runs)
+    ):
+        run_obj.status = models.RunStatusEnum.COMPLETED
+
+    await db.commit()
+    await db.refresh(block_run)
+    await response_cache.flush()
+    return block_run
+
+
+def _set_matrix_cell(values: List[Any], coords: Tuple[int, ...], value: Any) -> None:
+    target = values[0] if len(coords) == 1 else values # Single list keeps the one-row matrix shape
+    for idx in coords[:-1]:
+        target = target[idx]
+    target[coords[-1]] = value
+
+
+def _block_run_output_data(block_run: models.BlockRun) -> Dict[str, Any]:
+    """Context variables produced by a completed block run (including manual output edits)."""
+    output_data: Dict[str, Any] = {}
+    if block_run.named_outputs_json:
+        output_data.update(block_run.named_outputs_json)
+    if block_run.list_outputs_json:
+        output_data[block_run.list_outputs_json["name"]] = block_run.list_outputs_json["values"]
+    if block_run.matrix_outputs_json:
+        output_data[block_run.matrix_outputs_json["name"]] = block_run.matrix_outputs_json["values"]
+    return output_data
+
+
+async def _watch_for_cancellation(run_state: RunExecutionState) -> None:
+    """Polls the run's status in its own session and cancels the run once it reads CANCELLED."""
+    while not run_state.cancelled:
+        await asyncio.sleep(settings.RUN_CANCEL_POLL_INTERVAL_SECONDS)
+        try:
+            async with AsyncSessionFactory() as watch_db:
+                status = await crud_run.run.get_status(watch_db, id=run_state.run_id)
+        except Exception as e:
+            logger.warning(f"Cancellation check for run {run_state.run_id} failed: {e}")
+            continue
+        if status == models.RunStatusEnum.CANCELLED:
+            logger.info(f"Run {run_state.run_id} was cancelled, stopping")
+            run_state.cancel()
+
+
 async def preview_prompt_for_block(
     db: AsyncSession, sequence_id: int, block_id: int, user_id: int,
     input_overrides: Dict[str, Any] = None
@@ -354,7 +1020,10 @@ async def preview_prompt_for_block(
     
     # Ownership check should be done at route level using current_user.id == sequence_obj.user_id
 
-    current_context = await _gather_sequence_context(db, sequence_id, user_id, input_overrides)
+    target_plan = execution_plans.block_plan(target_block)
+    current_context = await _gather_sequence_context(
+        db, sequence_id, user_id, input_overrides, referenced_names=target_plan.dependencies(_normalize_key).reads
+    )
     sequence_default_llm_model = sequence_obj.default_llm_model or "claude-3-opus-20240229"
     
     prior_blocks = await db.execute(
@@ -364,44 +1033,39 @@ async def preview_prompt_for_block(
     )
     
     for prev_block in prior_blocks.scalars().all():
-        prev_block_config = prev_block.config_json
         if prev_block.type == models.BlockTypeEnum.STANDARD:
-            cfg = BlockConfigStandard(**prev_block_config)
+            cfg = execution_plans.block_plan(prev_block).config
             current_context[cfg.output_variable_name] = f"[Simulated output from {prev_block.name}]"
         elif prev_block.type == models.BlockTypeEnum.DISCRETIZATION:
-            cfg = BlockConfigDiscretization(**prev_block_config)
+            cfg = execution_plans.block_plan(prev_block).config
             for name in cfg.output_names:
                 current_context[name] = f"[Simulated output '{name}' from {prev_block.name}]"
         elif prev_block.type == models.BlockTypeEnum.SINGLE_LIST:
-            cfg = BlockConfigSingleList(**prev_block_config)
+            cfg = execution_plans.block_plan(prev_block).config
             current_context[cfg.output_list_variable_name] = [f"[Simulated item from list output of {prev_block.name}]"]
         elif prev_block.type == models.BlockTypeEnum.MULTI_LIST:
-            cfg = BlockConfigMultiList(**prev_block_config)
+            cfg = execution_plans.block_plan(prev_block).config
             current_context[cfg.output_matrix_variable_name] = [[f"[Simulated item from matrix output of {prev_block.name}]"]]
 
-    target_block_config_dict = target_block.config_json
-    prompt_template = target_block_config_dict.get("prompt", "")
-    preview_render_context = {**current_context}
+    prompt_template = target_plan.prompt
+    sample_bindings: Dict[str, Any] = {}
 
     if target_block.type == models.BlockTypeEnum.SINGLE_LIST:
-        cfg = BlockConfigSingleList(**target_block_config_dict)
-        preview_render_context["item"] = f"[SAMPLE_ITEM_FROM_{cfg.input_list_variable_name}]"
-        preview_render_context["item_index"] = 0
+        cfg = target_plan.config
+        sample_bindings["item"] = f"[SAMPLE_ITEM_FROM_{cfg.input_list_variable_name}]"
+        sample_bindings["item_index"] = 0
     elif target_block.type == models.BlockTypeEnum.MULTI_LIST:
-        cfg = BlockConfigMultiList(**target_block_config_dict)
-        if cfg.input_lists_config:
-            list1_cfg = cfg.input_lists_config[0]
-            preview_render_context["item1"] = f"[SAMPLE_FROM_{list1_cfg.name}]"
-            preview_render_context["item1_name"] = list1_cfg.name
-            preview_render_context["item1_index"] = 0
-            if len(cfg.input_lists_config) >= 2:
-                list2_cfg = cfg.input_lists_config[1]
-                preview_render_context["item2"] = f"[SAMPLE_FROM_{list2_cfg.name}]"
-                preview_render_context["item2_name"] = list2_cfg.name
-                preview_render_context["item2_index"] = 0
-    
+        cfg = target_plan.config
+        for position, list_cfg in enumerate(cfg.input_lists_config):
+            sample_bindings[f"item{position + 1}"] = f"[SAMPLE_FROM_{list_cfg.name}]"
+            sample_bindings[f"item{position + 1}_name"] = list_cfg.name
+            sample_bindings[f"item{position + 1}_index"] = 0
+
+    # Shows the minimal context the block would render with; the full context if it lacks a variable
+    preview_render_context = {**current_context, **sample_bindings}
     try:
-        rendered_prompt = render_prompt(prompt_template, preview_render_context)
+        preview_render_context = {**target_plan.block_context(current_context), **sample_bindings}
+        rendered_prompt = target_plan.render(preview_render_context)
     except ValueError as e:
         rendered_prompt = f"Error rendering prompt preview: {e}. Template: {prompt_template}"
     except Exception as e:
@@ -428,14 +1092,17 @@ async def execute_single_block(
     input_overrides: dict = None,
 ) -> models.BlockRun:
     # Build context as in sequence
-    context = await _gather_sequence_context(db, sequence.id, user_id, input_overrides)
+    plan = execution_plans.block_plan(block)
+    context = await _gather_sequence_context(
+        db, sequence.id, user_id, input_overrides, referenced_names=plan.dependencies(_normalize_key).reads
+    )
     sequence_default_llm_model = block.llm_model_override or sequence.default_llm_model or "claude-3-opus-20240229"
+    # Created RUNNING (without a lease), so the run queue never claims it, and committed before the LLM call
     manual_run = Run(
         user_id=user_id,
         sequence_id=sequence.id,
-        status=RunStatusEnum.COMPLETED,   # or "MANUAL" if you want a special status
+        status=RunStatusEnum.RUNNING,
         started_at=datetime.now(timezone.utc),
-        completed_at=datetime.now(timezone.utc),
         llm_model_override=block.llm_model_override or sequence.default_llm_model,
         input_overrides_json=input_overrides,
         results_summary_json=None,
@@ -443,41 +1110,26 @@ async def execute_single_block(
         # any other required fields...
     )
     db.add(manual_run)
-    await db.flush()  # This gives you manual_run.id
-    # Execute
-    (block_output_data, rendered_prompt, llm_raw_output,
-     named_outputs_db, list_outputs_db, matrix_outputs_db, error_message) = await _execute_single_block_logic(
-        db, block, context, sequence_default_llm_model
+    await db.commit()
+    run_events.publish(manual_run.id, RUN_STARTED, sequence_id=sequence.id)
+    run_state = RunExecutionState(
+        run_id=manual_run.id, retry_config=sequence.llm_retry_config_json, lane=LANE_INTERACTIVE, user_id=user_id
     )
-    
-    for output_var, value in block_output_data.items():
-            await variable.upsert_variable(
-                db=db,
-                name=output_var,
-                value=value,
-                user_id=user_id,
-                sequence_id=sequence.id,
-                type=VariableTypeEnum.OUTPUT._value_
+    try:
+        # Same block run bookkeeping and block_started/block_completed events as a sequence run
+        async with _cancellation_watch(run_state):
+            block_run, _ = await _execute_block_run(
+                db, asyncio.Lock(), manual_run, block, context, sequence_default_llm_model, run_state, plan=plan,
             )
-     
-   
-    # Create and save a BlockRun (no parent run in this mode)
-    block_run = models.BlockRun(
-        run_id=manual_run.id,   # Not part of a full sequence run
-        block_id=block.id,
-        status=models.RunStatusEnum.FAILED if error_message else models.RunStatusEnum.COMPLETED,
-        block_name_snapshot=block.name,
-        block_type_snapshot=block.type,
-        started_at=datetime.now(timezone.utc),
-        completed_at=datetime.now(timezone.utc),
-        prompt_text=rendered_prompt,
-        llm_output_text=llm_raw_output,
-        named_outputs_json=named_outputs_db,
-        list_outputs_json=list_outputs_db,
-        matrix_outputs_json=matrix_outputs_db,
-        error_message=error_message,
-    )
-    db.add(block_run)
-    await db.commit()
-    await db.refresh(block_run)
+        # The run ends with its only block: FAILED, PARTIAL (failed items), CANCELLED or COMPLETED
+        await crud_run.run.finish(db, id=manual_run.id, status=block_run.status, error_message=block_run.error_message)
+        await db.commit()
+        await db.refresh(manual_run)
+        run_events.publish(manual_run.id, RUN_FINISHED, status=manual_run.status.value, error_message=manual_run.error_message)
+    except Exception as e:
+        await _fail_request_run(db, manual_run, e)
+        raise
+    finally:
+        run_events.forget(manual_run.id) # Not executed by the run queue, so nothing else drops its events
+    await response_cache.flush()
     return block_run
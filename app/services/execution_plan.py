@@ -0,0 +1,198 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from app import models
+from app.schemas.block import (
+    BlockConfigDiscretization, BlockConfigMultiList, BlockConfigSingleList, BlockConfigStandard,
+)
+from app.services.dag_scheduler import (
+    BlockDependencies, BlockGraph, block_dependencies, build_block_graph, context_template_variables,
+)
+from app.services.prompt_utils import CompiledTemplate, compile_prompt, get_template_variables, render_compiled
+
+logger = logging.getLogger(__name__)
+
+BlockConfig = Union[BlockConfigStandard, BlockConfigDiscretization, BlockConfigSingleList, BlockConfigMultiList]
+
+CONFIG_MODELS = {
+    models.BlockTypeEnum.STANDARD: BlockConfigStandard,
+    models.BlockTypeEnum.DISCRETIZATION: BlockConfigDiscretization,
+    models.BlockTypeEnum.SINGLE_LIST: BlockConfigSingleList,
+    models.BlockTypeEnum.MULTI_LIST: BlockConfigMultiList,
+}
+
+
+class BlockPlan:
+    """
+    A block compiled for execution: its validated config, compiled prompt template and the
+    template's variables. Built once per block version and shared by every run, so list blocks
+    render each item from the compiled template instead of re-parsing the prompt.
+    `context_variables` are the names the prompt reads from the sequence context (loop
+    placeholders excluded); `required_variables` those every render reads (see CompiledTemplate.optional_variables).
+    Config and template errors are kept and raised on use, so one broken block only fails when it runs.
+    """
+
+    def __init__(self, block: models.Block):
+        self.block_id = block.id
+        self.block_type = block.type
+        self.prompt = (block.config_json or {}).get("prompt") or ""
+        self._config: Optional[BlockConfig] = None
+        self._template: Optional[CompiledTemplate] = None
+        self._error: Optional[Exception] = None
+        self.template_variables: Set[str] = set()
+        self.context_variables: FrozenSet[str] = frozenset()
+        self.required_variables: FrozenSet[str] = frozenset()
+        # Plans outlive the session that loaded the block, so keep plain copies of what the graph needs
+        self._source = SimpleNamespace(id=block.id, name=block.name, type=block.type, config_json=block.config_json)
+        self._dependencies: Optional[BlockDependencies] = None
+        try:
+            config_model = CONFIG_MODELS.get(block.type)
+            if config_model is None:
+                raise NotImplementedError(f"Block type '{block.type}' execution not implemented.")
+            self._config = config_model(**(block.config_json or {}))
+            if self._config.prompt:
+                self._template = compile_prompt(self._config.prompt)
+                self.template_variables = get_template_variables(self._config.prompt)
+                self.context_variables = frozenset(context_template_variables(block.type, self.template_variables))
+                self.required_variables = self.context_variables - self._template.optional_variables
+        except Exception as e:
+            self._error = e
+
+    @property
+    def config(self) -> BlockConfig:
+        if self._error is not None:
+            raise self._error
+        return self._config
+
+    def block_context(self, context: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        The minimal render context for one execution of the block: only the variables its prompt
+        reads, resolved from `context` once. Raises ValueError naming every required variable
+        the context lacks, so a block fails before rendering anything or calling the LLM.
+        """
+        if self._error is not None:
+            raise self._error
+        missing = sorted(name for name in self.required_variables if name not in context)
+        if missing:
+            raise ValueError(
+                f"Missing variable{'s' if len(missing) > 1 else ''} in prompt of block '{self._source.name}': "
+                f"{', '.join(missing)}. Ensure all {{{{variable_name}}}} are provided and spelled correctly. "
+                f"Available context keys: {list(context.keys())}"
+            )
+        return {name: context[name] for name in self.context_variables if name in context}
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        if self._error is not None:
+            raise self._error
+        if self._template is None:
+            return ""
+        return render_compiled(self._template, context, self.prompt)
+
+    def dependencies(self, normalize: Callable[[str], str]) -> BlockDependencies:
+        if self._dependencies is None:
+            self._dependencies = block_dependencies(self._source, normalize)
+        return self._dependencies
+
+
+class SequencePlan:
+    """
+    The compiled blocks of a sequence, in order, plus its block graphs. A graph depends on
+    which names the initial context provides, so one is memoized per distinct set of names.
+    """
+
+    MAX_GRAPHS = 8
+
+    def __init__(self, block_plans: List[BlockPlan]):
+        self.block_plans = block_plans
+        self.by_block_id: Dict[int, BlockPlan] = {plan.block_id: plan for plan in block_plans}
+        self._graphs: "OrderedDict[FrozenSet[str], BlockGraph]" = OrderedDict()
+
+    def referenced_names(self, normalize: Callable[[str], str]) -> Set[str]:
+        """Every context name the blocks read (normalized); decides which global lists a run loads."""
+        names: Set[str] = set()
+        for block_plan in self.block_plans:
+            names |= block_plan.dependencies(normalize).reads
+        return names
+
+    def unresolved_variables(self, known_names: Iterable[str], normalize: Callable[[str], str]) -> Dict[int, List[str]]:
+        """
+        Required prompt variables of each block that neither `known_names` (the initial context)
+        nor an earlier block's outputs provide, by block id. Checked before a run calls the LLM.
+        """
+        available = {normalize(name) for name in known_names}
+        unresolved: Dict[int, List[str]] = {}
+        for block_plan in self.block_plans:
+            missing = sorted(name for name in block_plan.required_variables if normalize(name) not in available)
+            if missing:
+                unresolved[block_plan.block_id] = missing
+            available |= block_plan.dependencies(normalize).writes
+        return unresolved
+
+    def graph(self, blocks: List[models.Block], known_names: Iterable[str], normalize: Callable[[str], str]) -> BlockGraph:
+        key = frozenset(normalize(name) for name in known_names)
+        graph = self._graphs.get(key)
+        if graph is None:
+            graph = build_block_graph(
+                blocks, key, normalize,
+                dependencies=[self.by_block_id[block.id].dependencies(normalize) for block in blocks],
+            )
+            self._graphs[key] = graph
+            if len(self._graphs) > self.MAX_GRAPHS:
+                self._graphs.popitem(last=False)
+        else:
+            self._graphs.move_to_end(key)
+        # The graph references the blocks of the run that built it; hand out this run's instances
+        return BlockGraph(blocks, graph.dependencies, graph.barriers)
+
+
+class ExecutionPlanCache:
+    """
+    In-memory LRU of compiled block and sequence plans. Entries are keyed by block id and
+    checked against the block's updated_at (and the sequence's block ids and order), so a block
+    edited by another process is recompiled on next use; block writes through the API also
+    invalidate explicitly.
+    """
+
+    def __init__(self, max_blocks: int = 5000, max_sequences: int = 1000):
+        self.max_blocks = max_blocks
+        self.max_sequences = max_sequences
+        self._blocks: "OrderedDict[int, Tuple[Optional[datetime], BlockPlan]]" = OrderedDict()
+        self._sequences: "OrderedDict[int, Tuple[Tuple[Any, ...], SequencePlan]]" = OrderedDict()
+
+    def block_plan(self, block: models.Block) -> BlockPlan:
+        entry = self._blocks.get(block.id)
+        if entry is not None and entry[0] == block.updated_at:
+            self._blocks.move_to_end(block.id)
+            return entry[1]
+        plan = BlockPlan(block)
+        self._blocks[block.id] = (block.updated_at, plan)
+        self._blocks.move_to_end(block.id)
+        if len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return plan
+
+    def sequence_plan(self, sequence_id: int, blocks: List[models.Block]) -> SequencePlan:
+        """`blocks` as returned by crud_block.get_multi_by_sequence (in order)."""
+        key = tuple((block.id, block.order, block.updated_at) for block in blocks)
+        entry = self._sequences.get(sequence_id)
+        if entry is not None and entry[0] == key:
+            self._sequences.move_to_end(sequence_id)
+            return entry[1]
+        plan = SequencePlan([self.block_plan(block) for block in blocks])
+        self._sequences[sequence_id] = (key, plan)
+        self._sequences.move_to_end(sequence_id)
+        if len(self._sequences) > self.max_sequences:
+            self._sequences.popitem(last=False)
+        return plan
+
+    def invalidate(self, sequence_id: int, block_id: Optional[int] = None) -> None:
+        """Drops the sequence's plan (and the block's). Call after writing a block."""
+        self._sequences.pop(sequence_id, None)
+        if block_id is not None:
+            self._blocks.pop(block_id, None)
+
+
+execution_plans = ExecutionPlanCache()
@@ -0,0 +1,110 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import crud_global_list
+from app.services.cache_invalidation import cache_invalidation
+
+CHANNEL = "global_lists"
+
+
+@dataclass(frozen=True)
+class GlobalListRef:
+    """A user's global list without its items."""
+    id: int
+    name: str
+    description: Optional[str]
+    version: int
+
+
+class GlobalListCache:
+    """
+    In-process cache of users' global lists, so runs, previews and available_for_sequence
+    don't query them on every call. Per user it keeps the index of its lists (id, name, version);
+    item values are kept per (list id, version) and only loaded for the lists a caller needs,
+    all missing ones in one query. Every write bumps the list's version, so once the user's
+    index is invalidated no stale items are served.
+    The global list routes call invalidate() after each commit, which also reaches the other
+    processes (see cache_invalidation); entries expire after GLOBAL_LIST_CACHE_TTL_SECONDS in
+    case a broadcast is lost or a list is changed outside the API.
+    """
+
+    def __init__(self, max_lists: int, ttl_seconds: float):
+        self.max_lists = max_lists
+        self.ttl_seconds = ttl_seconds
+        self._indexes: Dict[int, Tuple[float, List[GlobalListRef]]] = {}
+        self._items: "OrderedDict[Tuple[int, int], Tuple[float, List[Any]]]" = OrderedDict()
+        # Bumped per user on invalidation, so an index loaded concurrently with a write isn't stored
+        self._generations: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        cache_invalidation.register(CHANNEL, self._on_invalidation)
+
+    async def lists(self, db: AsyncSession, user_id: int) -> List[GlobalListRef]:
+        """The user's lists ordered by name."""
+        entry = self._indexes.get(user_id)
+        if settings.GLOBAL_LIST_CACHE_ENABLED and entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generations.get(user_id, 0)
+        refs = [
+            GlobalListRef(list_id, name, description, version)
+            for list_id, name, description, version
+            in await crud_global_list.global_list.get_summaries_by_owner(db, user_id=user_id)
+        ]
+        if settings.GLOBAL_LIST_CACHE_ENABLED and self._generations.get(user_id, 0) == generation:
+            self._indexes[user_id] = (time.monotonic() + self.ttl_seconds, refs)
+        return refs
+
+    async def item_values(self, db: AsyncSession, refs: List[GlobalListRef]) -> Dict[int, List[Any]]:
+        """Item values of the lists in `refs` by list id; each caller gets its own list objects."""
+        now = time.monotonic()
+        values: Dict[int, List[Any]] = {}
+        missing: List[GlobalListRef] = []
+        for ref in refs:
+            entry = self._items.get((ref.id, ref.version)) if settings.GLOBAL_LIST_CACHE_ENABLED else None
+            if entry is not None and entry[0] > now:
+                self._items.move_to_end((ref.id, ref.version))
+                values[ref.id] = entry[1]
+            else:
+                missing.append(ref)
+        if missing:
+            loaded = await crud_global_list.global_list.get_item_values(db, global_list_ids=[ref.id for ref in missing])
+            for ref in missing:
+                values[ref.id] = loaded[ref.id]
+                if settings.GLOBAL_LIST_CACHE_ENABLED:
+                    self._items[(ref.id, ref.version)] = (now + self.ttl_seconds, loaded[ref.id])
+            while len(self._items) > self.max_lists:
+                self._items.popitem(last=False)
+        return {list_id: list(list_values) for list_id, list_values in values.items()}
+
+    def invalidate(self, user_id: int, list_id: Optional[int] = None) -> None:
+        """Call once a write to (or the deletion of) one of the user's lists is committed."""
+        cache_invalidation.publish(CHANNEL, user_id=user_id, list_id=list_id)
+
+    def _on_invalidation(self, message: Dict[str, Any]) -> None:
+        user_id = message.get("user_id")
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self._indexes.pop(user_id, None)
+        list_id = message.get("list_id")
+        if list_id is not None:
+            for key in [key for key in self._items if key[0] == list_id]:
+                del self._items[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._indexes),
+            "lists_with_items": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+global_list_cache = GlobalListCache(settings.GLOBAL_LIST_CACHE_MAX_LISTS, settings.GLOBAL_LIST_CACHE_TTL_SECONDS)
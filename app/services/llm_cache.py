@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.crud.crud_llm_cache import llm_cache_entry
+from app.db.session import AsyncSessionFactory
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(prompt: str, model: str, temperature: float, max_tokens: int) -> str:
+    """Content address of an LLM call: sha256 over the rendered prompt and the sampling parameters."""
+    payload = json.dumps(
+        {"prompt": prompt, "model": model, "temperature": float(temperature), "max_tokens": int(max_tokens)},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def should_use_cache(use_cache: Optional[bool], temperature: float) -> bool:
+    """An explicit per-run/per-block switch wins; by default only deterministic (temperature 0) calls are cached."""
+    if not settings.LLM_CACHE_ENABLED:
+        return False
+    if use_cache is not None:
+        return use_cache
+    return temperature == 0
+
+
+class MemoryLRUCache:
+    """In-process LRU with a max entry count and a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float]):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float | None, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LLMResponseCache:
+    """
+    Two-tier response cache: the in-process LRU is checked first, then the
+    llm_response_cache table. Persistent hits are promoted into memory; only they
+    are counted in the table's hit_count, memory hits stay in the process stats.
+
+    Persistent writes (new entries and hit counters) are buffered and written in
+    batches with a dedicated session, so concurrently running list items never
+    wait on the database and the run's own transaction is never touched. The engine
+    calls flush() once a run has committed; a batch that fails (e.g. SQLite locked
+    by a run in progress) stays buffered for the next flush.
+    """
+
+    def __init__(self):
+        self.memory = MemoryLRUCache(settings.LLM_CACHE_MEMORY_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS)
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._pending_entries: Dict[str, Dict[str, Any]] = {}
+        self._pending_hits: Dict[str, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None # Batch flush started by set(), awaited by close()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1 # Counted in stats() only; hit_count tracks persistent-tier hits
+            return value
+        if settings.LLM_CACHE_PERSISTENT_ENABLED:
+            try:
+                async with AsyncSessionFactory() as db:
+                    entry = await llm_cache_entry.get_valid_by_key(db, cache_key=key)
+                    value = entry.response_text if entry is not None else None
+            except Exception as e:
+                # The cache must never fail a run; fall through to a real LLM call
+                logger.warning(f"LLM cache lookup failed for key {key[:12]}...: {e}")
+                value = None
+            if value is not None:
+                self.persistent_hits += 1
+                self.memory.set(key, value)
+                self._count_persistent_hit(key)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, *, model: str, temperature: float, max_tokens: int) -> None:
+        self.memory.set(key, value)
+        if not settings.LLM_CACHE_PERSISTENT_ENABLED:
+            return
+        ttl = settings.LLM_CACHE_TTL_SECONDS
+        self._pending_entries[key] = {
+            "cache_key": key, "model": model, "temperature": float(temperature), "max_tokens": int(max_tokens),
+            "response_text": value,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl) if ttl else None,
+        }
+        if len(self._pending_entries) >= settings.LLM_CACHE_WRITE_BATCH_SIZE and not self._flush_lock.locked():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _count_persistent_hit(self, key: str) -> None:
+        if settings.LLM_CACHE_PERSISTENT_ENABLED:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+
+    async def flush(self) -> None:
+        """Writes buffered entries and hit counters to the llm_response_cache table."""
+        async with self._flush_lock:
+            if not self._pending_entries and not self._pending_hits:
+                return
+            entries, self._pending_entries = self._pending_entries, {}
+            hits, self._pending_hits = self._pending_hits, {}
+            try:
+                async with AsyncSessionFactory() as db:
+                    await llm_cache_entry.bulk_store(db, entries=list(entries.values()), hit_counts=hits)
+            except Exception as e:
+                logger.warning(f"LLM cache flush of {len(entries)} entries failed, will retry: {e}")
+                # Keep anything newer that arrived meanwhile
+                self._pending_entries = {**entries, **self._pending_entries}
+                for key, count in hits.items():
+                    self._pending_hits[key] = self._pending_hits.get(key, 0) + count
+
+    async def close(self) -> None:
+        """Waits for a batch flush still in progress, then writes whatever is left. Called on shutdown."""
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            try:
+                await task
+            except Exception as e:
+                logger.error(f"Background LLM cache flush failed: {e}", exc_info=True)
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "memory_entries": len(self.memory),
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "pending_writes": len(self._pending_entries),
+            "hit_rate": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+        }
+
+
+response_cache = LLMResponseCache()
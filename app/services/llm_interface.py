@@ -1,53 +1,186 @@
+import asyncio
 import httpx
 import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from app.core.config import settings
-from anthropic import Anthropic, APIStatusError, APIConnectionError, RateLimitError, APIError
+from app.services.llm_cache import make_cache_key, response_cache, should_use_cache
+from app.services.rate_limiter import DEFAULT_PRIORITY, CallPriority, estimate_tokens, rate_limiters
+from app.services.llm_retry import RetryPolicy, is_retryable, latency_tracker
+from app.services.single_flight import llm_single_flight
+from anthropic import AsyncAnthropic, APIStatusError, APIConnectionError, RateLimitError, APIError
 from fastapi import HTTPException # Add this if not already imported at module level
 
 logger = logging.getLogger(__name__)
 
-# Initialize the Anthropic client
-# It's better to initialize it once and reuse, or manage its lifecycle if needed.
-# For simplicity here, creating it per call, but consider a global client or dependency injection.
+# One AsyncAnthropic client (and therefore one pooled httpx.AsyncClient) per process.
+# It is created in the app lifespan via init_llm_client() and closed on shutdown;
+# get_llm_client() lazily creates it for callers running outside the app (scripts, workers).
+_client: AsyncAnthropic | None = None
 
-async def call_claude_api(prompt: str, model: str = "claude-3-opus-20240229", max_tokens: int = 2048, temperature: float = 0.7) -> str:
+
+def _build_llm_client() -> AsyncAnthropic:
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT, connect=settings.LLM_HTTP_CONNECT_TIMEOUT),
+    )
+    # Retries are owned by _send_with_retries (and throttling by the rate limiter), not the SDK
+    return AsyncAnthropic(api_key=settings.CLAUDE_API_KEY, http_client=http_client, max_retries=0)
+
+
+async def init_llm_client() -> AsyncAnthropic:
+    """Creates the process-wide async client. Safe to call more than once."""
+    global _client
+    if _client is None:
+        _client = _build_llm_client()
+        logger.info(
+            f"LLM client initialized (max_connections={settings.LLM_HTTP_MAX_CONNECTIONS}, "
+            f"max_keepalive={settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS})."
+        )
+    return _client
+
+
+async def close_llm_client() -> None:
+    """Closes the process-wide client and its connection pool."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        logger.info("LLM client closed.")
+
+
+def get_llm_client() -> AsyncAnthropic:
+    global _client
+    if _client is None:
+        _client = _build_llm_client()
+    return _client
+
+
+class LLMCallStats:
+    """Counters for the LLM calls made on behalf of one BlockRun."""
+
+    def __init__(self):
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0 # Calls that shared another caller's in-flight request
+        self.checkpoint_hits = 0 # Items restored from a checkpoint of an earlier attempt of the run
+        self.calls: List[Dict[str, Any]] = [] # One entry per upstream call (cache hits excluded)
+
+    def record_call(self, attempts: int, latency_seconds: float, hedged: bool, hedge_won: bool, succeeded: bool) -> None:
+        self.calls.append({
+            "attempts": attempts,
+            "latency_ms": round(latency_seconds * 1000, 1),
+            "hedged": hedged,
+            "hedge_won": hedge_won,
+            "succeeded": succeeded,
+        })
+
+    def metrics_json(self) -> Optional[Dict[str, Any]]:
+        """Summary plus per-call records, stored on BlockRun.llm_call_metrics_json."""
+        if not self.calls and not self.coalesced and not self.checkpoint_hits:
+            return None
+        latencies = sorted(call["latency_ms"] for call in self.calls) or [0.0]
+        return {
+            "calls": len(self.calls),
+            "coalesced": self.coalesced,
+            "checkpoint_hits": self.checkpoint_hits,
+            "attempts": sum(call["attempts"] for call in self.calls),
+            "retried_calls": sum(1 for call in self.calls if call["attempts"] > 1),
+            "hedged_calls": sum(1 for call in self.calls if call["hedged"]),
+            "hedge_wins": sum(1 for call in self.calls if call["hedge_won"]),
+            "failed_calls": sum(1 for call in self.calls if not call["succeeded"]),
+            "latency_ms": {
+                "p50": latencies[len(latencies) // 2],
+                "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                "max": latencies[-1],
+            },
+            "per_call": self.calls,
+        }
+
+
+PARSE_ERROR_OUTPUT = "Error: Could not parse LLM response."
+
+
+async def call_claude_api(
+    prompt: str,
+    model: str = "claude-3-opus-20240229",
+    max_tokens: int = 2048,
+    temperature: float = 0.7,
+    use_cache: Optional[bool] = None,
+    stats: Optional[LLMCallStats] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    priority: CallPriority = DEFAULT_PRIORITY,
+) -> str:
+    """
+    Calls Claude, served from the response cache when allowed.
+    use_cache=None caches only deterministic (temperature 0) calls; True/False forces it on/off.
+    retry_policy defaults to the LLM_RETRY_* / LLM_HEDGE_* settings.
+    Concurrent calls with the same (prompt, model, temperature, max_tokens) share one
+    upstream request (LLM_SINGLE_FLIGHT_ENABLED), whatever the cache policy.
+    priority picks the rate limiter lane and the user the call is fair-shared against.
+    """
+    retry_policy = retry_policy or RetryPolicy.default()
     if not settings.CLAUDE_API_KEY:
         logger.error("CLAUDE_API_KEY not set in environment variables.")
         raise ValueError("CLAUDE_API_KEY is not configured.")
 
-    client = Anthropic(api_key=settings.CLAUDE_API_KEY)
+    cache_enabled = should_use_cache(use_cache, temperature)
+    cache_key = make_cache_key(prompt, model, temperature, max_tokens)
+    if cache_enabled:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            if stats is not None:
+                stats.cache_hits += 1
+            return cached
+        if stats is not None:
+            stats.cache_misses += 1
+
+    async def fetch() -> str:
+        output = await _create_message(prompt, model, max_tokens, temperature, retry_policy, stats, priority)
+        if cache_enabled and output != PARSE_ERROR_OUTPUT:
+            await response_cache.set(cache_key, output, model=model, temperature=temperature, max_tokens=max_tokens)
+        return output
+
+    if not settings.LLM_SINGLE_FLIGHT_ENABLED:
+        return await fetch()
+    if stats is not None and llm_single_flight.in_flight(cache_key):
+        stats.coalesced += 1
+    return await llm_single_flight.do(cache_key, fetch)
+
+
+# 429 = rate limited, 529 = provider overloaded. Both mean "slow down", not "give up".
+THROTTLE_STATUS_CODES = (429, 529)
 
+
+async def _create_message(
+    prompt: str, model: str, max_tokens: int, temperature: float,
+    retry_policy: RetryPolicy, stats: Optional[LLMCallStats], priority: CallPriority
+) -> str:
     try:
-        # Using the Messages API (recommended over legacy Text Completions)
-        response = client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
-        
+        response = await _send_with_retries(prompt, model, max_tokens, temperature, retry_policy, stats, priority)
+
         # The response structure for messages API:
         # response.content is a list of content blocks. For text, it's usually one block.
         if response.content and isinstance(response.content, list) and hasattr(response.content[0], 'text'):
             return response.content[0].text
         else:
             logger.error(f"Unexpected response structure from Claude API: {response}")
-            return "Error: Could not parse LLM response."
+            return PARSE_ERROR_OUTPUT
 
+    except RateLimitError as e: # Subclass of APIStatusError, so it must be caught first
+        logger.error(f"Claude API rate limit exceeded: {e}", exc_info=True)
+        raise HTTPException(status_code=429, detail="LLM Rate Limit Exceeded. Please try again later.")
     except APIStatusError as e:
         logger.error(f"Claude API returned an APIStatusError: {e.status_code} - {e.response}", exc_info=True)
         raise HTTPException(status_code=e.status_code, detail=f"LLM API Error: {e.message}")
     except APIConnectionError as e:
         logger.error(f"Failed to connect to Claude API: {e}", exc_info=True)
         raise HTTPException(status_code=503, detail="LLM Service Unavailable: Connection Error")
-    except RateLimitError as e:
-        logger.error(f"Claude API rate limit exceeded: {e}", exc_info=True)
-        raise HTTPException(status_code=429, detail="LLM Rate Limit Exceeded. Please try again later.")
     except APIError as e: # Catch other Anthropic API errors
         logger.error(f"An unexpected error occurred with the Claude API: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"LLM API Internal Error: {e.message}")
@@ -55,6 +188,141 @@ async def call_claude_api(prompt: str, model: str = "claude-3-opus-20240229", ma
         logger.error(f"An unexpected error occurred while calling Claude API: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred with the LLM service.")
 
+
+async def _send_with_retries(
+    prompt: str, model: str, max_tokens: int, temperature: float,
+    retry_policy: RetryPolicy, stats: Optional[LLMCallStats], priority: CallPriority
+):
+    """
+    Retries transient failures (connection errors, timeouts, 5xx) with full-jitter
+    exponential backoff. With hedging enabled each attempt may be hedged, see _send_hedged.
+    """
+    started = time.monotonic()
+    attempt = 0
+    hedged = hedge_won = False
+    while True:
+        attempt += 1
+        try:
+            if retry_policy.hedge:
+                response, attempt_hedged, attempt_hedge_won = await _send_hedged(prompt, model, max_tokens, temperature, priority)
+                hedged = hedged or attempt_hedged
+                hedge_won = hedge_won or attempt_hedge_won
+            else:
+                response = await _send_once(prompt, model, max_tokens, temperature, priority)
+        except Exception as e:
+            if attempt >= retry_policy.max_attempts or not is_retryable(e):
+                if stats is not None:
+                    stats.record_call(attempt, time.monotonic() - started, hedged, hedge_won, succeeded=False)
+                raise
+            delay = retry_policy.backoff(attempt)
+            logger.warning(f"LLM call to {model} failed (attempt {attempt}/{retry_policy.max_attempts}): {e}. Retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        if stats is not None:
+            stats.record_call(attempt, time.monotonic() - started, hedged, hedge_won, succeeded=True)
+        return response
+
+
+async def _send_hedged(
+    prompt: str, model: str, max_tokens: int, temperature: float, priority: CallPriority
+) -> Tuple[Any, bool, bool]:
+    """
+    Sends the request; if it has not answered within the model's observed p95 latency,
+    sends a duplicate and keeps whichever succeeds first. The loser is cancelled.
+    Returns (response, hedged, hedge_won).
+    """
+    hedge_delay = latency_tracker.hedge_delay(model)
+    primary = asyncio.create_task(_send_once(prompt, model, max_tokens, temperature, priority))
+    if hedge_delay is None:
+        return await primary, False, False
+    hedge = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result(), False, False
+        hedge = asyncio.create_task(_send_once(prompt, model, max_tokens, temperature, priority))
+        pending = {primary, hedge}
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), True, task is hedge
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def _send_once(prompt: str, model: str, max_tokens: int, temperature: float, priority: CallPriority):
+    started = time.monotonic()
+    if settings.LLM_RATE_LIMIT_ENABLED:
+        response = await _send_rate_limited(prompt, model, max_tokens, temperature, priority)
+    else:
+        response = await _send_message(prompt, model, max_tokens, temperature)
+    latency_tracker.record(model, time.monotonic() - started)
+    return response
+
+
+async def _send_message(prompt: str, model: str, max_tokens: int, temperature: float):
+    client = get_llm_client()
+    # Using the Messages API (recommended over legacy Text Completions)
+    return await client.messages.create(
+        model=model,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        messages=[
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    )
+
+
+async def _send_rate_limited(prompt: str, model: str, max_tokens: int, temperature: float, priority: CallPriority):
+    """
+    Sends the request through the model's shared rate limiter, in the slot order of the
+    call's priority lane and user fair share (see FairShareScheduler). Throttled responses
+    shrink the model's concurrency limit and the call is re-queued after a backoff,
+    up to LLM_THROTTLE_MAX_RETRIES times.
+    """
+    limiter = rate_limiters.get(model)
+    estimated_tokens = estimate_tokens(prompt)
+    throttles = 0
+    while True:
+        async with limiter.slot(estimated_tokens, priority):
+            try:
+                response = await _send_message(prompt, model, max_tokens, temperature)
+            except APIStatusError as e:
+                if e.status_code not in THROTTLE_STATUS_CODES or throttles >= settings.LLM_THROTTLE_MAX_RETRIES:
+                    raise
+                limiter.on_throttle()
+                throttles += 1
+                delay = _throttle_delay(e, throttles)
+            else:
+                usage = getattr(response, "usage", None)
+                actual_tokens = (usage.input_tokens + usage.output_tokens) if usage is not None else None
+                limiter.on_success(estimated_tokens, actual_tokens)
+                return response
+        logger.info(f"LLM call to {model} throttled ({throttles}/{settings.LLM_THROTTLE_MAX_RETRIES}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def _throttle_delay(error: APIStatusError, attempt: int) -> float:
+    """Honours the provider's retry-after header, else exponential backoff with jitter."""
+    retry_after = None
+    try:
+        retry_after = float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    if retry_after is not None:
+        return min(retry_after, settings.LLM_THROTTLE_MAX_BACKOFF_SECONDS)
+    backoff = min(settings.LLM_THROTTLE_BASE_BACKOFF_SECONDS * 2 ** (attempt - 1), settings.LLM_THROTTLE_MAX_BACKOFF_SECONDS)
+    return backoff * random.uniform(0.5, 1.0)
+
 # Example of how to use this (e.g., in a service or route):
 # async def some_function():
 #     try:
@@ -0,0 +1,91 @@
+import math
+import random
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from anthropic import APIConnectionError, APIStatusError
+
+from app.core.config import settings
+
+# Transient statuses worth another attempt. 429/529 are re-queued by the rate limiter first.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, APIConnectionError): # Includes APITimeoutError
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+class RetryPolicy:
+    """How one LLM call is retried and hedged. Built from settings, then the sequence and block overrides."""
+
+    def __init__(
+        self,
+        max_attempts: int,
+        base_delay_seconds: float,
+        max_delay_seconds: float,
+        hedge: bool,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.hedge = hedge
+
+    @classmethod
+    def default(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=settings.LLM_RETRY_MAX_ATTEMPTS,
+            base_delay_seconds=settings.LLM_RETRY_BASE_DELAY_SECONDS,
+            max_delay_seconds=settings.LLM_RETRY_MAX_DELAY_SECONDS,
+            hedge=settings.LLM_HEDGE_ENABLED,
+        )
+
+    @classmethod
+    def resolve(cls, *overrides: Optional[Dict[str, Any]]) -> "RetryPolicy":
+        """Applies LLMRetryConfig dicts in order (e.g. sequence, then block); unset fields are skipped."""
+        policy = cls.default()
+        for override in overrides:
+            for field, value in (override or {}).items():
+                if value is not None and hasattr(policy, field):
+                    setattr(policy, field, value)
+        policy.max_attempts = max(1, policy.max_attempts)
+        return policy
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff after the given (1-based) failed attempt."""
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per model, used to pick the hedge delay."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, latency_seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(latency_seconds)
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Observed p95 for the model, or None until enough samples exist to trust it."""
+        samples = self._samples.get(model)
+        if not samples or len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(settings.LLM_HEDGE_MIN_DELAY_SECONDS, self.percentile(model, 95))
+
+
+latency_tracker = LatencyTracker(settings.LLM_LATENCY_WINDOW)
@@ -0,0 +1,65 @@
+import itertools
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+Coords = Tuple[int, ...]
+
+
+class MatrixDimension:
+    """One input list of a MULTI_LIST block. `position` is its index in input_lists_config."""
+
+    def __init__(self, position: int, name: str, values: List[Any], priority: int = 1):
+        self.position = position
+        self.name = name
+        self.values = values
+        self.priority = priority
+
+    @property
+    def placeholder(self) -> str:
+        # First configured list binds {{item1}}, second {{item2}}, ...
+        return f"item{self.position + 1}"
+
+
+def loop_order(dimensions: Sequence[MatrixDimension]) -> List[MatrixDimension]:
+    """Dimensions from outermost to innermost loop: lower priority number first, ties keep config order."""
+    return sorted(dimensions, key=lambda d: (d.priority, d.position))
+
+
+def matrix_shape(dimensions: Sequence[MatrixDimension]) -> Tuple[int, ...]:
+    return tuple(len(d.values) for d in dimensions)
+
+
+def iter_cells(dimensions: Sequence[MatrixDimension]) -> Iterator[Coords]:
+    """
+    Yields the coordinates of every cell of the cartesian product, visiting them in
+    priority loop order. Coordinates are always expressed in config (axis) order,
+    so they can be used directly to place results in the output matrix.
+    """
+    ordered = loop_order(dimensions)
+    for loop_indices in itertools.product(*(range(len(d.values)) for d in ordered)):
+        coords = [0] * len(dimensions)
+        for dim, idx in zip(ordered, loop_indices):
+            coords[dim.position] = idx
+        yield tuple(coords)
+
+
+def cell_bindings(dimensions: Sequence[MatrixDimension], coords: Coords) -> Dict[str, Any]:
+    """Per-cell template variables: itemN, itemN_name and itemN_index for every dimension."""
+    bindings: Dict[str, Any] = {}
+    for dim in dimensions:
+        idx = coords[dim.position]
+        bindings[dim.placeholder] = dim.values[idx]
+        bindings[f"{dim.placeholder}_name"] = dim.name
+        bindings[f"{dim.placeholder}_index"] = idx
+    return bindings
+
+
+def build_matrix(shape: Tuple[int, ...], results: Dict[Coords, Any]) -> List[Any]:
+    """Nests cell results into lists following `shape` (axis 0 outermost). Missing cells are None."""
+    def _build(prefix: Coords, depth: int) -> List[Any]:
+        if depth == len(shape) - 1:
+            return [results.get(prefix + (i,)) for i in range(shape[depth])]
+        return [_build(prefix + (i,), depth + 1) for i in range(shape[depth])]
+
+    if not shape:
+        return []
+    return _build((), 0)
@@ -1,9 +1,13 @@
 # (Content from previous response - unchanged and correct)
-from jinja2 import Environment, select_autoescape, meta, UndefinedError, StrictUndefined
+from collections import OrderedDict
+from jinja2 import Environment, Template, nodes, select_autoescape, meta, UndefinedError, StrictUndefined
+from markupsafe import escape
 import json
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, FrozenSet, Iterator, List, Mapping, Optional, Set, Tuple
 import logging
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 jinja_env = Environment(
@@ -14,38 +18,261 @@ jinja_env = Environment(
     lstrip_blocks=True,
 )
 
+class LayeredContext(Mapping[str, Any]):
+    """
+    Read-only view of per-item `bindings` over a shared `base` context. Lookups check the
+    bindings first; nothing is copied, so rendering N list items or matrix cells costs N small
+    dicts instead of N copies of the whole sequence context.
+    """
+
+    __slots__ = ("base", "bindings")
+
+    def __init__(self, base: Mapping[str, Any], bindings: Mapping[str, Any]):
+        self.base = base
+        self.bindings = bindings
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.bindings:
+            return self.bindings[key]
+        return self.base[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.bindings or key in self.base
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.bindings
+        for key in self.base:
+            if key not in self.bindings:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.bindings) + sum(1 for key in self.base if key not in self.bindings)
+
+    def __repr__(self) -> str:
+        return f"LayeredContext(bindings={self.bindings!r}, base=<{len(self.base)} keys>)"
+
 def get_template_variables(template_string: str) -> Set[str]:
     """Parses a Jinja2 template string and returns a set of undeclared variables."""
     if not template_string:
         return set()
-    try:
-        parsed_content = jinja_env.parse(template_string)
-        return meta.find_undeclared_variables(parsed_content)
-    except Exception as e:
-        logger.error(f"Error parsing template to find variables: '{template_string[:100]}...': {e}")
-        # Depending on strictness, you might re-raise or return empty set
-        raise ValueError(f"Invalid template syntax: {e}")
+    return set(template_cache.get(template_string).variables)
 
 import re
 
-def render_prompt(template_string: str, context: Dict[str, Any]) -> str:
-    """Renders a prompt template with the given context, supporting both <<var>> and {{ var }} syntax."""
-    if not template_string:
-        return ""
-    # Preprocess: Replace <<var>> with {{ var }}
-    # Handles whitespace too: << var >> → {{ var }}
-    template_string = re.sub(r"<<\s*(\w+)\s*>>", r"{{ \1 }}", template_string)
+def convert_angle_placeholders(template_string: str) -> str:
+    """Rewrites the <<var>> placeholder syntax to Jinja2 {{ var }} (whitespace allowed: << var >>)."""
+    return re.sub(r"<<\s*(\w+)\s*>>", r"{{ \1 }}", template_string)
+
+# A bare `{{ name }}`; anything else inside {{ }} ({{- x }}, filters, attributes) needs Jinja
+_PLAIN_VARIABLE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+# Names Jinja parses as literals or operators rather than variable lookups
+_JINJA_RESERVED_NAMES = frozenset({
+    "true", "false", "none", "True", "False", "None", "and", "or", "not", "in", "is", "if", "else",
+    "self", # Jinja binds it to the template's block namespace, not a context variable
+})
+_JINJA_MARKERS = ("{{", "{%", "{#")
+_NEWLINE = re.compile(r"\r\n|\r|\n")
+# `x is defined` / `x|default(...)` make a variable optional under StrictUndefined
+_GUARD_TESTS = frozenset({"defined", "undefined"})
+_GUARD_FILTERS = frozenset({"default", "d"})
+
+
+class SubstitutionPlan:
+    """
+    Render plan of a template that only substitutes plain variables: the literal text between
+    placeholders and the variable names, rendered by a single join. Produces what Jinja would:
+    line endings normalized to \\n, one trailing newline dropped, values escaped when the
+    environment autoescapes string templates, and the same UndefinedError for a missing variable.
+    """
+
+    __slots__ = ("literals", "names", "autoescape")
+
+    def __init__(self, literals: Tuple[str, ...], names: Tuple[str, ...], autoescape: bool):
+        self.literals = literals
+        self.names = names
+        self.autoescape = autoescape
+
+    @classmethod
+    def from_source(cls, source: str) -> Optional["SubstitutionPlan"]:
+        """The plan for `source` (after convert_angle_placeholders), None if it needs Jinja."""
+        lines = _NEWLINE.split(source)
+        if not jinja_env.keep_trailing_newline and lines[-1] == "":
+            del lines[-1]
+        pieces = _PLAIN_VARIABLE.split(jinja_env.newline_sequence.join(lines))
+        literals, names = tuple(pieces[0::2]), tuple(pieces[1::2])
+        if any(marker in literal for literal in literals for marker in _JINJA_MARKERS):
+            return None
+        if any(literal.endswith("{") for literal in literals[:-1]):
+            return None # Jinja opens the expression at the first "{{" of "{{{ x }}"
+        if any(name in _JINJA_RESERVED_NAMES for name in names):
+            return None
+        autoescape = jinja_env.autoescape(None) if callable(jinja_env.autoescape) else jinja_env.autoescape
+        return cls(literals, names, bool(autoescape))
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        literals = self.literals
+        parts = [literals[0]]
+        for position, name in enumerate(self.names, 1):
+            if name in context:
+                value = context[name]
+            elif name in jinja_env.globals:
+                value = jinja_env.globals[name]
+            else:
+                raise UndefinedError(f"{name!r} is undefined")
+            parts.append(escape(value) if self.autoescape else str(value))
+            parts.append(literals[position])
+        return "".join(parts)
+
+
+class CompiledTemplate:
+    """
+    A prompt template compiled once; its undeclared variables are parsed on first use.
+    Templates doing nothing but plain variable substitution also get a SubstitutionPlan,
+    which render_compiled uses instead of running the Jinja template.
+    """
+
+    __slots__ = ("template", "substitution", "_variables", "_optional_variables", "_source")
+
+    def __init__(self, template: Template, source: str):
+        self.template = template
+        self.substitution = SubstitutionPlan.from_source(source)
+        self._source = source
+        self._variables = None
+        self._optional_variables = None
+
+    @property
+    def variables(self) -> FrozenSet[str]:
+        if self._variables is None:
+            self._analyse()
+        return self._variables
+
+    @property
+    def optional_variables(self) -> FrozenSet[str]:
+        """
+        Variables the template may render without: read only in conditional branches
+        or behind `is defined` / `|default`. All others must be in the render context.
+        """
+        if self._optional_variables is None:
+            self._analyse()
+        return self._optional_variables
+
+    def _analyse(self) -> None:
+        if self.substitution is not None:
+            self._variables = frozenset(name for name in self.substitution.names if name not in jinja_env.globals)
+            self._optional_variables = frozenset()
+            return
+        try:
+            ast = jinja_env.parse(self._source)
+        except Exception as e:
+            logger.error(f"Error parsing template to find variables: '{self._source[:100]}...': {e}")
+            raise ValueError(f"Invalid template syntax: {e}")
+        self._variables = frozenset(meta.find_undeclared_variables(ast))
+        guarded = [node.node for node in ast.find_all(nodes.Test) if node.name in _GUARD_TESTS]
+        guarded += [node.node for node in ast.find_all(nodes.Filter) if node.name in _GUARD_FILTERS]
+        always_read: Set[str] = set()
+        _collect_unconditional_names(ast, always_read)
+        self._optional_variables = frozenset(
+            {node.name for node in guarded if isinstance(node, nodes.Name)} | (self._variables - always_read)
+        ) & self._variables
+
+
+def _collect_unconditional_names(node: nodes.Node, names: Set[str]) -> None:
+    """Names read on every render: conditional branches (if/elif/else, `a if b else c`) and loop bodies are skipped."""
+    if isinstance(node, nodes.For):
+        _collect_unconditional_names(node.iter, names)
+        return
+    if isinstance(node, nodes.If):
+        _collect_unconditional_names(node.test, names)
+        return
+    if isinstance(node, nodes.CondExpr):
+        _collect_unconditional_names(node.test, names)
+        return
+    if isinstance(node, nodes.Name) and node.ctx == "load":
+        names.add(node.name)
+    for child in node.iter_child_nodes():
+        _collect_unconditional_names(child, names)
+
+
+class TemplateCache:
+    """
+    Bounded LRU of compiled prompt templates, shared by render_prompt, get_template_variables,
+    block plans and previews, so a template is rewritten and compiled once instead of per call.
+    Keyed by the template source itself: str hashes are cached on the string object and equal
+    keys never collide, unlike a digest that would have to be recomputed on every lookup.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_string: str) -> CompiledTemplate:
+        entry = self._entries.get(template_string)
+        if entry is not None:
+            self._entries.move_to_end(template_string)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        source = convert_angle_placeholders(template_string)
+        try:
+            entry = CompiledTemplate(jinja_env.from_string(source), source)
+        except Exception as e:
+            logger.error(f"Error compiling prompt template: '{template_string[:100]}...': {e}")
+            raise ValueError(f"Invalid template syntax: {e}")
+        self._entries[template_string] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
 
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+template_cache = TemplateCache(settings.PROMPT_TEMPLATE_CACHE_SIZE)
+
+
+def compile_prompt(template_string: str) -> CompiledTemplate:
+    """Compiled template for a prompt (<<var>> or {{ var }} syntax), from the template cache."""
+    return template_cache.get(template_string)
+
+def _render_jinja(template: Template, context: Mapping[str, Any]) -> str:
+    # Template.render() would copy the context into a new dict on every call,
+    # so the context is layered over the template globals and used as-is instead
+    jinja_context = template.new_context(LayeredContext(template.globals, context), shared=True)
+    return "".join(template.root_render_func(jinja_context))
+
+def render_compiled(compiled: CompiledTemplate, context: Mapping[str, Any], template_string: str = "") -> str:
+    """
+    Renders a template from compile_prompt with a dict or LayeredContext; `template_string` is
+    only used in error messages. Plain substitution templates skip Jinja (see SubstitutionPlan).
+    """
     try:
-        template = jinja_env.from_string(template_string)
-        return template.render(context)
-    except StrictUndefined as e:
+        if compiled.substitution is not None:
+            return compiled.substitution.render(context)
+        return _render_jinja(compiled.template, context)
+    except UndefinedError as e:
         logger.warning(f"Undefined variable in prompt template: {e.message}. Template: '{template_string[:100]}...' Context keys: {list(context.keys())}")
         raise ValueError(f"Missing variable in prompt: {e.message}. Ensure all {{{{variable_name}}}} are provided and spelled correctly. Available context keys: {list(context.keys())}")
     except Exception as e:
         logger.error(f"Error rendering prompt template: '{template_string[:100]}...': {e}", exc_info=True)
         raise ValueError(f"Error during prompt rendering: {e}")
 
+def render_prompt(template_string: str, context: Mapping[str, Any]) -> str:
+    """
+    Renders a prompt template with the given context, supporting both <<var>> and {{ var }} syntax.
+    Only the first call per template compiles it (see TemplateCache).
+    """
+    if not template_string:
+        return ""
+    return render_compiled(compile_prompt(template_string), context, template_string)
+
 
 def discretize_output(llm_output: str, output_names: List[str]) -> Dict[str, str]:
     """
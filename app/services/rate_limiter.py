@@ -0,0 +1,276 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Priority lanes, highest first. A free slot always goes to the highest lane that has a waiter
+# and is below its share of the concurrency limit (LLM_LANE_CONCURRENCY_SHARES).
+LANE_INTERACTIVE = "interactive" # Single-block runs, reruns and retries someone is waiting on
+LANE_STANDARD = "standard" # Queued sequence runs
+LANE_BATCH = "batch" # Child runs of batch runs
+LANES = (LANE_INTERACTIVE, LANE_STANDARD, LANE_BATCH)
+
+
+@dataclass(frozen=True)
+class CallPriority:
+    """Who an LLM call is made for: its lane and the user whose fair share it counts against."""
+    lane: str = LANE_STANDARD
+    user_id: Optional[int] = None
+
+
+DEFAULT_PRIORITY = CallPriority()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used before the real usage is known."""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`, holding at most one minute of budget."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # A single request larger than the bucket would wait forever; let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        # The lock makes waiters queue up FIFO instead of all polling the same refill
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate_per_second)
+
+    def adjust(self, amount: float) -> None:
+        """Debits (positive) or credits (negative) tokens after the fact; the balance may go negative."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AIMDConcurrencyController:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight calls.
+    Each success raises the limit by 1/limit (about +1 per window of successful calls);
+    a throttle (429/529) multiplies it by LLM_AIMD_DECREASE_FACTOR, at most once per cooldown
+    so a burst of throttled responses from the same window only backs off once.
+    Admission against the limit is done by FairShareScheduler.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, decrease_factor: float, cooldown_seconds: float):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_success(self) -> None:
+        self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+    def on_throttle(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        logger.warning(f"LLM throttled, concurrency limit {previous} -> {self.limit}")
+
+
+class FairShareScheduler:
+    """
+    Hands out a model's concurrency slots (up to the AIMD limit) to waiting calls.
+    Lanes are served in strict priority order. A lane together with the lanes below it is capped
+    at its share of the current limit, so batch and queued runs can never occupy the slots
+    interactive calls need.
+    Within a lane, users are served by weighted fair queuing: every call gets a virtual
+    finish tag max(lane virtual time, user's previous tag) + 1 / user weight and the smallest
+    tag goes next, so a user with 10000 queued calls and a user with 1 alternate instead of
+    the single call waiting behind the whole backlog.
+    """
+
+    def __init__(self, controller: AIMDConcurrencyController):
+        self.controller = controller
+        self._queues: Dict[str, List[Tuple[float, int, asyncio.Future]]] = {lane: [] for lane in LANES}
+        self._in_flight: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._virtual_time: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self._user_tags: Dict[str, Dict[Optional[int], float]] = {lane: {} for lane in LANES}
+        self._admitted: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._sequence = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    def lane_limit(self, lane: str) -> int:
+        share = settings.LLM_LANE_CONCURRENCY_SHARES.get(lane, 1.0)
+        return max(1, int(self.controller.limit * share))
+
+    def _in_flight_at_or_below(self, lane: str) -> int:
+        return sum(self._in_flight[other] for other in LANES[LANES.index(lane):])
+
+    def _admissible(self, lane: str) -> bool:
+        """
+        The lane's caps are its own and those of the non-interactive lanes above it, which cover
+        it too: a batch call may not push standard and batch together past the standard share.
+        """
+        return all(
+            self._in_flight_at_or_below(capped) < self.lane_limit(capped)
+            for capped in LANES[:LANES.index(lane) + 1]
+            if capped == lane or capped != LANE_INTERACTIVE
+        )
+
+    async def acquire(self, lane: str, user_id: Optional[int]) -> None:
+        weight = settings.LLM_USER_WEIGHTS.get(user_id, 1.0) if user_id is not None else 1.0
+        user_tags = self._user_tags[lane]
+        tag = max(self._virtual_time[lane], user_tags.get(user_id, 0.0)) + 1.0 / max(weight, 1e-6)
+        user_tags[user_id] = tag
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[lane], (tag, next(self._sequence), waiter))
+        self.dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller was cancelled: hand the slot on
+                self.release(lane)
+            else:
+                waiter.cancel() # Skipped by dispatch()
+            raise
+
+    def release(self, lane: str) -> None:
+        self._in_flight[lane] -= 1
+        self.dispatch()
+
+    def dispatch(self) -> None:
+        """Admits waiters while slots are free. Call whenever a slot frees up or the limit grows."""
+        while self.in_flight < self.controller.limit:
+            for lane in LANES:
+                queue = self._queues[lane]
+                while queue and queue[0][2].done(): # Cancelled waiters
+                    heapq.heappop(queue)
+                if queue and self._admissible(lane):
+                    tag, _, waiter = heapq.heappop(queue)
+                    self._virtual_time[lane] = tag
+                    self._in_flight[lane] += 1
+                    self._admitted[lane] += 1
+                    waiter.set_result(None)
+                    if not queue:
+                        # Nobody left to be fair to: new tags start from the virtual time again
+                        self._user_tags[lane].clear()
+                    break
+            else:
+                return
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            lane: {
+                "limit": self.lane_limit(lane),
+                "in_flight": self._in_flight[lane],
+                "waiting": sum(1 for _, _, waiter in self._queues[lane] if not waiter.done()),
+                "admitted": self._admitted[lane],
+            }
+            for lane in LANES
+        }
+
+
+class ModelRateLimiter:
+    """Request/min and token/min buckets plus the AIMD concurrency limit and its fair-share scheduler for one model."""
+
+    def __init__(self, model: str, requests_per_minute: int, tokens_per_minute: int):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AIMDConcurrencyController(
+            initial=settings.LLM_AIMD_INITIAL_CONCURRENCY,
+            min_limit=settings.LLM_AIMD_MIN_CONCURRENCY,
+            max_limit=settings.LLM_AIMD_MAX_CONCURRENCY,
+            decrease_factor=settings.LLM_AIMD_DECREASE_FACTOR,
+            cooldown_seconds=settings.LLM_AIMD_DECREASE_COOLDOWN_SECONDS,
+        )
+        self.scheduler = FairShareScheduler(self.concurrency)
+        self.throttled = 0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int, priority: CallPriority = DEFAULT_PRIORITY) -> AsyncIterator[None]:
+        """
+        Waits for a concurrency slot (in priority/fair-share order), then for request and token budget.
+        Slots are taken first so the FIFO budget queues only ever hold admitted calls
+        and a batch backlog cannot queue up in front of interactive calls there.
+        """
+        lane = priority.lane if priority.lane in LANES else LANE_STANDARD
+        await self.scheduler.acquire(lane, priority.user_id)
+        try:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            yield
+        finally:
+            self.scheduler.release(lane)
+
+    def on_success(self, estimated_tokens: int, actual_tokens: Optional[int] = None) -> None:
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+        self.concurrency.on_success()
+        self.scheduler.dispatch() # The limit may have grown
+
+    def on_throttle(self) -> None:
+        self.throttled += 1
+        self.concurrency.on_throttle()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": self.concurrency.limit,
+            "in_flight": self.scheduler.in_flight,
+            "throttled": self.throttled,
+            "lanes": self.scheduler.stats(),
+        }
+
+
+class RateLimiterRegistry:
+    """One ModelRateLimiter per model, shared by every engine path in the process."""
+
+    def __init__(self):
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+
+    def get(self, model: str) -> ModelRateLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            overrides = settings.LLM_MODEL_RATE_LIMITS.get(model, {})
+            limiter = ModelRateLimiter(
+                model,
+                requests_per_minute=overrides.get("requests_per_minute", settings.LLM_DEFAULT_REQUESTS_PER_MINUTE),
+                tokens_per_minute=overrides.get("tokens_per_minute", settings.LLM_DEFAULT_TOKENS_PER_MINUTE),
+            )
+            self._limiters[model] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {model: limiter.stats() for model, limiter in self._limiters.items()}
+
+
+rate_limiters = RateLimiterRegistry()
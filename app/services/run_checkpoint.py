@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.crud.crud_run import block_item_checkpoint
+from app.db.session import AsyncSessionFactory
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class RunCheckpointStore:
+    """
+    Item-level checkpoints of one run: every finished LLM call of a block is recorded
+    (keyed by the hash of its rendered prompt) so a failed, cancelled or abandoned run
+    can be resumed without calling the LLM again for the items it already finished.
+
+    Like the LLM response cache, writes are buffered and stored in batches with a
+    dedicated session, every RUN_CHECKPOINT_BATCH_SIZE calls or RUN_CHECKPOINT_FLUSH_INTERVAL_SECONDS.
+    Block runs are committed before their LLM calls, so flushes never wait on the run's own
+    transaction; a batch that fails anyway (e.g. SQLite busy) stays buffered and the engine
+    flushes whatever is left once the run has finished.
+    """
+
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self._saved: Dict[int, Dict[str, str]] = {} # block_id -> prompt_hash -> output
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def load(self, block_id: int) -> Dict[str, str]:
+        """Checkpointed outputs of the block from earlier attempts of this run."""
+        if block_id not in self._saved:
+            try:
+                async with AsyncSessionFactory() as db:
+                    self._saved[block_id] = await block_item_checkpoint.get_outputs(db, run_id=self.run_id, block_id=block_id)
+            except Exception as e:
+                # Resuming is an optimization; without checkpoints the items are simply called again
+                logger.warning(f"Could not load checkpoints of run {self.run_id} block {block_id}: {e}")
+                self._saved[block_id] = {}
+            if self._saved[block_id]:
+                logger.info(f"Run {self.run_id} block {block_id}: resuming with {len(self._saved[block_id])} checkpointed items")
+        return self._saved[block_id]
+
+    def record(self, block_id: int, item_index: int, prompt: str, output: str) -> None:
+        if self._closed:
+            return
+        self._pending.append({
+            "run_id": self.run_id, "block_id": block_id, "item_index": item_index,
+            "prompt_hash": prompt_hash(prompt), "output_text": output,
+        })
+        due = (
+            len(self._pending) >= settings.RUN_CHECKPOINT_BATCH_SIZE
+            or time.monotonic() - self._last_flush >= settings.RUN_CHECKPOINT_FLUSH_INTERVAL_SECONDS
+        )
+        if due and not self._flush_lock.locked():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            entries, self._pending = self._pending, []
+            try:
+                async with AsyncSessionFactory() as db:
+                    await block_item_checkpoint.bulk_store(db, entries=entries)
+            except Exception as e:
+                logger.warning(f"Checkpoint flush of {len(entries)} items for run {self.run_id} failed, will retry: {e}")
+                self._pending = entries + self._pending
+
+    async def discard(self) -> None:
+        """Drops buffered checkpoints once the run completed; its block runs hold the outputs from then on."""
+        self._closed = True
+        async with self._flush_lock:
+            self._pending = []
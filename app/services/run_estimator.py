@@ -0,0 +1,162 @@
+import math
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core.config import settings
+from app.crud import crud_block
+from app.services.execution_engine import (
+    _gather_sequence_context, _matrix_dimensions, _normalize_key, _render_list_item_prompt, _single_list_input,
+)
+from app.services.execution_plan import execution_plans
+from app.services.llm_retry import latency_tracker
+from app.services.matrix_engine import build_matrix, cell_bindings, iter_cells, matrix_shape
+from app.services.prompt_utils import LayeredContext
+from app.services.rate_limiter import estimate_tokens, rate_limiters
+from app.services.run_state import RunExecutionState
+
+DEFAULT_MAX_TOKENS = 2048 # call_claude_api's default
+
+
+def model_prices(model: str) -> Dict[str, float]:
+    """USD per million input/output tokens for `model`."""
+    return {**settings.LLM_DEFAULT_PRICE_PER_MTOK, **settings.LLM_MODEL_PRICES_PER_MTOK.get(model, {})}
+
+
+def user_cost_budget(user_id: int) -> Optional[float]:
+    """Highest estimated cost (USD) a run of this user may have, None = unlimited."""
+    return settings.RUN_USER_COST_BUDGETS_USD.get(user_id, settings.RUN_MAX_ESTIMATED_COST_USD)
+
+
+def _sample_indices(count: int) -> List[int]:
+    """Every index for small inputs, else RUN_ESTIMATE_SAMPLE_PROMPTS evenly spaced ones."""
+    if count <= settings.RUN_ESTIMATE_SAMPLE_PROMPTS:
+        return list(range(count))
+    step = count / settings.RUN_ESTIMATE_SAMPLE_PROMPTS
+    return [int(i * step) for i in range(settings.RUN_ESTIMATE_SAMPLE_PROMPTS)]
+
+
+def _input_tokens(sample_prompts: List[str], calls: int) -> int:
+    if not sample_prompts:
+        return 0
+    sampled = sum(estimate_tokens(prompt) for prompt in sample_prompts)
+    return round(sampled * calls / len(sample_prompts))
+
+
+def _wall_time_seconds(model: str, calls: int, tokens: int, concurrency: int) -> float:
+    """
+    Slowest of: calls in waves of `concurrency` at the model's observed median latency,
+    and the model's request/min and token/min budgets.
+    """
+    if calls == 0:
+        return 0.0
+    latency = latency_tracker.percentile(model, 50) or settings.RUN_ESTIMATE_CALL_SECONDS
+    if not settings.LLM_RATE_LIMIT_ENABLED:
+        return math.ceil(calls / concurrency) * latency
+    limiter = rate_limiters.get(model)
+    concurrency = min(concurrency, limiter.concurrency.limit)
+    return max(
+        math.ceil(calls / concurrency) * latency,
+        calls / limiter.requests.rate_per_second,
+        tokens / limiter.tokens.rate_per_second,
+    )
+
+
+async def estimate_sequence(
+    db: AsyncSession, sequence: models.Sequence, user_id: int,
+    input_overrides: Optional[Dict[str, Any]] = None, llm_model_override: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Pre-flight estimate of a run of `sequence`: LLM calls, tokens, wall time and cost per block
+    and in total, without calling the LLM. List sizes come from the resolved context; the outputs
+    of earlier blocks are simulated with their real shape (a list block yields one item per input).
+    Counts are upper bounds: response cache hits and duplicate prompts are not subtracted,
+    and blocks are assumed to run one after another.
+    """
+    blocks = await crud_block.block.get_multi_by_sequence(db, sequence_id=sequence.id)
+    sequence_plan = execution_plans.sequence_plan(sequence.id, blocks)
+    context = await _gather_sequence_context(
+        db, sequence.id, user_id, input_overrides, referenced_names=sequence_plan.referenced_names(_normalize_key)
+    )
+    default_model = llm_model_override or sequence.default_llm_model or "claude-3-opus-20240229"
+    run_state = RunExecutionState()
+    block_estimates = []
+
+    for block in blocks:
+        model = block.llm_model_override or default_model
+        plan = sequence_plan.by_block_id[block.id]
+        config = None
+        calls = 0
+        sample_prompts: List[str] = []
+        concurrency = 1
+        error = None
+        try:
+            config = plan.config
+            if block.type in (models.BlockTypeEnum.STANDARD, models.BlockTypeEnum.DISCRETIZATION):
+                calls = 1
+                sample_prompts = [plan.render(plan.block_context(context))]
+                if block.type == models.BlockTypeEnum.STANDARD:
+                    context[config.output_variable_name] = f"[Simulated output from {block.name}]"
+                else:
+                    for name in config.output_names:
+                        context[name] = f"[Simulated output '{name}' from {block.name}]"
+            elif block.type == models.BlockTypeEnum.SINGLE_LIST:
+                concurrency = run_state.block_concurrency(config.max_concurrency)
+                input_list = _single_list_input(config, context)
+                calls = len(input_list)
+                block_context = plan.block_context(context)
+                sample_prompts = [
+                    _render_list_item_prompt(plan, block_context, input_list, idx) for idx in _sample_indices(calls)
+                ]
+                context[config.output_list_variable_name] = [
+                    f"[Simulated item from list output of {block.name}]"
+                ] * calls
+            elif block.type == models.BlockTypeEnum.MULTI_LIST:
+                concurrency = run_state.block_concurrency(config.max_concurrency)
+                dimensions = _matrix_dimensions(config, context)
+                shape = matrix_shape(dimensions)
+                calls = math.prod(shape)
+                sampled = set(_sample_indices(calls))
+                block_context = plan.block_context(context)
+                sample_prompts = [
+                    plan.render(LayeredContext(block_context, cell_bindings(dimensions, coords)))
+                    for position, coords in enumerate(iter_cells(dimensions)) if position in sampled
+                ]
+                simulated = build_matrix(shape, {})
+                context[config.output_matrix_variable_name] = [simulated] if len(dimensions) == 1 else simulated
+        except (ValueError, NotImplementedError) as e:
+            # Later blocks are still estimated; they may depend on this block's (now missing) output
+            error = str(e)
+            config = None
+
+        max_tokens = getattr(config, "max_tokens", None) or DEFAULT_MAX_TOKENS
+        input_tokens = _input_tokens(sample_prompts, calls)
+        output_tokens = calls * min(settings.RUN_ESTIMATE_OUTPUT_TOKENS_PER_CALL, max_tokens)
+        prices = model_prices(model)
+        block_estimates.append({
+            "block_id": block.id,
+            "name": block.name,
+            "type": block.type.value,
+            "model": model,
+            "llm_calls": calls,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "wall_time_seconds": round(_wall_time_seconds(model, calls, input_tokens + output_tokens, concurrency), 1),
+            "cost_usd": round((input_tokens * prices["input"] + output_tokens * prices["output"]) / 1_000_000, 4),
+            "error": error,
+        })
+
+    budget = user_cost_budget(user_id)
+    total_cost = round(sum(b["cost_usd"] for b in block_estimates), 4)
+    return {
+        "sequence_id": sequence.id,
+        "llm_calls": sum(b["llm_calls"] for b in block_estimates),
+        "input_tokens": sum(b["input_tokens"] for b in block_estimates),
+        "output_tokens": sum(b["output_tokens"] for b in block_estimates),
+        "wall_time_seconds": round(sum(b["wall_time_seconds"] for b in block_estimates), 1),
+        "cost_usd": total_cost,
+        "budget_usd": budget,
+        "within_budget": budget is None or total_cost <= budget,
+        "blocks": block_estimates,
+    }
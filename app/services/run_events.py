@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+import json
+import logging
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Set
+
+from app import models
+from app.core.config import settings
+from app.crud import crud_run
+from app.db.session import AsyncSessionFactory
+
+logger = logging.getLogger(__name__)
+
+# Event types published by the execution engine
+RUN_STARTED = "run_started"
+BLOCK_STARTED = "block_started"
+BLOCK_COMPLETED = "block_completed"
+ITEM_COMPLETED = "item_completed"
+RUN_FINISHED = "run_finished"
+
+FINISHED_STATUSES = (
+    models.RunStatusEnum.COMPLETED, models.RunStatusEnum.PARTIAL,
+    models.RunStatusEnum.FAILED, models.RunStatusEnum.CANCELLED,
+)
+
+
+class RunEventBus:
+    """
+    In-process pub/sub of run progress events, fed by the execution engine.
+    Each run keeps its last RUN_EVENTS_HISTORY_SIZE events until it finishes, so a client
+    subscribing mid-run first gets what it missed. A subscriber that falls more than
+    RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE events behind loses its oldest undelivered events.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._history: Dict[int, Deque[Dict[str, Any]]] = {}
+        self._sequence = itertools.count(1)
+
+    def publish(self, run_id: Optional[int], event_type: str, **data: Any) -> None:
+        if run_id is None:
+            return
+        event = {
+            "id": next(self._sequence),
+            "type": event_type,
+            "run_id": run_id,
+            "at": datetime.now(timezone.utc).isoformat(),
+            **data,
+        }
+        history = self._history.get(run_id)
+        if history is None:
+            history = self._history[run_id] = deque(maxlen=settings.RUN_EVENTS_HISTORY_SIZE)
+        history.append(event)
+        for queue in self._subscribers.get(run_id, ()):
+            if queue.full():
+                queue.get_nowait() # Slow consumer: drop its oldest event rather than block the run
+            queue.put_nowait(event)
+        if event_type == RUN_FINISHED:
+            self.forget(run_id)
+
+    def forget(self, run_id: int) -> None:
+        """Drops a run's event history. Called when the run finishes or its worker gives up on it."""
+        self._history.pop(run_id, None)
+
+    @contextmanager
+    def subscribe(self, run_id: int) -> Iterator[asyncio.Queue]:
+        """A queue receiving the run's past (still retained) and future events."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE)
+        for event in list(self._history.get(run_id, ()))[-queue.maxsize:]:
+            queue.put_nowait(event)
+        self._subscribers.setdefault(run_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(run_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[run_id]
+
+
+run_events = RunEventBus()
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _read_run(run_id: int) -> Optional[models.Run]:
+    async with AsyncSessionFactory() as db:
+        return await crud_run.run.get(db, id=run_id)
+
+
+def _finished_event(run: models.Run) -> Dict[str, Any]:
+    return {
+        "id": 0, "type": RUN_FINISHED, "run_id": run.id,
+        "at": (run.completed_at or datetime.now(timezone.utc)).isoformat(),
+        "status": run.status.value, "error_message": run.error_message,
+    }
+
+
+async def stream_run_events(run_id: int) -> AsyncIterator[str]:
+    """
+    Server-sent events for one run until it finishes. Runs executing in another process
+    publish nothing here; their end is still detected by a status read on every keepalive.
+    Uses its own sessions so the stream can outlive the request's session.
+    """
+    with run_events.subscribe(run_id) as queue:
+        # Subscribed before reading the status, so a run finishing in between is not missed
+        run = await _read_run(run_id)
+        if run is None:
+            return
+        if run.status in FINISHED_STATUSES and queue.empty():
+            yield _sse(_finished_event(run))
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.RUN_EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                try:
+                    run = await _read_run(run_id)
+                except Exception as e:
+                    logger.warning(f"Status check for the event stream of run {run_id} failed: {e}")
+                    run = None
+                if run is not None and run.status in FINISHED_STATUSES:
+                    yield _sse(_finished_event(run))
+                    return
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(event)
+            if event["type"] == RUN_FINISHED:
+                return
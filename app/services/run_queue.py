@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app import models
+from app.core.config import settings
+from app.crud import crud_run
+from app.db.session import AsyncSessionFactory
+from app.services import execution_engine
+from app.services.run_events import run_events
+
+logger = logging.getLogger(__name__)
+
+
+class RunQueueFullError(Exception):
+    pass
+
+
+class LeaseLostError(Exception):
+    pass
+
+
+class RunJob:
+    """A claimed sequence run. The Run row itself is the source of truth; the job only points at it."""
+
+    def __init__(self, run_id: int, sequence_id: int, user_id: int, input_overrides_json: Optional[Dict[str, Any]] = None):
+        self.run_id = run_id
+        self.sequence_id = sequence_id
+        self.user_id = user_id
+        self.input_overrides_json = input_overrides_json
+
+    @classmethod
+    def from_run(cls, run: models.Run) -> "RunJob":
+        return cls(run.id, run.sequence_id, run.user_id, run.input_overrides_json)
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class RunJobQueue:
+    """
+    Database-backed run queue. PENDING Run rows are the queue: any worker in any process
+    or host claims them with crud_run.claim_next, keeps the claim alive with a heartbeat,
+    and a run whose lease expires (crashed worker) becomes claimable again.
+    Workers poll every RUN_QUEUE_POLL_INTERVAL_SECONDS; notify() wakes local workers
+    immediately when this process creates a run.
+    """
+
+    def __init__(self):
+        self.worker_id = make_worker_id()
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        self._wakeup = asyncio.Event()
+        self._active: Dict[int, RunJob] = {} # run_id -> job currently executing
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, worker_count: Optional[int] = None) -> None:
+        if self._workers:
+            return
+        worker_count = worker_count or settings.RUN_WORKER_COUNT
+        self._accepting = True
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker(i), name=f"run-worker-{i}") for i in range(worker_count)]
+        logger.info(f"Run queue worker {self.worker_id} started with {worker_count} workers")
+
+    async def enqueue(self, db, run_id: int) -> None:
+        """Called after a PENDING run is committed. Rejects it if the shared backlog is full."""
+        if await crud_run.run.count_pending(db) > settings.RUN_QUEUE_MAX_SIZE:
+            raise RunQueueFullError(f"Run queue is full ({settings.RUN_QUEUE_MAX_SIZE} pending runs).")
+        self.notify()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def shutdown(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops claiming new runs and waits up to `timeout` for in-flight runs. Runs still
+        executing after that are cancelled and released back to PENDING for another worker.
+        """
+        if not self._workers:
+            return
+        self._accepting = False
+        self.notify()
+        timeout = settings.RUN_SHUTDOWN_TIMEOUT_SECONDS if timeout is None else timeout
+        done, pending = await asyncio.wait(self._workers, timeout=timeout)
+        if pending:
+            logger.warning(f"Run queue drain timed out after {timeout}s: releasing runs {sorted(self._active)}")
+            for worker in pending:
+                worker.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Run queue worker {self.worker_id} stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._workers),
+            "running": sorted(self._active),
+            "accepting": self._accepting,
+        }
+
+    async def _worker(self, index: int) -> None:
+        while self._accepting:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Run worker {index} could not claim a run: {e}", exc_info=True)
+                job = None
+            if job is None:
+                await self._wait_for_work()
+                continue
+            self._active[job.run_id] = job
+            try:
+                await self._execute_with_heartbeat(job)
+            except asyncio.CancelledError:
+                await self._release(job)
+                raise
+            except LeaseLostError:
+                logger.warning(f"Run worker {index} lost the lease on run {job.run_id}; another worker owns it now")
+            except Exception as e:
+                logger.error(f"Run worker {index} failed executing run {job.run_id}: {e}", exc_info=True)
+                await self._mark_failed(job, f"Execution failed to start or complete: {str(e)}")
+            finally:
+                self._active.pop(job.run_id, None)
+
+    async def _wait_for_work(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=settings.RUN_QUEUE_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _claim(self) -> Optional[RunJob]:
+        async with AsyncSessionFactory() as db:
+            db_run = await crud_run.run.claim_next(
+                db, worker_id=self.worker_id, lease_seconds=settings.RUN_LEASE_SECONDS
+            )
+            if db_run is None:
+                return None
+            job = RunJob.from_run(db_run)
+            if db_run.claim_count > settings.RUN_MAX_CLAIMS:
+                await self._mark_failed(job, f"Run abandoned: claimed {db_run.claim_count - 1} times without completing.")
+                return None
+            logger.info(f"Worker {self.worker_id} claimed run {job.run_id} (claim #{db_run.claim_count})")
+            return job
+
+    async def _execute_with_heartbeat(self, job: RunJob) -> None:
+        execution = asyncio.create_task(self._execute(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            done, _ = await asyncio.wait({execution, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if execution not in done:
+                # The heartbeat only finishes when the lease is lost; stop working on a run we no longer own
+                execution.cancel()
+                await asyncio.gather(execution, return_exceptions=True)
+                heartbeat.result()
+            execution.result()
+        finally:
+            for task in (execution, heartbeat):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(execution, heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job: RunJob) -> None:
+        while True:
+            await asyncio.sleep(settings.RUN_HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                async with AsyncSessionFactory() as db:
+                    renewed = await crud_run.run.renew_lease(
+                        db, run_id=job.run_id, worker_id=self.worker_id, lease_seconds=settings.RUN_LEASE_SECONDS
+                    )
+            except Exception as e:
+                # Transient (e.g. SQLite busy); the lease is long enough to survive a missed beat
+                logger.warning(f"Heartbeat for run {job.run_id} failed: {e}")
+                continue
+            if not renewed:
+                raise LeaseLostError(f"Lease on run {job.run_id} lost")
+
+    async def _execute(self, job: RunJob) -> None:
+        try:
+            async with AsyncSessionFactory() as db:
+                await execution_engine.execute_sequence(
+                    db=db,
+                    run_id=job.run_id,
+                    sequence_id=job.sequence_id,
+                    user_id=job.user_id,
+                    input_overrides_json=job.input_overrides_json,
+                )
+        finally:
+            run_events.forget(job.run_id) # A run that crashed never published run_finished
+
+    async def _release(self, job: RunJob) -> None:
+        try:
+            async with AsyncSessionFactory() as db:
+                await crud_run.run.release_claim(db, run_id=job.run_id, worker_id=self.worker_id)
+        except Exception as e:
+            logger.error(f"Could not release run {job.run_id}: {e}", exc_info=True)
+
+    async def _mark_failed(self, job: RunJob, error_message: str) -> None:
+        try:
+            async with AsyncSessionFactory() as db:
+                db_run = await crud_run.run.get(db, id=job.run_id)
+                if db_run and db_run.status in (models.RunStatusEnum.PENDING, models.RunStatusEnum.RUNNING):
+                    db_run.status = models.RunStatusEnum.FAILED
+                    db_run.error_message = error_message
+                    db_run.completed_at = datetime.now(timezone.utc)
+                    await db.commit()
+        except Exception as e:
+            logger.error(f"Could not mark run {job.run_id} as failed: {e}", exc_info=True)
+
+
+run_queue = RunJobQueue()
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Any, Awaitable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.rate_limiter import LANE_STANDARD, CallPriority
+from app.services.run_checkpoint import RunCheckpointStore
+
+
+class RunCancelledError(Exception):
+    """Raised inside a run once it has been cancelled. `partial_results` holds list items finished before that."""
+
+    def __init__(self, message: str = "Run cancelled.", partial_results: Optional[List[Any]] = None):
+        super().__init__(message)
+        self.partial_results = partial_results
+
+
+class RunExecutionState:
+    """
+    Per-run execution state shared by every block of a run.
+    Holds the run-wide LLM concurrency limit so parallel list items of all blocks
+    together never exceed LLM_RUN_MAX_CONCURRENCY in-flight calls, and the run-level
+    LLM cache switch (None = default policy) and the sequence's retry overrides.
+    `checkpoints` is set for queued sequence runs, which can be resumed item by item.
+    `lane` and `user_id` decide where the run's LLM calls queue for rate-limited slots.
+    """
+
+    def __init__(
+        self,
+        run_id: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        retry_config: Optional[Dict[str, Any]] = None,
+        checkpoints: Optional[RunCheckpointStore] = None,
+        lane: str = LANE_STANDARD,
+        user_id: Optional[int] = None,
+    ):
+        self.run_id = run_id
+        self.priority = CallPriority(lane=lane, user_id=user_id)
+        self.use_cache = use_cache
+        self.retry_config = retry_config
+        self.checkpoints = checkpoints
+        self.block_fingerprints: Dict[int, str] = {} # block_id -> input fingerprint of its execution in this run
+        self.reused_block_runs: Dict[int, int] = {} # block_id -> id of the block run whose outputs were reused
+        self.max_concurrency = max_concurrency or settings.LLM_RUN_MAX_CONCURRENCY
+        self.llm_semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.cancel_event = asyncio.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    async def cancellable(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Awaits `awaitable` unless the run is cancelled first; then the work is cancelled
+        (aborting in-flight LLM calls) and RunCancelledError is raised.
+        """
+        if self.cancelled:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise RunCancelledError()
+        work = asyncio.ensure_future(awaitable)
+        cancel_wait = asyncio.create_task(self.cancel_event.wait())
+        try:
+            await asyncio.wait({work, cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancel_wait.cancel()
+            if not work.done():
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+        if work.cancelled():
+            raise RunCancelledError()
+        return work.result()
+
+    def block_concurrency(self, block_max_concurrency: Optional[int]) -> int:
+        """Effective per-block limit: the block's own setting, capped by the run limit."""
+        limit = block_max_concurrency or settings.LLM_BLOCK_MAX_CONCURRENCY
+        return max(1, min(limit, self.max_concurrency))
+
+
+class ActiveRunRegistry:
+    """Runs executing in this process, so a cancel request handled here takes effect immediately."""
+
+    def __init__(self):
+        self._runs: Dict[int, RunExecutionState] = {}
+
+    def register(self, run_state: RunExecutionState) -> None:
+        if run_state.run_id is not None:
+            self._runs[run_state.run_id] = run_state
+
+    def unregister(self, run_state: RunExecutionState) -> None:
+        if self._runs.get(run_state.run_id) is run_state:
+            del self._runs[run_state.run_id]
+
+    def cancel(self, run_id: int) -> bool:
+        run_state = self._runs.get(run_id)
+        if run_state is None:
+            return False
+        run_state.cancel()
+        return True
+
+
+active_runs = ActiveRunRegistry()
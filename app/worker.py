@@ -0,0 +1,44 @@
+"""
+Standalone run worker: executes queued sequence runs without serving HTTP.
+
+    python -m app.worker
+
+Start as many worker processes (on as many hosts) as needed; they share the runs table
+as their queue. Set RUN_WORKERS_IN_API_PROCESS=false on the API processes to keep
+execution off the HTTP workers entirely.
+"""
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.services.cache_invalidation import cache_invalidation
+from app.services.llm_cache import response_cache
+from app.services.llm_interface import init_llm_client, close_llm_client
+from app.services.run_queue import run_queue
+
+logging.basicConfig(level=logging.INFO if settings.ENVIRONMENT == "prod" else logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await init_llm_client()
+    await cache_invalidation.start() # Global list edits made through the API reach this worker's cache
+    run_queue.start()
+    logger.info(f"Run worker {run_queue.worker_id} ready")
+    await stop.wait()
+
+    logger.info("Run worker shutting down...")
+    await run_queue.shutdown()
+    await response_cache.close()
+    await close_llm_client()
+    cache_invalidation.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+"""
+Backend tests. They run against a throwaway SQLite database with stubbed LLM calls:
+
+    pip install -r requirements.txt pytest
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Before app.core.config reads the environment; never point the tests at a real database
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='mpsg-tests-')}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("CLAUDE_API_KEY", "test-key")
+
+from app import models # noqa: E402
+from app.db.session import engine # noqa: E402
+
+
+@pytest.fixture
+def run_with_db():
+    """Runs a coroutine on a new event loop against freshly created tables."""
+
+    def run(coro):
+        async def with_tables():
+            async with engine.begin() as conn:
+                await conn.run_sync(models.Base.metadata.drop_all)
+                await conn.run_sync(models.Base.metadata.create_all)
+            try:
+                return await coro
+            finally:
+                await engine.dispose() # Pooled connections belong to this loop
+
+        return asyncio.run(with_tables())
+
+    return run
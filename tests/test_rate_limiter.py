@@ -0,0 +1,44 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.rate_limiter import (
+    LANE_BATCH, LANE_INTERACTIVE, LANE_STANDARD, AIMDConcurrencyController, FairShareScheduler,
+)
+
+
+def _scheduler(limit: int) -> FairShareScheduler:
+    return FairShareScheduler(AIMDConcurrencyController(
+        initial=limit, min_limit=1, max_limit=limit, decrease_factor=0.5, cooldown_seconds=0.0,
+    ))
+
+
+def test_lower_lanes_stay_within_the_shares_of_the_lanes_above(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_LANE_CONCURRENCY_SHARES", {"interactive": 1.0, "standard": 0.8, "batch": 0.6})
+
+    async def scenario():
+        scheduler = _scheduler(10)
+        waiting = [asyncio.create_task(scheduler.acquire(LANE_STANDARD, 1)) for _ in range(5)]
+        waiting += [asyncio.create_task(scheduler.acquire(LANE_BATCH, 2)) for _ in range(10)]
+        await asyncio.sleep(0)
+
+        # Standard and batch together hold the standard share (8 of 10); batch alone stays under its 6
+        lanes = scheduler.stats()
+        assert (lanes[LANE_STANDARD]["in_flight"], lanes[LANE_BATCH]["in_flight"]) == (5, 3)
+        assert lanes[LANE_BATCH]["waiting"] == 7
+
+        # The remaining slots stay free for interactive calls
+        await asyncio.wait_for(scheduler.acquire(LANE_INTERACTIVE, 3), timeout=1)
+        await asyncio.wait_for(scheduler.acquire(LANE_INTERACTIVE, 3), timeout=1)
+        assert scheduler.in_flight == 10
+
+        # Once standard calls finish, batch grows up to its own share only
+        for _ in range(5):
+            scheduler.release(LANE_STANDARD)
+        await asyncio.sleep(0)
+        assert scheduler.stats()[LANE_BATCH]["in_flight"] == 6
+
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from app import models
+from app.core.config import settings
+from app.db.session import AsyncSessionFactory
+from app.services import execution_engine
+
+ITEMS = ["a", "b", "c", "slow"]
+
+
+async def _create_list_run() -> models.Run:
+    async with AsyncSessionFactory() as db:
+        user = models.User(email="checkpoints@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        sequence = models.Sequence(name="Checkpoints", user_id=user.id)
+        db.add(sequence)
+        await db.flush()
+        db.add(models.Block(
+            name="Upper", type=models.BlockTypeEnum.SINGLE_LIST, order=0, sequence_id=sequence.id,
+            config_json={
+                "prompt": "{{ item }}", "input_list_variable_name": "rows",
+                "output_list_variable_name": "upper", "max_concurrency": len(ITEMS),
+            },
+        ))
+        run = models.Run(
+            sequence_id=sequence.id, user_id=user.id, status=models.RunStatusEnum.PENDING,
+            input_overrides_json={"rows": ITEMS},
+        )
+        db.add(run)
+        await db.commit()
+        return run
+
+
+async def _execute(run: models.Run) -> models.Run:
+    async with AsyncSessionFactory() as db:
+        return await execution_engine.execute_sequence(
+            db, run.id, run.sequence_id, run.user_id, input_overrides_json=run.input_overrides_json
+        )
+
+
+async def _checkpoint_count(run_id: int) -> int:
+    async with AsyncSessionFactory() as db:
+        return await db.scalar(
+            select(func.count(models.BlockItemCheckpoint.id)).where(models.BlockItemCheckpoint.run_id == run_id)
+        )
+
+
+def test_checkpoints_survive_a_run_killed_mid_block(run_with_db, monkeypatch):
+    monkeypatch.setattr(settings, "RUN_CHECKPOINTS_ENABLED", True)
+    monkeypatch.setattr(settings, "RUN_CHECKPOINT_BATCH_SIZE", 1)
+    calls = []
+
+    async def stalling_llm(prompt, **kwargs):
+        calls.append(prompt)
+        if prompt == "slow":
+            await asyncio.Event().wait() # Never answers: the worker dies while waiting on it
+        return prompt.upper()
+
+    async def answering_llm(prompt, **kwargs):
+        calls.append(prompt)
+        return prompt.upper()
+
+    async def scenario():
+        run = await _create_list_run()
+        monkeypatch.setattr(execution_engine, "call_claude_api", stalling_llm)
+        execution = asyncio.create_task(_execute(run))
+
+        # The finished items are persisted while the run is still executing its block
+        for _ in range(100):
+            if await _checkpoint_count(run.id) == len(ITEMS) - 1:
+                break
+            await asyncio.sleep(0.1)
+        assert not execution.done()
+        assert await _checkpoint_count(run.id) == len(ITEMS) - 1
+
+        execution.cancel() # Worker killed mid-block
+        await asyncio.gather(execution, return_exceptions=True)
+
+        # Re-claimed after the lease expired: only the unfinished item calls the LLM again
+        calls.clear()
+        monkeypatch.setattr(execution_engine, "call_claude_api", answering_llm)
+        resumed = await _execute(run)
+        assert calls == ["slow"]
+        assert resumed.status == models.RunStatusEnum.COMPLETED
+        assert resumed.results_summary_json == {f"block_{resumed.block_runs[0].block_id}_Upper": {"upper": ["A", "B", "C", "SLOW"]}}
+        assert await _checkpoint_count(run.id) == 0 # Dropped once the run completed
+
+    run_with_db(scenario())